@@ -2,6 +2,8 @@ import asyncio
 import os
 from datetime import datetime, timedelta
 from database import db
+from config import DB_BULK_CHUNK_SIZE
+from services.post_service import PostService
 
 class BackgroundTasks:
     def __init__(self):
@@ -44,33 +46,15 @@ class BackgroundTasks:
             try:
                 now = datetime.now().isoformat()
                 
-                # Находим объявления с истекшим сроком
-                expired_posts = await db.fetchall(
-                    """SELECT id, title, author_id FROM posts 
-                       WHERE expires_at < ? AND status = 4""",  # Только опубликованные
-                    [now]
-                )
+                # Находим объявления с истекшим сроком и архивируем их пачками
+                expired_count = await archive_expired_posts(now)
                 
-                if expired_posts:
-                    print(f"📦 Found {len(expired_posts)} expired posts, moving to archive...")
-                    
-                    for post in expired_posts:
-                        # Переводим в архив
-                        await db.update("posts", {
-                            "status": 6,  # Архив
-                            "updated_at": now
-                        }, "id = ?", [post["id"]])
-                        
-                        # Деактивируем планировщик поднятия
-                        await db.update("post_boost_schedule", {
-                            "is_active": False
-                        }, "post_id = ?", [post["id"]])
-                        
-                        print(f"  📁 Archived: {post['title']} (ID: {post['id']})")
+                if expired_count:
+                    print(f"📦 Archived {expired_count} expired posts")
                 
                 # Проверяем каждый час
                 await asyncio.sleep(3600)  # 1 hour
-                
+            
             except Exception as e:
                 print(f"❌ Error in expire_old_posts: {str(e)}")
                 await asyncio.sleep(60)  # Wait 1 minute on error
@@ -81,68 +65,77 @@ class BackgroundTasks:
             try:
                 now = datetime.now()
                 
-                # Находим объявления готовые к поднятию
-                boost_ready = await db.fetchall(
-                    """SELECT pbs.*, p.title, p.author_id 
-                       FROM post_boost_schedule pbs
-                       JOIN posts p ON pbs.post_id = p.id
-                       WHERE pbs.next_boost_at <= ? 
-                       AND pbs.is_active = 1 
-                       AND p.status = 4""",  # Только опубликованные
-                    [now.isoformat()]
-                )
-                
-                if boost_ready:
+                # Находим объявления готовые к поднятию (вместе с интервалами пакета) пачками:
+                # поднятые получают новое next_boost_at и выпадают из следующей выборки
+                while True:
+                    boost_ready = await db.fetchall(
+                        """SELECT pbs.*, p.title, p.author_id, p.created_at AS post_created_at,
+                                  pkg.boost_interval_days, pkg.duration_days
+                           FROM post_boost_schedule pbs
+                           JOIN posts p ON pbs.post_id = p.id
+                           LEFT JOIN packages pkg ON p.package_id = pkg.id
+                           WHERE pbs.next_boost_at <= ? 
+                           AND pbs.is_active = 1 
+                           AND p.status = 4
+                           LIMIT ?""",  # Только опубликованные
+                        [now.isoformat(), DB_BULK_CHUNK_SIZE]
+                    )
+                    if not boost_ready:
+                        break
+                    
                     print(f"🚀 Found {len(boost_ready)} posts ready for boost...")
                     
+                    boosted_posts = []
+                    schedule_updates = []
+                    
                     for boost in boost_ready:
-                        post_id = boost["post_id"]
-                        
-                        # "Поднимаем" пост (обновляем updated_at для сортировки)
-                        await db.update("posts", {
+                        # "Поднимаем" пост (rank_at определяет позицию в ленте)
+                        boosted_posts.append({
+                            "id": boost["post_id"],
+                            "rank_at": now.isoformat(),
                             "updated_at": now.isoformat()
-                        }, "id = ?", [post_id])
+                        })
                         
                         # Обновляем счетчик и планируем следующее поднятие
                         new_boost_count = boost["boost_count"] + 1
                         
-                        # Получаем информацию о пакете для интервала поднятия
-                        post_info = await db.fetchone(
-                            """SELECT p.*, pkg.boost_interval_days, pkg.duration_days
-                               FROM posts p
-                               LEFT JOIN packages pkg ON p.package_id = pkg.id
-                               WHERE p.id = ?""",
-                            [post_id]
-                        )
-                        
-                        boost_interval = post_info.get("boost_interval_days", 3)
-                        package_duration = post_info.get("duration_days", 7)
+                        boost_interval = boost["boost_interval_days"] or 3
+                        package_duration = boost["duration_days"] or 7
                         
                         # Планируем следующее поднятие если пакет еще активен
-                        created_at = datetime.fromisoformat(post_info["created_at"])
+                        created_at = datetime.fromisoformat(boost["post_created_at"])
                         package_expires = created_at + timedelta(days=package_duration)
                         next_boost_time = now + timedelta(days=boost_interval)
                         
                         if next_boost_time < package_expires:
                             # Планируем следующее поднятие
-                            await db.update("post_boost_schedule", {
+                            schedule_updates.append({
+                                "id": boost["id"],
                                 "next_boost_at": next_boost_time.isoformat(),
                                 "boost_count": new_boost_count
-                            }, "id = ?", [boost["id"]])
+                            })
                             
                             print(f"  🎯 Boosted: {boost['title']} (boost #{new_boost_count})")
                         else:
                             # Пакет истек, деактивируем поднятие
-                            await db.update("post_boost_schedule", {
+                            schedule_updates.append({
+                                "id": boost["id"],
                                 "is_active": False,
                                 "boost_count": new_boost_count
-                            }, "id = ?", [boost["id"]])
+                            })
                             
                             print(f"  ⏰ Boost expired for: {boost['title']}")
+                    
+                    await db.update_many("posts", boosted_posts)
+                    await db.update_many("post_boost_schedule", schedule_updates)
+                    await PostService.refresh_feed([post["id"] for post in boosted_posts])
+                    
+                    if len(boost_ready) < DB_BULK_CHUNK_SIZE:
+                        break
                 
                 # Проверяем каждые 30 минут
                 await asyncio.sleep(1800)  # 30 minutes
-                
+            
             except Exception as e:
                 print(f"❌ Error in boost_posts: {str(e)}")
                 await asyncio.sleep(60)  # Wait 1 minute on error
@@ -185,7 +178,7 @@ class BackgroundTasks:
                 
                 # Проверяем раз в день
                 await asyncio.sleep(86400)  # 24 hours
-                
+            
             except Exception as e:
                 print(f"❌ Error in cleanup_old_data: {str(e)}")
                 await asyncio.sleep(3600)  # Wait 1 hour on error
@@ -201,27 +194,48 @@ async def stop_background_tasks():
     """Функция для остановки фоновых задач"""
     await background_tasks.stop()
 
+async def archive_expired_posts(now: str) -> int:
+    """
+    Архивация опубликованных постов, истекших до now, пачками по DB_BULK_CHUNK_SIZE.
+    Каждая пачка читается отдельным коротким запросом, поэтому читатель пула не
+    занят, пока пачка пишется и обновляются кэши ленты. Возвращает число постов.
+    """
+    archived = 0
+    while True:
+        # Архивированные посты выпадают из выборки, так что каждый запрос берет следующую пачку
+        expired_posts = await db.fetchall(
+            """SELECT id FROM posts 
+               WHERE expires_at < ? AND status = 4
+               LIMIT ?""",
+            [now, DB_BULK_CHUNK_SIZE]
+        )
+        if not expired_posts:
+            break
+        post_ids = [post["id"] for post in expired_posts]
+        
+        archived += await db.update_many("posts", (
+            {"id": post_id, "status": 6, "updated_at": now}  # Архив
+            for post_id in post_ids
+        ))
+        
+        # Деактивируем планировщик поднятия
+        await db.update_many("post_boost_schedule", (
+            {"post_id": post_id, "is_active": False}
+            for post_id in post_ids
+        ), key="post_id")
+        
+        await PostService.refresh_feed(post_ids)
+        
+        if len(post_ids) < DB_BULK_CHUNK_SIZE:
+            break
+    return archived
+
 # Вспомогательные функции для ручного управления
 
 async def manual_expire_posts():
     """Ручной запуск архивации истекших постов"""
-    now = datetime.now().isoformat()
-    
-    expired_posts = await db.fetchall(
-        """SELECT id, title, expires_at FROM posts 
-           WHERE expires_at < ? AND status = 4""",
-        [now]
-    )
-    
-    count = 0
-    for post in expired_posts:
-        await db.update("posts", {
-            "status": 6,  # Архив
-            "updated_at": now
-        }, "id = ?", [post["id"]])
-        count += 1
-    
-    return {"expired_count": count, "expired_posts": expired_posts}
+    count = await archive_expired_posts(datetime.now().isoformat())
+    return {"expired_count": count}
 
 async def manual_boost_posts():
     """Ручной запуск поднятия постов"""
@@ -237,19 +251,23 @@ async def manual_boost_posts():
         [now.isoformat()]
     )
     
-    count = 0
-    for boost in boost_ready:
-        await db.update("posts", {
-            "updated_at": now.isoformat()
-        }, "id = ?", [boost["post_id"]])
-        
-        # Планируем следующее поднятие
-        next_boost = now + timedelta(days=3)  # Default 3 days
-        await db.update("post_boost_schedule", {
+    await db.update_many("posts", (
+        {"id": boost["post_id"], "rank_at": now.isoformat(), "updated_at": now.isoformat()}
+        for boost in boost_ready
+    ))
+    await PostService.refresh_feed([boost["post_id"] for boost in boost_ready])
+    
+    # Планируем следующее поднятие
+    next_boost = now + timedelta(days=3)  # Default 3 days
+    await db.update_many("post_boost_schedule", (
+        {
+            "id": boost["id"],
             "next_boost_at": next_boost.isoformat(),
             "boost_count": boost["boost_count"] + 1
-        }, "id = ?", [boost["id"]])
-        
-        count += 1
+        }
+        for boost in boost_ready
+    ))
+    
+    count = len(boost_ready)
     
     return {"boosted_count": count, "boosted_posts": boost_ready}
\ No newline at end of file
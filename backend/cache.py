@@ -0,0 +1,130 @@
+"""
+In-process caches for derived data (feed counts, rendered pages, lookups)
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Set
+
+class TTLCache:
+    """
+    LRU cache whose entries also expire after `ttl` seconds.
+    
+    clear() starts a new generation: a value computed before the clear and
+    stored after it (set(..., generation=<generation read before computing>))
+    is dropped instead of resurrecting stale data.
+    """
+    
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self._entries = OrderedDict()
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return value
+            self.delete(key)
+        
+        self.misses += 1
+        return None
+    
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None,
+            ttl: Optional[float] = None):
+        """Store a value; `ttl` shortens the lifetime of this entry below the cache's ttl"""
+        if generation is not None and generation != self.generation:
+            return False
+        lifetime = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._entries[key] = (time.monotonic() + lifetime, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self.delete(next(iter(self._entries)))
+        return True
+    
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Current value without counting a lookup or refreshing its LRU position"""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+    
+    def delete(self, key: Hashable):
+        self._entries.pop(key, None)
+    
+    def clear(self):
+        self._entries.clear()
+        self.generation += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0
+        }
+
+class TaggedTTLCache(TTLCache):
+    """
+    TTLCache whose entries carry tags, so everything derived from one piece of
+    data can be dropped at once with invalidate(tags). Invalidating also starts
+    a new generation, like clear().
+    """
+    
+    def __init__(self, max_size: int, ttl: float):
+        super().__init__(max_size, ttl)
+        self.invalidations = 0
+        self._tags: Dict[Hashable, Set[Hashable]] = {}
+        self._keys_by_tag: Dict[Hashable, Set[Hashable]] = {}
+    
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None,
+            ttl: Optional[float] = None, tags: Iterable[Hashable] = ()):
+        if not super().set(key, value, generation, ttl):
+            return False
+        if key not in self._entries:
+            # Evicted straight away (max_size 0)
+            return False
+        self._untag(key)
+        self._tags[key] = set(tags)
+        for tag in self._tags[key]:
+            self._keys_by_tag.setdefault(tag, set()).add(key)
+        return True
+    
+    def delete(self, key: Hashable):
+        super().delete(key)
+        self._untag(key)
+    
+    def invalidate(self, tags: Iterable[Hashable]) -> int:
+        """Drop every entry carrying one of the tags; returns how many were dropped"""
+        keys = set()
+        for tag in tags:
+            keys |= self._keys_by_tag.get(tag, set())
+        for key in keys:
+            self.delete(key)
+        self.invalidations += len(keys)
+        self.generation += 1
+        return len(keys)
+    
+    def clear(self):
+        super().clear()
+        self._tags.clear()
+        self._keys_by_tag.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "invalidations": self.invalidations}
+    
+    def _untag(self, key: Hashable):
+        for tag in self._tags.pop(key, ()):
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
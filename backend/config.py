@@ -9,6 +9,19 @@ load_dotenv()
 
 # Database configuration (SQLite)
 DATABASE_PATH = os.environ.get('DATABASE_PATH', 'telegram_marketplace.db')
+DB_POOL_ENABLED = os.environ.get('DB_POOL_ENABLED', 'true').lower() == 'true'
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 4))  # Long-lived reader connections
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))  # Seconds to wait for a free reader
+DB_PRAGMA_PROFILE = os.environ.get('DB_PRAGMA_PROFILE', 'throughput')  # "throughput" or "durable"
+DB_CHECKPOINT_INTERVAL = int(os.environ.get('DB_CHECKPOINT_INTERVAL', 300))  # Seconds between WAL checkpoints
+DB_GROUP_COMMIT_WINDOW_MS = float(os.environ.get('DB_GROUP_COMMIT_WINDOW_MS', 2))  # Wait for more writes before commit
+DB_GROUP_COMMIT_MAX_BATCH = int(os.environ.get('DB_GROUP_COMMIT_MAX_BATCH', 100))  # Max writes per commit
+DB_BULK_CHUNK_SIZE = int(os.environ.get('DB_BULK_CHUNK_SIZE', 500))  # Rows per transaction for bulk writes
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get('DB_STATEMENT_CACHE_SIZE', 256))  # Prepared statements per connection
+DB_QUERY_STATS_ENABLED = os.environ.get('DB_QUERY_STATS_ENABLED', 'true').lower() == 'true'
+DB_QUERY_STATS_SAMPLES = int(os.environ.get('DB_QUERY_STATS_SAMPLES', 500))  # Rolling window per query fingerprint
+DB_SLOW_QUERY_MS = float(os.environ.get('DB_SLOW_QUERY_MS', 100))  # Slow-query log threshold
+DB_SLOW_QUERY_LOG = os.environ.get('DB_SLOW_QUERY_LOG')  # Optional JSON-lines file for slow queries
 
 # Admin credentials (from environment variables)
 ADMIN_USERNAME = os.environ.get('ADMIN_USERNAME', 'admin')
@@ -40,4 +53,28 @@ MAX_PAGE_SIZE = 50
 
 # Post settings
 DEFAULT_POST_LIFETIME_DAYS = 30
-FREE_POST_COOLDOWN_DAYS = 7
\ No newline at end of file
+FREE_POST_COOLDOWN_DAYS = 7
+VIEW_FLUSH_INTERVAL = float(os.environ.get('VIEW_FLUSH_INTERVAL', 5))  # Seconds between batched view count writes
+VIEW_SKETCH_CACHE_SIZE = int(os.environ.get('VIEW_SKETCH_CACHE_SIZE', 10000))  # Posts whose viewer sketches stay in memory
+VIEW_BLOOM_CAPACITY = int(os.environ.get('VIEW_BLOOM_CAPACITY', 1000))  # Viewers the first bloom layer is sized for
+VIEW_BLOOM_ERROR_RATE = float(os.environ.get('VIEW_BLOOM_ERROR_RATE', 0.01))  # Bloom false-positive bound at any size
+VIEW_RECORD_ROWS = os.environ.get('VIEW_RECORD_ROWS', 'false').lower() == 'true'  # Also keep a post_views row per viewer
+POST_DETAIL_CACHE_TTL = float(os.environ.get('POST_DETAIL_CACHE_TTL', 60))  # Seconds a post detail record stays cached
+POST_DETAIL_CACHE_SIZE = int(os.environ.get('POST_DETAIL_CACHE_SIZE', 5000))  # Post detail records kept
+POST_BATCH_MAX_IDS = int(os.environ.get('POST_BATCH_MAX_IDS', 100))  # Ids accepted by POST /api/posts/batch
+REFERENCE_CACHE_TTL = float(os.environ.get('REFERENCE_CACHE_TTL', 300))  # Seconds cities/currencies/rubrics stay cached
+
+# Admin settings
+ADMIN_POSTS_MAX_LIMIT = int(os.environ.get('ADMIN_POSTS_MAX_LIMIT', 5000))  # Largest page GET /api/admin/posts returns
+ADMIN_POSTS_STREAM_THRESHOLD = int(os.environ.get('ADMIN_POSTS_STREAM_THRESHOLD', 500))  # Larger pages are streamed
+
+# Feed settings
+FEED_COUNT_CACHE_TTL = float(os.environ.get('FEED_COUNT_CACHE_TTL', 30))  # Seconds a feed total stays cached
+FEED_COUNT_CACHE_SIZE = int(os.environ.get('FEED_COUNT_CACHE_SIZE', 1000))  # Distinct filter sets kept
+FEED_APPROXIMATE_COUNT_LIMIT = int(os.environ.get('FEED_APPROXIMATE_COUNT_LIMIT', 1000))  # "At least N" cap
+FEED_HOT_INDEX_ENABLED = os.environ.get('FEED_HOT_INDEX_ENABLED', 'true').lower() == 'true'
+FEED_HOT_INDEX_PAGES = int(os.environ.get('FEED_HOT_INDEX_PAGES', 3))  # Pages of MAX_PAGE_SIZE kept per filter combination
+FEED_HOT_INDEX_MAX_KEYS = int(os.environ.get('FEED_HOT_INDEX_MAX_KEYS', 1000))  # Filter combinations kept in memory
+FEED_HOT_INDEX_WARM_ROWS = int(os.environ.get('FEED_HOT_INDEX_WARM_ROWS', 5000))  # Published posts read at startup
+FEED_PAGE_CACHE_TTL = float(os.environ.get('FEED_PAGE_CACHE_TTL', 60))  # Seconds a rendered feed page stays cached
+FEED_PAGE_CACHE_SIZE = int(os.environ.get('FEED_PAGE_CACHE_SIZE', 2000))  # Rendered feed pages kept
@@ -1,448 +1,816 @@
 import aiosqlite
+import asyncio
 import json
-import os
+import sqlite3
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from datetime import datetime
+from json.encoder import encode_basestring
 import uuid
+from config import (
+    DATABASE_PATH, DB_POOL_ENABLED, DB_POOL_SIZE, DB_POOL_TIMEOUT,
+    DB_PRAGMA_PROFILE, DB_CHECKPOINT_INTERVAL,
+    DB_GROUP_COMMIT_WINDOW_MS, DB_GROUP_COMMIT_MAX_BATCH, DB_BULK_CHUNK_SIZE,
+    DB_STATEMENT_CACHE_SIZE, DB_QUERY_STATS_ENABLED, DB_QUERY_STATS_SAMPLES,
+    DB_SLOW_QUERY_MS, DB_SLOW_QUERY_LOG
+)
+from migrations import run_migrations
+from query_monitor import QueryMonitor
+from search_index import register_search_functions
+from view_sketch import register_sketch_functions
 
-DATABASE_PATH = os.getenv("DATABASE_PATH", "telegram_marketplace.db")
+# SQLite pragma profiles applied to every connection.
+# Both use WAL so readers never block behind the writer; they differ in fsync policy.
+PRAGMA_PROFILES = {
+    "throughput": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",      # fsync only at checkpoints, safe with WAL
+        "busy_timeout": 5000,
+        "cache_size": -64000,         # 64 MB page cache per connection
+        "mmap_size": 268435456,       # 256 MB memory-mapped I/O
+        "temp_store": "MEMORY",
+        "wal_autocheckpoint": 1000,
+    },
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",        # fsync on every commit
+        "busy_timeout": 10000,
+        "cache_size": -16000,
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+        "wal_autocheckpoint": 1000,
+    },
+}
 
-class Database:
+class StatementCache:
+    """
+    LRU cache of generated SQL text keyed by statement shape.
+    Reusing the exact same text also lets sqlite3's per-connection
+    statement cache (cached_statements) skip re-preparing it on pooled connections.
+    """
+    
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._statements = OrderedDict()
+    
+    def get(self, key, build):
+        query = self._statements.get(key)
+        if query is not None:
+            self.hits += 1
+            self._statements.move_to_end(key)
+            return query
+        
+        self.misses += 1
+        query = build()
+        self._statements[key] = query
+        if len(self._statements) > self.max_size:
+            self._statements.popitem(last=False)
+        return query
+    
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._statements),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0
+        }
+
+statement_cache = StatementCache(DB_STATEMENT_CACHE_SIZE)
+
+query_monitor = QueryMonitor(
+    enabled=DB_QUERY_STATS_ENABLED,
+    slow_query_ms=DB_SLOW_QUERY_MS,
+    sample_size=DB_QUERY_STATS_SAMPLES,
+    slow_query_log_path=DB_SLOW_QUERY_LOG
+)
+
+# Statements that EXPLAIN QUERY PLAN can describe
+EXPLAINABLE_PREFIXES = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+def build_insert(table, data):
+    """Build an INSERT statement and its parameters from a column -> value dict"""
+    columns = tuple(data.keys())
+    
+    def build():
+        placeholders = ', '.join(['?' for _ in columns])
+        return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+    
+    query = statement_cache.get(("insert", table, columns), build)
+    return query, list(data.values())
+
+def build_update(table, data, where_clause, where_params):
+    """Build an UPDATE statement and its parameters from a column -> value dict"""
+    columns = tuple(data.keys())
+    
+    def build():
+        set_clause = ', '.join([f"{k} = ?" for k in columns])
+        return f"UPDATE {table} SET {set_clause} WHERE {where_clause}"
+    
+    query = statement_cache.get(("update", table, columns, where_clause), build)
+    return query, list(data.values()) + list(where_params)
+
+async def chunked(items, size):
+    """Split a sync or async iterable into lists of at most `size` items"""
+    chunk = []
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            chunk.append(item)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+    else:
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+def group_by_columns(rows):
+    """Group dict rows by their column tuple so each group shares one statement"""
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(row.keys()), []).append(row)
+    return groups
+
+class RowSet:
+    """
+    Compact query result returned by fetchall(..., compact=True).
+    Rows stay as the tuple-like rows SQLite produced and share one column
+    tuple, instead of one dict with its own keys per row. Iterating yields
+    dicts for code that needs them; to_json() serialises without building any.
+    """
+    __slots__ = ("columns", "rows")
+    
+    def __init__(self, columns, rows):
+        self.columns = columns
+        self.rows = rows
+    
+    def __len__(self):
+        return len(self.rows)
+    
+    def __iter__(self):
+        for row in self.rows:
+            yield dict(zip(self.columns, row))
+    
+    def __getitem__(self, index):
+        return dict(zip(self.columns, self.rows[index]))
+    
+    def to_json(self):
+        """Serialise as a JSON array of objects"""
+        prefixes = [
+            ("{" if i == 0 else ",") + encode_basestring(column) + ":"
+            for i, column in enumerate(self.columns)
+        ]
+        parts = ["["]
+        append = parts.append
+        
+        for index, row in enumerate(self.rows):
+            if index:
+                append(",")
+            for prefix, value in zip(prefixes, row):
+                append(prefix)
+                # Fast paths for the types SQLite returns
+                value_type = type(value)
+                if value_type is str:
+                    append(encode_basestring(value))
+                elif value is None:
+                    append("null")
+                elif value_type is int:
+                    append(str(value))
+                else:
+                    append(json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str))
+            append("}")
+        
+        append("]")
+        return "".join(parts)
+
+class Transaction:
+    """
+    Unit of work returned by Database.transaction().
+    Statements are collected while the block runs and executed together on
+    the writer connection with a single commit when the block exits.
+    """
+    
     def __init__(self):
-        self.db_path = DATABASE_PATH
+        self.statements = []
+        self.rowcounts = []
     
-    async def init_db(self):
-        """Initialize database with all required tables and indexes"""
-        async with aiosqlite.connect(self.db_path) as db:
-            # Users table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id TEXT PRIMARY KEY,
-                    telegram_id INTEGER UNIQUE,
-                    first_name TEXT,
-                    last_name TEXT,
-                    username TEXT,
-                    language TEXT DEFAULT 'ru',
-                    theme TEXT DEFAULT 'light',
-                    is_active BOOLEAN DEFAULT 1,
-                    created_at TEXT,
-                    updated_at TEXT
-                )
-            """)
-            
-            # Super rubrics (categories) table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS super_rubrics (
-                    id TEXT PRIMARY KEY,
-                    name_ru TEXT,
-                    name_ua TEXT,
-                    icon TEXT,
-                    is_active BOOLEAN DEFAULT 1
-                )
-            """)
-            
-            # Cities table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS cities (
-                    id TEXT PRIMARY KEY,
-                    name_ru TEXT,
-                    name_ua TEXT,
-                    is_active BOOLEAN DEFAULT 1
-                )
-            """)
-            
-            # Currencies table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS currencies (
-                    id TEXT PRIMARY KEY,
-                    code TEXT UNIQUE,
-                    name_ru TEXT,
-                    name_ua TEXT,
-                    symbol TEXT,
-                    is_active BOOLEAN DEFAULT 1,
-                    created_at TEXT
-                )
-            """)
-            
-            # Posts table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS posts (
-                    id TEXT PRIMARY KEY,
-                    title TEXT,
-                    description TEXT,
-                    post_type TEXT,
-                    price REAL,
-                    currency_id TEXT,
-                    city_id TEXT,
-                    super_rubric_id TEXT,
-                    author_id TEXT,
-                    status INTEGER DEFAULT 1,
-                    views_count INTEGER DEFAULT 0,
-                    is_premium BOOLEAN DEFAULT 0,
-                    package_id TEXT,
-                    has_photo BOOLEAN DEFAULT 0,
-                    has_highlight BOOLEAN DEFAULT 0,
-                    has_boost BOOLEAN DEFAULT 0,
-                    post_lifetime_days INTEGER DEFAULT 30,
-                    expires_at TEXT,
-                    ai_moderation_passed BOOLEAN DEFAULT 0,
-                    created_at TEXT,
-                    updated_at TEXT,
-                    FOREIGN KEY (currency_id) REFERENCES currencies (id),
-                    FOREIGN KEY (city_id) REFERENCES cities (id),
-                    FOREIGN KEY (super_rubric_id) REFERENCES super_rubrics (id),
-                    FOREIGN KEY (author_id) REFERENCES users (id),
-                    FOREIGN KEY (package_id) REFERENCES packages (id)
-                )
-            """)
-            
-            # Packages table (тарифы)
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS packages (
-                    id TEXT PRIMARY KEY,
-                    name_ru TEXT,
-                    name_ua TEXT,
-                    package_type TEXT,
-                    price REAL,
-                    currency_id TEXT,
-                    duration_days INTEGER,
-                    post_lifetime_days INTEGER DEFAULT 30,
-                    features_ru TEXT,
-                    features_ua TEXT,
-                    has_photo BOOLEAN DEFAULT 0,
-                    has_highlight BOOLEAN DEFAULT 0,
-                    has_boost BOOLEAN DEFAULT 0,
-                    boost_interval_days INTEGER,
-                    is_active BOOLEAN DEFAULT 1,
-                    sort_order INTEGER DEFAULT 0,
-                    created_at TEXT,
-                    updated_at TEXT,
-                    FOREIGN KEY (currency_id) REFERENCES currencies (id)
-                )
-            """)
-            
-            # User packages (покупки тарифов)
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS user_packages (
-                    id TEXT PRIMARY KEY,
-                    user_id TEXT,
-                    package_id TEXT,
-                    post_id TEXT,
-                    purchased_at TEXT,
-                    expires_at TEXT,
-                    is_active BOOLEAN DEFAULT 1,
-                    payment_status TEXT DEFAULT 'pending',
-                    telegram_charge_id TEXT,
-                    provider_charge_id TEXT,
-                    amount REAL,
-                    currency_code TEXT,
-                    created_at TEXT,
-                    FOREIGN KEY (user_id) REFERENCES users (id),
-                    FOREIGN KEY (package_id) REFERENCES packages (id),
-                    FOREIGN KEY (post_id) REFERENCES posts (id)
-                )
-            """)
-            
-            # User free posts tracking
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS user_free_posts (
-                    id TEXT PRIMARY KEY,
-                    user_id TEXT,
-                    created_at TEXT,
-                    next_free_post_at TEXT,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            """)
-            
-            # Post boost schedule
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS post_boost_schedule (
-                    id TEXT PRIMARY KEY,
-                    post_id TEXT,
-                    next_boost_at TEXT,
-                    boost_count INTEGER DEFAULT 0,
-                    is_active BOOLEAN DEFAULT 1,
-                    created_at TEXT,
-                    FOREIGN KEY (post_id) REFERENCES posts (id)
-                )
-            """)
-            
-            # AI moderation log
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS ai_moderation_log (
-                    id TEXT PRIMARY KEY,
-                    post_id TEXT,
-                    ai_decision TEXT,
-                    ai_confidence REAL,
-                    ai_reason TEXT,
-                    moderated_at TEXT,
-                    FOREIGN KEY (post_id) REFERENCES posts (id)
-                )
-            """)
-            
-            # Favorites table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS favorites (
-                    id TEXT PRIMARY KEY,
-                    user_id TEXT,
-                    post_id TEXT,
-                    created_at TEXT,
-                    FOREIGN KEY (user_id) REFERENCES users (id),
-                    FOREIGN KEY (post_id) REFERENCES posts (id),
-                    UNIQUE(user_id, post_id)
-                )
-            """)
-            
-            # Post views table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS post_views (
-                    id TEXT PRIMARY KEY,
-                    post_id TEXT,
-                    user_id TEXT,
-                    viewed_at TEXT,
-                    FOREIGN KEY (post_id) REFERENCES posts (id),
-                    FOREIGN KEY (user_id) REFERENCES users (id),
-                    UNIQUE(post_id, user_id)
-                )
-            """)
-            
-            # App settings table
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS app_settings (
-                    id TEXT PRIMARY KEY,
-                    show_view_counts BOOLEAN DEFAULT 1,
-                    telegram_bot_token TEXT,
-                    telegram_payment_token TEXT,
-                    telegram_moderator_chat_id TEXT,
-                    telegram_moderator_username TEXT,
-                    mistral_api_key TEXT,
-                    app_name TEXT DEFAULT 'Telegram Marketplace',
-                    app_description TEXT DEFAULT 'Платформа частных объявлений',
-                    free_posts_per_week INTEGER DEFAULT 1,
-                    moderation_enabled BOOLEAN DEFAULT 1,
-                    ai_moderation_enabled BOOLEAN DEFAULT 1,
-                    post_lifetime_days INTEGER DEFAULT 30,
-                    updated_at TEXT
-                )
-            """)
-            
-            # Create performance indexes
-            await self.create_indexes(db)
-            
-            await db.commit()
-            
-            # Initialize default data
-            await self.init_default_data(db)
-    
-    async def create_indexes(self, db):
-        """Create indexes for better performance"""
-        indexes = [
-            # Posts table indexes (most critical for performance)
-            "CREATE INDEX IF NOT EXISTS idx_posts_status ON posts(status)",
-            "CREATE INDEX IF NOT EXISTS idx_posts_created_at ON posts(created_at DESC)",
-            "CREATE INDEX IF NOT EXISTS idx_posts_author_id ON posts(author_id)",
-            "CREATE INDEX IF NOT EXISTS idx_posts_type ON posts(post_type)",
-            "CREATE INDEX IF NOT EXISTS idx_posts_category ON posts(super_rubric_id)",
-            "CREATE INDEX IF NOT EXISTS idx_posts_city ON posts(city_id)",
-            "CREATE INDEX IF NOT EXISTS idx_posts_expires_at ON posts(expires_at)",
-            "CREATE INDEX IF NOT EXISTS idx_posts_status_type ON posts(status, post_type)",
-            "CREATE INDEX IF NOT EXISTS idx_posts_status_created ON posts(status, created_at DESC)",
-            
-            # Full-text search index for posts
-            "CREATE INDEX IF NOT EXISTS idx_posts_title ON posts(title)",
-            
-            # Users table indexes
-            "CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users(telegram_id)",
-            "CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(created_at)",
-            
-            # Favorites table indexes
-            "CREATE INDEX IF NOT EXISTS idx_favorites_user_id ON favorites(user_id)",
-            "CREATE INDEX IF NOT EXISTS idx_favorites_post_id ON favorites(post_id)",
-            "CREATE INDEX IF NOT EXISTS idx_favorites_created_at ON favorites(created_at)",
-            
-            # Post views table indexes
-            "CREATE INDEX IF NOT EXISTS idx_post_views_post_id ON post_views(post_id)",
-            "CREATE INDEX IF NOT EXISTS idx_post_views_user_id ON post_views(user_id)",
-            
-            # User packages table indexes
-            "CREATE INDEX IF NOT EXISTS idx_user_packages_user_id ON user_packages(user_id)",
-            "CREATE INDEX IF NOT EXISTS idx_user_packages_status ON user_packages(payment_status)",
-            "CREATE INDEX IF NOT EXISTS idx_user_packages_created ON user_packages(created_at)",
-            
-            # User free posts table indexes
-            "CREATE INDEX IF NOT EXISTS idx_user_free_posts_user_id ON user_free_posts(user_id)",
-            "CREATE INDEX IF NOT EXISTS idx_user_free_posts_next_free ON user_free_posts(next_free_post_at)",
+    def execute(self, query, params=None):
+        """Queue a raw statement"""
+        self.statements.append((query, list(params or ())))
+    
+    def insert(self, table, data):
+        """Queue an insert and return the row id"""
+        if 'id' not in data:
+            data['id'] = str(uuid.uuid4())
+        self.statements.append(build_insert(table, data))
+        return data['id']
+    
+    def update(self, table, data, where_clause, where_params):
+        """Queue an update"""
+        data['updated_at'] = datetime.now().isoformat()
+        self.statements.append(build_update(table, data, where_clause, where_params))
+    
+    def delete(self, table, where_clause, where_params):
+        """Queue a delete"""
+        self.statements.append((f"DELETE FROM {table} WHERE {where_clause}", list(where_params)))
+    
+    async def _run(self, conn, wait_ms, execute):
+        rowcounts = []
+        for query, params in self.statements:
+            cursor = await execute(conn, query, params, wait_ms)
+            rowcounts.append(cursor.rowcount)
+            wait_ms = 0.0
+        return rowcounts
+
+class Database:
+    def __init__(self, db_path=None, pool_size=None, pragma_profile=None):
+        self.db_path = db_path or DATABASE_PATH
+        self.pool_size = pool_size or DB_POOL_SIZE
+        self.pragma_profile = pragma_profile or DB_PRAGMA_PROFILE
+        if self.pragma_profile not in PRAGMA_PROFILES:
+            raise ValueError(f"Unknown pragma profile: {self.pragma_profile}")
+        
+        self._writer = None
+        self._readers = None
+        self._write_lock = asyncio.Lock()
+        self._checkpoint_task = None
+        self._last_checkpoint = None
+        self._write_queue = None
+        self._write_task = None
+        self._write_stats = {"writes": 0, "batches": 0, "failed_batches": 0}
+        self._slow_query_tasks = set()
+        self.schema_report = None
+    
+    @property
+    def is_pooled(self):
+        """True when long-lived pooled connections are open"""
+        return self._writer is not None
+    
+    async def connect(self):
+        """Open the connection pool: one dedicated writer plus `pool_size` readers"""
+        if self.is_pooled or not DB_POOL_ENABLED:
+            return
+        
+        # The writer manages its own transactions so several writes can share one commit
+        self._writer = await self._open_connection(isolation_level=None)
+        self._readers = asyncio.Queue()
+        for _ in range(self.pool_size):
+            self._readers.put_nowait(await self._open_connection())
+        
+        self._write_queue = asyncio.Queue()
+        self._write_task = asyncio.create_task(self._write_loop())
+        
+        if DB_CHECKPOINT_INTERVAL > 0:
+            self._checkpoint_task = asyncio.create_task(self._checkpoint_loop())
+        
+        print(f"Database pool opened: 1 writer, {self.pool_size} readers, '{self.pragma_profile}' profile")
+    
+    async def close(self):
+        """Close all pooled connections (waits for readers that are in use)"""
+        if not self.is_pooled:
+            return
+        
+        for task in list(self._slow_query_tasks):
+            task.cancel()
+        
+        if self._checkpoint_task:
+            self._checkpoint_task.cancel()
+            await asyncio.gather(self._checkpoint_task, return_exceptions=True)
+            self._checkpoint_task = None
+        
+        # Let queued writes commit before the writer goes away
+        await self._write_queue.join()
+        self._write_task.cancel()
+        await asyncio.gather(self._write_task, return_exceptions=True)
+        self._write_task = None
+        
+        for _ in range(self.pool_size):
+            conn = await self._readers.get()
+            await self._close_connection(conn)
+        
+        # Fold the WAL back into the main file so the next start is clean
+        await self.checkpoint("TRUNCATE")
+        
+        async with self._write_lock:
+            await self._close_connection(self._writer)
+            self._writer = None
+            self._readers = None
+            self._write_queue = None
+        
+        print("Database pool closed")
+    
+    async def health_check(self):
+        """Cheap liveness probe: ping one reader and the writer, report pool and write queue counters"""
+        if not self.is_pooled:
+            return {"pooled": False, "healthy": True}
+        
+        async with self._reader() as conn:
+            healthy = await self._ping(conn)
+        async with self._write_lock:
+            writer_healthy = await self._ping(self._writer)
+        
+        batches = self._write_stats["batches"]
+        return {
+            "pooled": True,
+            "healthy": healthy and writer_healthy,
+            "writer_healthy": writer_healthy,
+            "pool_size": self.pool_size,
+            "idle_readers": self._readers.qsize(),
+            "write_queue": {
+                "pending": self._write_queue.qsize(),
+                "writes": self._write_stats["writes"],
+                "batches": batches,
+                "failed_batches": self._write_stats["failed_batches"],
+                "avg_batch_size": round(self._write_stats["writes"] / batches, 2) if batches else 0
+            },
+            "statement_cache": statement_cache.stats()
+        }
+    
+    async def check_connections(self):
+        """
+        Ping the idle readers one at a time and the writer, replacing broken ones.
+        Each reader goes back to the pool before the next is taken, and one that
+        cannot be replaced goes back as it is (the next borrower swaps it).
+        """
+        if not self.is_pooled:
+            return {"checked": 0, "replaced": 0, "failed": 0}
+        
+        checked = replaced = failed = 0
+        for _ in range(self._readers.qsize()):
+            try:
+                conn = self._readers.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            try:
+                checked += 1
+                if not await self._ping(conn):
+                    fresh = await self._open_connection()
+                    await self._close_connection(conn)
+                    conn = fresh
+                    replaced += 1
+            except Exception as e:
+                failed += 1
+                print(f"Warning: Could not replace a reader connection: {e}")
+            finally:
+                self._readers.put_nowait(conn)
+        
+        async with self._write_lock:
+            checked += 1
+            if not await self._ping(self._writer):
+                if await self._replace_writer():
+                    replaced += 1
+                else:
+                    failed += 1
+        
+        return {"checked": checked, "replaced": replaced, "failed": failed}
+    
+    async def checkpoint(self, mode="PASSIVE"):
+        """Run a WAL checkpoint on the writer connection (PASSIVE, FULL, RESTART or TRUNCATE)"""
+        if mode not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+            raise ValueError(f"Unknown checkpoint mode: {mode}")
+        
+        async with self._writer_connection() as conn:
+            cursor = await conn.execute(f"PRAGMA wal_checkpoint({mode})")
+            busy, log_frames, checkpointed_frames = await cursor.fetchone()
+            await cursor.close()
+        
+        self._last_checkpoint = {
+            "mode": mode,
+            "busy": bool(busy),
+            "log_frames": log_frames,
+            "checkpointed_frames": checkpointed_frames,
+            "at": datetime.now().isoformat()
+        }
+        return self._last_checkpoint
+    
+    async def get_settings(self):
+        """Return the active pragma values as seen by a live connection"""
+        settings = {}
+        async with self._reader() as conn:
+            for pragma in PRAGMA_PROFILES[self.pragma_profile]:
+                cursor = await conn.execute(f"PRAGMA {pragma}")
+                row = await cursor.fetchone()
+                await cursor.close()
+                settings[pragma] = row[0] if row else None
+        
+        return {
+            "profile": self.pragma_profile,
+            "pragmas": settings,
+            "last_checkpoint": self._last_checkpoint,
+            "schema": self.schema_report
+        }
+    
+    async def _checkpoint_loop(self):
+        """Periodic passive checkpoint so the WAL cannot grow unbounded under constant reads"""
+        while True:
+            await asyncio.sleep(DB_CHECKPOINT_INTERVAL)
+            try:
+                await self.checkpoint("PASSIVE")
+            except Exception as e:
+                print(f"Warning: WAL checkpoint failed: {e}")
+    
+    async def _apply_pragmas(self, conn):
+        """Apply the configured pragma profile to a connection"""
+        for pragma, value in PRAGMA_PROFILES[self.pragma_profile].items():
+            await conn.execute(f"PRAGMA {pragma} = {value}")
+    
+    async def _write_loop(self):
+        """Drain the write queue, committing every batch of writes with a single COMMIT"""
+        loop = asyncio.get_running_loop()
+        window = DB_GROUP_COMMIT_WINDOW_MS / 1000
+        
+        while True:
+            batch = [await self._write_queue.get()]
+            deadline = loop.time() + window
             
-            # Post boost schedule table indexes
-            "CREATE INDEX IF NOT EXISTS idx_post_boost_schedule_post_id ON post_boost_schedule(post_id)",
-            "CREATE INDEX IF NOT EXISTS idx_post_boost_schedule_next_boost ON post_boost_schedule(next_boost_at)",
-            "CREATE INDEX IF NOT EXISTS idx_post_boost_schedule_active ON post_boost_schedule(is_active)",
+            # Gather everything already queued plus whatever arrives within the window
+            while len(batch) < DB_GROUP_COMMIT_MAX_BATCH:
+                if not self._write_queue.empty():
+                    batch.append(self._write_queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._write_queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
             
-            # AI moderation log indexes
-            "CREATE INDEX IF NOT EXISTS idx_ai_moderation_log_post_id ON ai_moderation_log(post_id)",
-            "CREATE INDEX IF NOT EXISTS idx_ai_moderation_log_moderated_at ON ai_moderation_log(moderated_at)",
-        ]
+            try:
+                await self._commit_batch(batch)
+            except Exception as e:
+                print(f"Error in database write loop: {e}")
+                # Never leave a caller waiting on a batch that did not finish
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                for _ in batch:
+                    self._write_queue.task_done()
+    
+    async def _commit_batch(self, batch):
+        """
+        Run a batch of write operations in one transaction.
+        Each operation gets its own savepoint, so one failing write does not
+        roll back the others that share its commit.
+        """
+        outcomes = []
         
-        for index_sql in indexes:
+        async with self._write_lock:
+            conn = self._writer
             try:
-                await db.execute(index_sql)
+                await conn.execute("BEGIN IMMEDIATE")
+                for operation, future, enqueued_at in batch:
+                    wait_ms = (time.perf_counter() - enqueued_at) * 1000
+                    await conn.execute("SAVEPOINT write_op")
+                    try:
+                        result = await operation(conn, wait_ms)
+                    except Exception as e:
+                        await conn.execute("ROLLBACK TO write_op")
+                        await conn.execute("RELEASE write_op")
+                        outcomes.append((future, None, e))
+                    else:
+                        await conn.execute("RELEASE write_op")
+                        outcomes.append((future, result, None))
+                
+                commit_started = time.perf_counter()
+                await conn.execute("COMMIT")
+                self._observe("COMMIT", None, 0.0, (time.perf_counter() - commit_started) * 1000, len(batch))
             except Exception as e:
-                print(f"Warning: Could not create index: {e}")
+                # The commit itself failed - nothing in the batch was written
+                broken = isinstance(e, (sqlite3.ProgrammingError, ValueError))
+                if not broken:
+                    try:
+                        if conn.in_transaction:
+                            await conn.execute("ROLLBACK")
+                    except Exception:
+                        broken = True
+                if broken:
+                    # Writer connection itself is unusable - swap it for a fresh one
+                    await self._replace_writer()
+                self._write_stats["failed_batches"] += 1
+                outcomes = [(future, None, e) for _, future, _ in batch]
+        
+        self._write_stats["batches"] += 1
+        self._write_stats["writes"] += len(batch)
+        
+        for future, result, error in outcomes:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
     
+    async def _replace_writer(self):
+        """Open a new writer connection in place of a broken one (call with the write lock held)"""
+        try:
+            fresh = await self._open_connection(isolation_level=None)
+        except Exception as e:
+            # Keep the broken one; the next failing batch tries again
+            print(f"Warning: Could not replace the writer connection: {e}")
+            return False
+        await self._close_connection(self._writer)
+        self._writer = fresh
+        return True
     
-    async def init_default_data(self, db):
-        """Initialize default categories, currencies, and cities"""
-        # Check if data already exists
-        cursor = await db.execute("SELECT COUNT(*) FROM super_rubrics")
-        count = await cursor.fetchone()
-        if count[0] > 0:
-            return
-        
-        # Insert default currencies
-        currencies = [
-            ("rub-id", "RUB", "Российский рубль", "Російський рубль", "₽", 1, datetime.now().isoformat()),
-            ("usd-id", "USD", "Доллар США", "Долар США", "$", 1, datetime.now().isoformat()),
-            ("eur-id", "EUR", "Евро", "Євро", "€", 1, datetime.now().isoformat()),
-            ("uah-id", "UAH", "Украинская гривна", "Українська гривня", "₴", 1, datetime.now().isoformat()),
-        ]
+    async def _run_write(self, operation):
+        """
+        Run `operation(conn, wait_ms)` through the single-writer queue and wait for its commit.
+        Without an open pool the operation runs on its own connection and commits immediately.
+        `wait_ms` is how long the operation waited for the writer.
+        """
+        enqueued_at = time.perf_counter()
+        if not self.is_pooled:
+            async with self._writer_connection() as conn:
+                result = await operation(conn, (time.perf_counter() - enqueued_at) * 1000)
+                await conn.commit()
+                return result
         
-        for currency in currencies:
-            await db.execute(
-                "INSERT INTO currencies (id, code, name_ru, name_ua, symbol, is_active, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                currency
-            )
+        future = asyncio.get_running_loop().create_future()
+        self._write_queue.put_nowait((operation, future, enqueued_at))
+        return await future
+    
+    async def _timed_execute(self, conn, query, params, wait_ms, many=False):
+        """Execute a write statement on `conn` and record its timing"""
+        started = time.perf_counter()
+        if many:
+            cursor = await conn.executemany(query, params)
+        else:
+            cursor = await conn.execute(query, params)
+        explain_params = (params[0] if params else None) if many else params
+        self._observe(query, explain_params, wait_ms, (time.perf_counter() - started) * 1000, cursor.rowcount)
+        return cursor
+    
+    def _observe(self, query, params, wait_ms, duration_ms, rows):
+        """Feed one execution to the query monitor and capture a plan if it was slow"""
+        if query_monitor.record(query, duration_ms, wait_ms, rows):
+            task = asyncio.create_task(self._log_slow_query(query, params, wait_ms, duration_ms, rows))
+            self._slow_query_tasks.add(task)
+            task.add_done_callback(self._slow_query_tasks.discard)
+    
+    async def _log_slow_query(self, query, params, wait_ms, duration_ms, rows):
+        plan = None
+        if query.lstrip().upper().startswith(EXPLAINABLE_PREFIXES):
+            try:
+                async with self._reader() as conn:
+                    cursor = await conn.execute(f"EXPLAIN QUERY PLAN {query}", params or ())
+                    plan = [row[3] for row in await cursor.fetchall()]
+                    await cursor.close()
+            except Exception as e:
+                plan = [f"EXPLAIN failed: {e}"]
         
-        # Insert default super rubrics
-        super_rubrics = [
-            ("job-rubric", "Работа", "Робота", "💼", 1),
-            ("service-rubric", "Услуги", "Послуги", "🛠️", 1),
-        ]
+        query_monitor.log_slow_query(query, duration_ms, wait_ms, rows, plan)
+    
+    async def _open_connection(self, **kwargs):
+        """Open a connection configured the way every Database method expects"""
+        conn = await aiosqlite.connect(self.db_path, cached_statements=DB_STATEMENT_CACHE_SIZE, **kwargs)
+        conn.row_factory = aiosqlite.Row
+        await self._apply_pragmas(conn)
+        await register_sketch_functions(conn)
+        return conn
+    
+    async def _close_connection(self, conn):
+        try:
+            await conn.close()
+        except Exception as e:
+            print(f"Warning: Could not close database connection: {e}")
+    
+    async def _ping(self, conn):
+        try:
+            await conn.execute("SELECT 1")
+            return True
+        except Exception:
+            return False
+    
+    @asynccontextmanager
+    async def _reader(self):
+        """Borrow a reader connection (a short-lived one when the pool is not open)"""
+        if not self.is_pooled:
+            conn = await self._open_connection()
+            try:
+                yield conn
+            finally:
+                await conn.close()
+            return
         
-        for rubric in super_rubrics:
-            await db.execute(
-                "INSERT INTO super_rubrics (id, name_ru, name_ua, icon, is_active) VALUES (?, ?, ?, ?, ?)",
-                rubric
-            )
+        conn = await asyncio.wait_for(self._readers.get(), DB_POOL_TIMEOUT)
+        try:
+            yield conn
+        except (sqlite3.ProgrammingError, ValueError):
+            # Connection itself is unusable - swap it for a fresh one
+            await self._close_connection(conn)
+            conn = await self._open_connection()
+            raise
+        finally:
+            self._readers.put_nowait(conn)
+    
+    @asynccontextmanager
+    async def _writer_connection(self):
+        """Get exclusive access to the writer connection"""
+        if not self.is_pooled:
+            conn = await self._open_connection()
+            try:
+                yield conn
+            finally:
+                await conn.close()
+            return
         
-        # Insert default cities
-        cities = [
-            ("moscow-city", "Москва", "Москва", 1),
-            ("spb-city", "Санкт-Петербург", "Санкт-Петербург", 1),
-            ("kiev-city", "Киев", "Київ", 1),
-            ("kharkiv-city", "Харьков", "Харків", 1),
-            ("odessa-city", "Одесса", "Одеса", 1),
-            ("minsk-city", "Минск", "Мінск", 1),
-        ]
+        async with self._write_lock:
+            yield self._writer
+    
+    async def init_db(self):
+        """
+        Bring the schema up to date through the ordered migrations in migrations.py.
+        A current schema costs a single PRAGMA user_version read.
+        """
+        async with aiosqlite.connect(self.db_path, isolation_level=None) as db:
+            # WAL mode is persistent in the database file, so set it before any table work
+            await self._apply_pragmas(db)
+            await register_search_functions(db)
+            await register_sketch_functions(db)
+            self.schema_report = await run_migrations(db)
         
-        for city in cities:
-            await db.execute(
-                "INSERT INTO cities (id, name_ru, name_ua, is_active) VALUES (?, ?, ?, ?)",
-                city
-            )
+        return self.schema_report
+    
+    @asynccontextmanager
+    async def transaction(self):
+        """
+        Run several writes atomically with one commit:
         
-        # Insert default app settings
-        await db.execute(
-            "INSERT INTO app_settings (id, updated_at) VALUES (?, ?)",
-            ("default", datetime.now().isoformat())
-        )
-        
-        # Insert default packages
-        packages = [
-            (
-                "free-package", "Бесплатный", "Безкоштовний", "free", 0, "rub-id", 7, 30,
-                "1 объявление в неделю|Базовое размещение", "1 оголошення на тиждень|Базове розміщення",
-                0, 0, 0, None, 1, 1, datetime.now().isoformat(), datetime.now().isoformat()
-            ),
-            (
-                "standard-package", "Стандарт", "Стандарт", "standard", 100, "rub-id", 30, 30,
-                "Стандартное размещение|30 дней активности", "Стандартне розміщення|30 днів активності", 
-                0, 0, 0, None, 1, 2, datetime.now().isoformat(), datetime.now().isoformat()
-            ),
-            (
-                "photo-package", "С фото", "З фото", "photo", 150, "rub-id", 30, 30,
-                "Возможность добавить фото|30 дней активности", "Можливість додати фото|30 днів активності",
-                1, 0, 0, None, 1, 3, datetime.now().isoformat(), datetime.now().isoformat()
-            ),
-            (
-                "highlight-package", "Выделение", "Виділення", "highlight", 200, "rub-id", 14, 30,
-                "Выделение цветом|14 дней выделения", "Виділення кольором|14 днів виділення",
-                0, 1, 0, None, 1, 4, datetime.now().isoformat(), datetime.now().isoformat()
-            ),
-            (
-                "boost-package", "Больше показов", "Більше показів", "boost", 300, "rub-id", 7, 30,
-                "Поднятие каждые 3 дня|7 дней активности", "Підняття кожні 3 дні|7 днів активності",
-                0, 0, 1, 3, 1, 5, datetime.now().isoformat(), datetime.now().isoformat()
-            )
-        ]
+            async with db.transaction() as tx:
+                post_id = tx.insert("posts", post_record)
+                tx.update("users", {...}, "id = ?", [user_id])
         
-        for package in packages:
-            await db.execute(
-                """INSERT INTO packages (id, name_ru, name_ua, package_type, price, currency_id, 
-                   duration_days, post_lifetime_days, features_ru, features_ua, has_photo, 
-                   has_highlight, has_boost, boost_interval_days, is_active, sort_order, 
-                   created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                package
+        Nothing is written if the block raises. Per-statement row counts are
+        available in tx.rowcounts after the block exits.
+        """
+        tx = Transaction()
+        yield tx
+        if tx.statements:
+            tx.rowcounts = await self._run_write(
+                lambda conn, wait_ms: tx._run(conn, wait_ms, self._timed_execute)
             )
-        
-        await db.commit()
-        print("Default data initialized successfully")
-
+    
     async def execute(self, query, params=None):
         """Execute a query and return results"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute(query, params or ())
-            await db.commit()
-            return cursor
+        async def operation(conn, wait_ms):
+            return await self._timed_execute(conn, query, params or (), wait_ms)
+        
+        return await self._run_write(operation)
     
-    async def fetchall(self, query, params=None):
-        """Fetch all results from a query"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+    async def fetchall(self, query, params=None, compact=False):
+        """Fetch all results from a query (as a RowSet instead of dicts when compact=True)"""
+        requested = time.perf_counter()
+        async with self._reader() as db:
+            started = time.perf_counter()
             cursor = await db.execute(query, params or ())
             rows = await cursor.fetchall()
+            await cursor.close()
+            self._observe(query, params, (started - requested) * 1000, (time.perf_counter() - started) * 1000, len(rows))
+            if compact:
+                return RowSet(tuple(column[0] for column in cursor.description), rows)
             return [dict(row) for row in rows]
     
     async def fetchone(self, query, params=None):
         """Fetch one result from a query"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        requested = time.perf_counter()
+        async with self._reader() as db:
+            started = time.perf_counter()
             cursor = await db.execute(query, params or ())
             row = await cursor.fetchone()
+            await cursor.close()
+            self._observe(query, params, (started - requested) * 1000, (time.perf_counter() - started) * 1000, 1 if row else 0)
             return dict(row) if row else None
     
+    async def iterate(self, query, params=None, batch_size=500):
+        """
+        Stream a large result set as lists of at most `batch_size` row dicts.
+        A reader connection is held until the iterator is exhausted or closed,
+        so consume it fully (or call aclose()) instead of abandoning it.
+        """
+        requested = time.perf_counter()
+        async with self._reader() as db:
+            wait_ms = (time.perf_counter() - requested) * 1000
+            duration_ms = 0.0
+            total_rows = 0
+            
+            started = time.perf_counter()
+            cursor = await db.execute(query, params or ())
+            try:
+                while True:
+                    rows = await cursor.fetchmany(batch_size)
+                    # Only time spent in SQLite counts, not time the consumer spends per batch
+                    duration_ms += (time.perf_counter() - started) * 1000
+                    if not rows:
+                        break
+                    total_rows += len(rows)
+                    yield [dict(row) for row in rows]
+                    started = time.perf_counter()
+            finally:
+                await cursor.close()
+                self._observe(query, params, wait_ms, duration_ms, total_rows)
+    
     async def insert(self, table, data):
         """Insert data into a table"""
         if 'id' not in data:
             data['id'] = str(uuid.uuid4())
         
-        columns = ', '.join(data.keys())
-        placeholders = ', '.join(['?' for _ in data])
-        query = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
+        query, values = build_insert(table, data)
         
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(query, list(data.values()))
-            await db.commit()
+        async def operation(conn, wait_ms):
+            await self._timed_execute(conn, query, values, wait_ms)
             return data['id']
+        
+        return await self._run_write(operation)
     
     async def update(self, table, data, where_clause, where_params):
         """Update data in a table"""
         data['updated_at'] = datetime.now().isoformat()
-        set_clause = ', '.join([f"{k} = ?" for k in data.keys()])
-        query = f"UPDATE {table} SET {set_clause} WHERE {where_clause}"
+        query, values = build_update(table, data, where_clause, where_params)
         
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(query, list(data.values()) + list(where_params))
-            await db.commit()
+        async def operation(conn, wait_ms):
+            cursor = await self._timed_execute(conn, query, values, wait_ms)
             return cursor.rowcount
+        
+        return await self._run_write(operation)
     
     async def delete(self, table, where_clause, where_params):
         """Delete data from a table"""
         query = f"DELETE FROM {table} WHERE {where_clause}"
         
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(query, where_params)
-            await db.commit()
+        async def operation(conn, wait_ms):
+            cursor = await self._timed_execute(conn, query, where_params, wait_ms)
             return cursor.rowcount
+        
+        return await self._run_write(operation)
+    
+    async def executemany(self, query, params_iter, chunk_size=None):
+        """
+        Run one statement for every parameter set in a sync or async iterable.
+        Parameters are committed in chunks of `chunk_size`; returns rows affected.
+        """
+        total = 0
+        async for chunk in chunked(params_iter, chunk_size or DB_BULK_CHUNK_SIZE):
+            async def operation(conn, wait_ms):
+                cursor = await self._timed_execute(conn, query, chunk, wait_ms, many=True)
+                return cursor.rowcount
+            
+            total += await self._run_write(operation)
+        return total
+    
+    async def insert_many(self, table, rows, chunk_size=None):
+        """Insert dict rows from a sync or async iterable in chunked transactions; returns the ids"""
+        ids = []
+        async for chunk in chunked(rows, chunk_size or DB_BULK_CHUNK_SIZE):
+            for row in chunk:
+                if 'id' not in row:
+                    row['id'] = str(uuid.uuid4())
+                ids.append(row['id'])
+            
+            async def operation(conn, wait_ms):
+                for group in group_by_columns(chunk).values():
+                    query, _ = build_insert(table, group[0])
+                    await self._timed_execute(conn, query, [list(row.values()) for row in group], wait_ms, many=True)
+                    wait_ms = 0.0
+            
+            await self._run_write(operation)
+        return ids
+    
+    async def update_many(self, table, rows, key="id", chunk_size=None):
+        """
+        Update dict rows from a sync or async iterable in chunked transactions.
+        Every row must contain `key`; the remaining columns are set on the row
+        matching it, and rows with no other column are skipped. Unlike update(),
+        updated_at is not added automatically. Returns rows affected.
+        """
+        total = 0
+        async for chunk in chunked(rows, chunk_size or DB_BULK_CHUNK_SIZE):
+            async def operation(conn, wait_ms):
+                affected = 0
+                for group in group_by_columns(chunk).values():
+                    columns = {k: v for k, v in group[0].items() if k != key}
+                    if not columns:
+                        continue
+                    query, _ = build_update(table, columns, f"{key} = ?", [])
+                    cursor = await self._timed_execute(conn, query, [
+                        [v for k, v in row.items() if k != key] + [row[key]]
+                        for row in group
+                    ], wait_ms, many=True)
+                    affected += cursor.rowcount
+                    wait_ms = 0.0
+                return affected
+            
+            total += await self._run_write(operation)
+        return total
 
 # Global database instance
 db = Database()
\ No newline at end of file
@@ -0,0 +1,244 @@
+"""
+In-memory index of the top of the public feed.
+
+For every (post_type, city_id, super_rubric_id) filter combination - None
+meaning "any" - the index keeps the first `capacity` published posts in feed
+order (rank_tier, rank_at, id descending) together with their feed rows, so
+the first pages of the feed are served without a query. It only holds data;
+PostService loads keys from SQL and reports post changes.
+"""
+from bisect import bisect_left
+from collections import OrderedDict
+from itertools import product
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+KEY_COLUMNS = ("post_type", "city_id", "super_rubric_id")
+
+PUBLISHED_STATUS = 4
+
+def sort_key(row) -> Tuple[int, str, str]:
+    return (row["rank_tier"] or 0, row["rank_at"] or "", row["id"])
+
+class FeedKey:
+    """Top of the feed for one filter combination, stored in ascending order (best post last)"""
+    __slots__ = ("sort_keys", "rows", "complete")
+    
+    def __init__(self, complete: bool):
+        self.sort_keys = []
+        self.rows = []
+        # True when every matching post is in the list, not only the top `capacity`
+        self.complete = complete
+
+class HotFeedIndex:
+    """
+    Filter combination -> FeedKey, evicted least-recently-used beyond max_keys.
+    Rows are shared between the keys a post appears under and reference-counted.
+    """
+    
+    def __init__(self, capacity: int, max_keys: int):
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self.columns: Optional[Sequence[str]] = None
+        self.hits = 0
+        self.misses = 0
+        # Bumped on every post change, so a key read from SQL meanwhile is not stored
+        self.generation = 0
+        # Post refreshes: versions taken before their rows were read, the ones still
+        # running, and per post the version of the last refresh applied
+        self._refresh_version = 0
+        self._running_refreshes = set()
+        self._applied_versions: Dict[str, int] = {}
+        self._keys: "OrderedDict[tuple, FeedKey]" = OrderedDict()
+        self._rows: Dict[str, Any] = {}
+        self._refs: Dict[str, int] = {}
+    
+    @staticmethod
+    def key_for(filters: Dict[str, Any]) -> tuple:
+        return tuple(filters.get(column) or None for column in KEY_COLUMNS)
+    
+    @staticmethod
+    def keys_for_row(row) -> List[tuple]:
+        """Every filter combination the post appears under"""
+        return list(product(*((row[column], None) if row[column] else (None,) for column in KEY_COLUMNS)))
+    
+    def has_key(self, key: tuple) -> bool:
+        return key in self._keys
+    
+    def row(self, post_id: str) -> Optional[Any]:
+        """The indexed feed row of a post, if it is in any loaded key"""
+        return self._rows.get(post_id)
+    
+    def build(self, rows: Sequence[Any], complete: bool):
+        """
+        Fill the index from the published feed read in feed order. With complete=False
+        the rows are only the top of the feed, so no key is known to be complete.
+        """
+        self.clear()
+        for row in rows:
+            for key in self.keys_for_row(row):
+                feed_key = self._keys.get(key)
+                if feed_key is None:
+                    if len(self._keys) >= self.max_keys:
+                        continue
+                    feed_key = self._keys[key] = FeedKey(complete)
+                if len(feed_key.rows) >= self.capacity:
+                    feed_key.complete = False
+                    continue
+                # Rows arrive best first; lists are reversed into ascending order below
+                feed_key.sort_keys.append(sort_key(row))
+                feed_key.rows.append(row)
+                self._rows[row["id"]] = row
+                self._refs[row["id"]] = self._refs.get(row["id"], 0) + 1
+        
+        for feed_key in self._keys.values():
+            feed_key.sort_keys.reverse()
+            feed_key.rows.reverse()
+    
+    def load(self, key: tuple, rows: Sequence[Any], complete: bool):
+        """Replace a key with rows read from the feed query (feed order, at most capacity)"""
+        self._drop_key(key)
+        feed_key = self._keys[key] = FeedKey(complete)
+        for row in reversed(rows[:self.capacity]):
+            # A fresher copy of a post drops the stale one from the other keys
+            existing = self._rows.get(row["id"])
+            if existing is not None and sort_key(existing) != sort_key(row):
+                self.remove(row["id"])
+            self._insert(feed_key, row)
+        
+        while len(self._keys) > self.max_keys:
+            self._drop_key(next(iter(self._keys)))
+    
+    def begin_refresh(self) -> int:
+        """Version for a post refresh; take it before the posts are read from SQL"""
+        self._refresh_version += 1
+        self._running_refreshes.add(self._refresh_version)
+        return self._refresh_version
+    
+    def end_refresh(self, version: int):
+        self._running_refreshes.discard(version)
+        if not self._running_refreshes:
+            self._applied_versions.clear()
+    
+    def add(self, row, now: str, version: Optional[int] = None):
+        """
+        Put a changed post back into the keys that are loaded. Posts that are not
+        published or already expired are only removed. A row read by a refresh older
+        than one already applied to the post is stale and ignored.
+        """
+        if not self._claim(row["id"], version):
+            return
+        self.generation += 1
+        self.remove(row["id"])
+        if row["status"] != PUBLISHED_STATUS or not row["expires_at"] or row["expires_at"] <= now:
+            return
+        
+        row_key = sort_key(row)
+        for key in self.keys_for_row(row):
+            feed_key = self._keys.get(key)
+            if feed_key is None:
+                continue
+            # Below the last known entry of a truncated list there may be posts we never loaded
+            if not feed_key.complete and (not feed_key.sort_keys or row_key < feed_key.sort_keys[0]):
+                continue
+            self._insert(feed_key, row)
+            if len(feed_key.rows) > self.capacity:
+                feed_key.sort_keys.pop(0)
+                self._release(feed_key.rows.pop(0)["id"])
+                feed_key.complete = False
+    
+    def remove(self, post_id: str, version: Optional[int] = None):
+        if not self._claim(post_id, version):
+            return
+        self.generation += 1
+        row = self._rows.get(post_id)
+        if row is None:
+            return
+        
+        row_key = sort_key(row)
+        for key in self.keys_for_row(row):
+            feed_key = self._keys.get(key)
+            if feed_key is None:
+                continue
+            index = bisect_left(feed_key.sort_keys, row_key)
+            if index < len(feed_key.sort_keys) and feed_key.sort_keys[index] == row_key:
+                del feed_key.sort_keys[index]
+                del feed_key.rows[index]
+                self._release(post_id)
+    
+    def page(self, key: tuple, offset: int, limit: int, now: str,
+             after: Optional[tuple] = None) -> Optional[Tuple[List[Any], Optional[int]]]:
+        """
+        Rows of one feed page and, for complete keys, the total number of posts.
+        `after` is a keyset position (rank_tier, rank_at, id): the page starts below it.
+        Returns None when the key is not loaded or does not reach that deep.
+        """
+        feed_key = self._keys.get(key)
+        if feed_key is None:
+            self.misses += 1
+            return None
+        self._keys.move_to_end(key)
+        
+        # Posts past expires_at leave the feed before the expiry task archives them
+        expired = [row["id"] for row in feed_key.rows if row["expires_at"] <= now]
+        for post_id in expired:
+            self.remove(post_id)
+        
+        end = len(feed_key.rows) if after is None else bisect_left(feed_key.sort_keys, after)
+        end -= offset
+        start = end - limit
+        if start < 0 and not feed_key.complete:
+            self.misses += 1
+            return None
+        
+        self.hits += 1
+        rows = feed_key.rows[max(start, 0):max(end, 0)][::-1]
+        total = len(feed_key.rows) if feed_key.complete else None
+        return rows, total
+    
+    def clear(self):
+        self._keys.clear()
+        self._rows.clear()
+        self._refs.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "keys": len(self._keys),
+            "max_keys": self.max_keys,
+            "posts": len(self._rows),
+            "capacity_per_key": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0
+        }
+    
+    def _claim(self, post_id: str, version: Optional[int]) -> bool:
+        """False when a newer refresh of the post was applied already"""
+        if version is None:
+            return True
+        if self._applied_versions.get(post_id, 0) > version:
+            return False
+        self._applied_versions[post_id] = version
+        return True
+    
+    def _insert(self, feed_key: FeedKey, row):
+        row_key = sort_key(row)
+        index = bisect_left(feed_key.sort_keys, row_key)
+        feed_key.sort_keys.insert(index, row_key)
+        feed_key.rows.insert(index, row)
+        self._rows[row["id"]] = row
+        self._refs[row["id"]] = self._refs.get(row["id"], 0) + 1
+    
+    def _release(self, post_id: str):
+        refs = self._refs.get(post_id, 0) - 1
+        if refs > 0:
+            self._refs[post_id] = refs
+        else:
+            self._refs.pop(post_id, None)
+            self._rows.pop(post_id, None)
+    
+    def _drop_key(self, key: tuple):
+        feed_key = self._keys.pop(key, None)
+        if feed_key is not None:
+            for row in feed_key.rows:
+                self._release(row["id"])
@@ -14,6 +14,9 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Import configuration
 from config import CORS_ORIGINS
+from database import db
+from services.post_service import PostService
+from view_counter import view_counter
 
 # Import AI Moderation and Background Tasks
 # Temporarily disabled AI moderation due to httpcore issues
@@ -38,6 +41,13 @@ async def lifespan(app: FastAPI):
     # Startup
     print("🚀 Starting Telegram Marketplace API...")
     
+    # Initialize database schema and open the connection pool
+    await db.init_db()
+    await db.connect()
+    await PostService.warm_feed_index()
+    view_counter.start()
+    print("✅ Database ready")
+    
     # Initialize AI moderation services - temporarily disabled
     # await init_moderation_services()
     # print("✅ AI moderation services initialized")
@@ -53,6 +63,8 @@ async def lifespan(app: FastAPI):
     # Shutdown
     print("🛑 Shutting down application...")
     # await stop_background_tasks()
+    await view_counter.stop()
+    await db.close()
     print("✅ Shutdown complete")
 
 # Create FastAPI application
@@ -85,11 +97,16 @@ app.include_router(webhook_router)
 @app.get("/api/health")
 async def health_check():
     """API health check"""
+    database_health = await db.health_check()
+    database_health["feed_cache"] = PostService.feed_cache_stats()
+    database_health["view_counter"] = view_counter.stats()
+    
     return {
         "status": "healthy", 
         "message": "Telegram Marketplace API is running",
         "version": "2.0.0",
-        "architecture": "modular"
+        "architecture": "modular",
+        "database": database_health
     }
 
 # Root endpoint
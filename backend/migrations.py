@@ -0,0 +1,859 @@
+"""
+Schema migrations keyed on PRAGMA user_version.
+
+Every migration runs in its own transaction together with the user_version
+bump, so a failed migration leaves the schema at the previous version. With
+WAL enabled, readers keep working while an index is being built; only writes
+wait for the migration that holds the write lock.
+"""
+import time
+from datetime import datetime
+from typing import Any, Dict
+
+MIGRATIONS = []
+
+def migration(version: int, name: str):
+    """Register a migration; versions must be unique and are applied in ascending order"""
+    def register(func):
+        if any(existing[0] == version for existing in MIGRATIONS):
+            raise ValueError(f"Duplicate migration version: {version}")
+        MIGRATIONS.append((version, name, func))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return func
+    return register
+
+async def add_column(db, table: str, column: str, definition: str):
+    """Add a column unless it already exists (ADD COLUMN does not rewrite the table)"""
+    # table_xinfo also lists generated columns
+    cursor = await db.execute(f"PRAGMA table_xinfo({table})")
+    existing = {row[1] for row in await cursor.fetchall()}
+    await cursor.close()
+    if column not in existing:
+        await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+@migration(1, "baseline schema")
+async def baseline_schema(db):
+    """Tables, indexes and default data of the original schema (safe to run on pre-versioning databases)"""
+    # Users table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            telegram_id INTEGER UNIQUE,
+            first_name TEXT,
+            last_name TEXT,
+            username TEXT,
+            language TEXT DEFAULT 'ru',
+            theme TEXT DEFAULT 'light',
+            is_active BOOLEAN DEFAULT 1,
+            created_at TEXT,
+            updated_at TEXT
+        )
+    """)
+    
+    # Super rubrics (categories) table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS super_rubrics (
+            id TEXT PRIMARY KEY,
+            name_ru TEXT,
+            name_ua TEXT,
+            icon TEXT,
+            is_active BOOLEAN DEFAULT 1
+        )
+    """)
+    
+    # Cities table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS cities (
+            id TEXT PRIMARY KEY,
+            name_ru TEXT,
+            name_ua TEXT,
+            is_active BOOLEAN DEFAULT 1
+        )
+    """)
+    
+    # Currencies table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS currencies (
+            id TEXT PRIMARY KEY,
+            code TEXT UNIQUE,
+            name_ru TEXT,
+            name_ua TEXT,
+            symbol TEXT,
+            is_active BOOLEAN DEFAULT 1,
+            created_at TEXT
+        )
+    """)
+    
+    # Posts table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS posts (
+            id TEXT PRIMARY KEY,
+            title TEXT,
+            description TEXT,
+            post_type TEXT,
+            price REAL,
+            currency_id TEXT,
+            city_id TEXT,
+            super_rubric_id TEXT,
+            author_id TEXT,
+            status INTEGER DEFAULT 1,
+            views_count INTEGER DEFAULT 0,
+            is_premium BOOLEAN DEFAULT 0,
+            package_id TEXT,
+            has_photo BOOLEAN DEFAULT 0,
+            has_highlight BOOLEAN DEFAULT 0,
+            has_boost BOOLEAN DEFAULT 0,
+            post_lifetime_days INTEGER DEFAULT 30,
+            expires_at TEXT,
+            ai_moderation_passed BOOLEAN DEFAULT 0,
+            created_at TEXT,
+            updated_at TEXT,
+            FOREIGN KEY (currency_id) REFERENCES currencies (id),
+            FOREIGN KEY (city_id) REFERENCES cities (id),
+            FOREIGN KEY (super_rubric_id) REFERENCES super_rubrics (id),
+            FOREIGN KEY (author_id) REFERENCES users (id),
+            FOREIGN KEY (package_id) REFERENCES packages (id)
+        )
+    """)
+    
+    # Packages table (тарифы)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS packages (
+            id TEXT PRIMARY KEY,
+            name_ru TEXT,
+            name_ua TEXT,
+            package_type TEXT,
+            price REAL,
+            currency_id TEXT,
+            duration_days INTEGER,
+            post_lifetime_days INTEGER DEFAULT 30,
+            features_ru TEXT,
+            features_ua TEXT,
+            has_photo BOOLEAN DEFAULT 0,
+            has_highlight BOOLEAN DEFAULT 0,
+            has_boost BOOLEAN DEFAULT 0,
+            boost_interval_days INTEGER,
+            is_active BOOLEAN DEFAULT 1,
+            sort_order INTEGER DEFAULT 0,
+            created_at TEXT,
+            updated_at TEXT,
+            FOREIGN KEY (currency_id) REFERENCES currencies (id)
+        )
+    """)
+    
+    # User packages (покупки тарифов)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS user_packages (
+            id TEXT PRIMARY KEY,
+            user_id TEXT,
+            package_id TEXT,
+            post_id TEXT,
+            purchased_at TEXT,
+            expires_at TEXT,
+            is_active BOOLEAN DEFAULT 1,
+            payment_status TEXT DEFAULT 'pending',
+            telegram_charge_id TEXT,
+            provider_charge_id TEXT,
+            amount REAL,
+            currency_code TEXT,
+            created_at TEXT,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (package_id) REFERENCES packages (id),
+            FOREIGN KEY (post_id) REFERENCES posts (id)
+        )
+    """)
+    
+    # User free posts tracking
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS user_free_posts (
+            id TEXT PRIMARY KEY,
+            user_id TEXT,
+            created_at TEXT,
+            next_free_post_at TEXT,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    """)
+    
+    # Post boost schedule
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS post_boost_schedule (
+            id TEXT PRIMARY KEY,
+            post_id TEXT,
+            next_boost_at TEXT,
+            boost_count INTEGER DEFAULT 0,
+            is_active BOOLEAN DEFAULT 1,
+            created_at TEXT,
+            FOREIGN KEY (post_id) REFERENCES posts (id)
+        )
+    """)
+    
+    # AI moderation log
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS ai_moderation_log (
+            id TEXT PRIMARY KEY,
+            post_id TEXT,
+            ai_decision TEXT,
+            ai_confidence REAL,
+            ai_reason TEXT,
+            moderated_at TEXT,
+            FOREIGN KEY (post_id) REFERENCES posts (id)
+        )
+    """)
+    
+    # Favorites table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS favorites (
+            id TEXT PRIMARY KEY,
+            user_id TEXT,
+            post_id TEXT,
+            created_at TEXT,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (post_id) REFERENCES posts (id),
+            UNIQUE(user_id, post_id)
+        )
+    """)
+    
+    # Post views table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS post_views (
+            id TEXT PRIMARY KEY,
+            post_id TEXT,
+            user_id TEXT,
+            viewed_at TEXT,
+            FOREIGN KEY (post_id) REFERENCES posts (id),
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            UNIQUE(post_id, user_id)
+        )
+    """)
+    
+    # App settings table
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS app_settings (
+            id TEXT PRIMARY KEY,
+            show_view_counts BOOLEAN DEFAULT 1,
+            telegram_bot_token TEXT,
+            telegram_payment_token TEXT,
+            telegram_moderator_chat_id TEXT,
+            telegram_moderator_username TEXT,
+            mistral_api_key TEXT,
+            app_name TEXT DEFAULT 'Telegram Marketplace',
+            app_description TEXT DEFAULT 'Платформа частных объявлений',
+            free_posts_per_week INTEGER DEFAULT 1,
+            moderation_enabled BOOLEAN DEFAULT 1,
+            ai_moderation_enabled BOOLEAN DEFAULT 1,
+            post_lifetime_days INTEGER DEFAULT 30,
+            updated_at TEXT
+        )
+    """)
+    
+    # Create performance indexes
+    indexes = [
+        # Posts table indexes (most critical for performance)
+        "CREATE INDEX IF NOT EXISTS idx_posts_status ON posts(status)",
+        "CREATE INDEX IF NOT EXISTS idx_posts_created_at ON posts(created_at DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_posts_author_id ON posts(author_id)",
+        "CREATE INDEX IF NOT EXISTS idx_posts_type ON posts(post_type)",
+        "CREATE INDEX IF NOT EXISTS idx_posts_category ON posts(super_rubric_id)",
+        "CREATE INDEX IF NOT EXISTS idx_posts_city ON posts(city_id)",
+        "CREATE INDEX IF NOT EXISTS idx_posts_expires_at ON posts(expires_at)",
+        "CREATE INDEX IF NOT EXISTS idx_posts_status_type ON posts(status, post_type)",
+        "CREATE INDEX IF NOT EXISTS idx_posts_status_created ON posts(status, created_at DESC)",
+        
+        # Full-text search index for posts
+        "CREATE INDEX IF NOT EXISTS idx_posts_title ON posts(title)",
+        
+        # Users table indexes
+        "CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users(telegram_id)",
+        "CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(created_at)",
+        
+        # Favorites table indexes
+        "CREATE INDEX IF NOT EXISTS idx_favorites_user_id ON favorites(user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_favorites_post_id ON favorites(post_id)",
+        "CREATE INDEX IF NOT EXISTS idx_favorites_created_at ON favorites(created_at)",
+        
+        # Post views table indexes
+        "CREATE INDEX IF NOT EXISTS idx_post_views_post_id ON post_views(post_id)",
+        "CREATE INDEX IF NOT EXISTS idx_post_views_user_id ON post_views(user_id)",
+        
+        # User packages table indexes
+        "CREATE INDEX IF NOT EXISTS idx_user_packages_user_id ON user_packages(user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_user_packages_status ON user_packages(payment_status)",
+        "CREATE INDEX IF NOT EXISTS idx_user_packages_created ON user_packages(created_at)",
+        
+        # User free posts table indexes
+        "CREATE INDEX IF NOT EXISTS idx_user_free_posts_user_id ON user_free_posts(user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_user_free_posts_next_free ON user_free_posts(next_free_post_at)",
+        
+        # Post boost schedule table indexes
+        "CREATE INDEX IF NOT EXISTS idx_post_boost_schedule_post_id ON post_boost_schedule(post_id)",
+        "CREATE INDEX IF NOT EXISTS idx_post_boost_schedule_next_boost ON post_boost_schedule(next_boost_at)",
+        "CREATE INDEX IF NOT EXISTS idx_post_boost_schedule_active ON post_boost_schedule(is_active)",
+        
+        # AI moderation log indexes
+        "CREATE INDEX IF NOT EXISTS idx_ai_moderation_log_post_id ON ai_moderation_log(post_id)",
+        "CREATE INDEX IF NOT EXISTS idx_ai_moderation_log_moderated_at ON ai_moderation_log(moderated_at)",
+    ]
+    
+    for index_sql in indexes:
+        try:
+            await db.execute(index_sql)
+        except Exception as e:
+            print(f"Warning: Could not create index: {e}")
+    
+    await _insert_default_data(db)
+
+@migration(2, "users.language_code")
+async def users_language_code(db):
+    """The users router stores language_code, which the baseline users table lacks"""
+    await add_column(db, "users", "language_code", "TEXT DEFAULT 'ru'")
+
+@migration(3, "posts full-text search")
+async def posts_full_text_search(db):
+    """
+    FTS5 index over posts title/description, kept in sync by triggers.
+    The FTS rowid mirrors posts.rowid so the triggers touch a single row;
+    post_id is stored as well and is what searches join on.
+    """
+    await db.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+            post_id UNINDEXED,
+            title,
+            description,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+    """)
+    
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts BEGIN
+            INSERT INTO posts_fts (rowid, post_id, title, description)
+            VALUES (new.rowid, new.id, new.title, new.description);
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS posts_fts_update AFTER UPDATE OF id, title, description ON posts BEGIN
+            DELETE FROM posts_fts WHERE rowid = old.rowid;
+            INSERT INTO posts_fts (rowid, post_id, title, description)
+            VALUES (new.rowid, new.id, new.title, new.description);
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS posts_fts_delete AFTER DELETE ON posts BEGIN
+            DELETE FROM posts_fts WHERE rowid = old.rowid;
+        END
+    """)
+    
+    # Backfill existing posts
+    await db.execute("DELETE FROM posts_fts")
+    await db.execute("""
+        INSERT INTO posts_fts (rowid, post_id, title, description)
+        SELECT rowid, id, title, description FROM posts
+    """)
+
+@migration(4, "stemmed search terms")
+async def stemmed_search_terms(db):
+    """
+    Rebuild posts_fts over normalised Russian/Ukrainian stems instead of raw text.
+    The triggers call search_terms() (search_index.py), which Database registers
+    on every connection it opens.
+    """
+    for trigger in ("posts_fts_insert", "posts_fts_update", "posts_fts_delete"):
+        await db.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    await db.execute("DROP TABLE IF EXISTS posts_fts")
+    
+    await db.execute("""
+        CREATE VIRTUAL TABLE posts_fts USING fts5(
+            post_id UNINDEXED,
+            title,
+            description,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+    """)
+    
+    await db.execute("""
+        CREATE TRIGGER posts_fts_insert AFTER INSERT ON posts BEGIN
+            INSERT INTO posts_fts (rowid, post_id, title, description)
+            VALUES (new.rowid, new.id, search_terms(new.title), search_terms(new.description));
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER posts_fts_update AFTER UPDATE OF id, title, description ON posts BEGIN
+            DELETE FROM posts_fts WHERE rowid = old.rowid;
+            INSERT INTO posts_fts (rowid, post_id, title, description)
+            VALUES (new.rowid, new.id, search_terms(new.title), search_terms(new.description));
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER posts_fts_delete AFTER DELETE ON posts BEGIN
+            DELETE FROM posts_fts WHERE rowid = old.rowid;
+        END
+    """)
+    
+    await db.execute("""
+        INSERT INTO posts_fts (rowid, post_id, title, description)
+        SELECT rowid, id, search_terms(title), search_terms(description) FROM posts
+    """)
+
+@migration(5, "feed keyset indexes")
+async def feed_keyset_indexes(db):
+    """
+    Feed pages are read in (created_at, id) order so keyset cursors resolve with one
+    index seek. These replace the single-column created_at and author_id indexes.
+    """
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_posts_created_id ON posts(created_at DESC, id DESC)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_posts_author_created_id ON posts(author_id, created_at DESC, id DESC)")
+    await db.execute("DROP INDEX IF EXISTS idx_posts_created_at")
+    await db.execute("DROP INDEX IF EXISTS idx_posts_author_id")
+
+@migration(6, "post facet counters")
+async def post_facet_counters(db):
+    """
+    Post counts per (post_type, super_rubric_id, city_id, status) combination, kept
+    current by triggers so feed facets are summed from a few hundred counter rows
+    instead of grouping the posts table. NULL values are stored as ''.
+    """
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS post_facet_counts (
+            post_type TEXT NOT NULL,
+            super_rubric_id TEXT NOT NULL,
+            city_id TEXT NOT NULL,
+            status INTEGER NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (post_type, super_rubric_id, city_id, status)
+        )
+    """)
+    
+    increment = """
+            INSERT INTO post_facet_counts (post_type, super_rubric_id, city_id, status, count)
+            VALUES (coalesce(new.post_type, ''), coalesce(new.super_rubric_id, ''),
+                    coalesce(new.city_id, ''), coalesce(new.status, 0), 1)
+            ON CONFLICT (post_type, super_rubric_id, city_id, status) DO UPDATE SET count = count + 1;
+    """
+    decrement = """
+            UPDATE post_facet_counts SET count = count - 1
+            WHERE post_type = coalesce(old.post_type, '') AND super_rubric_id = coalesce(old.super_rubric_id, '')
+              AND city_id = coalesce(old.city_id, '') AND status = coalesce(old.status, 0);
+    """
+    await db.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS post_facet_counts_insert AFTER INSERT ON posts BEGIN
+            {increment}
+        END
+    """)
+    await db.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS post_facet_counts_update
+        AFTER UPDATE OF post_type, super_rubric_id, city_id, status ON posts
+        WHEN old.post_type IS NOT new.post_type OR old.super_rubric_id IS NOT new.super_rubric_id
+          OR old.city_id IS NOT new.city_id OR old.status IS NOT new.status
+        BEGIN
+            {decrement}
+            {increment}
+        END
+    """)
+    await db.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS post_facet_counts_delete AFTER DELETE ON posts BEGIN
+            {decrement}
+        END
+    """)
+    
+    await db.execute("DELETE FROM post_facet_counts")
+    await db.execute("""
+        INSERT INTO post_facet_counts (post_type, super_rubric_id, city_id, status, count)
+        SELECT coalesce(post_type, ''), coalesce(super_rubric_id, ''), coalesce(city_id, ''),
+               coalesce(status, 0), COUNT(*)
+        FROM posts
+        GROUP BY 1, 2, 3, 4
+    """)
+
+@migration(7, "feed ranking")
+async def feed_ranking(db):
+    """
+    Feed order is (rank_tier, rank_at, id), all descending: highlighted posts (tier 2)
+    come before other paid posts (tier 1) and free posts (tier 0), and within a tier
+    rank_at is the creation time until the boost scheduler moves it forward.
+    rank_tier is a virtual generated column, so it follows has_highlight/is_premium edits.
+    """
+    await add_column(db, "posts", "rank_at", "TEXT")
+    await add_column(
+        db, "posts", "rank_tier",
+        "INTEGER GENERATED ALWAYS AS (CASE WHEN has_highlight THEN 2 WHEN is_premium THEN 1 ELSE 0 END) VIRTUAL"
+    )
+    await db.execute("UPDATE posts SET rank_at = created_at WHERE rank_at IS NULL")
+    
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_posts_feed_type_city_rank
+        ON posts(status, post_type, city_id, rank_tier DESC, rank_at DESC, id DESC)
+    """)
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_posts_author_rank
+        ON posts(author_id, rank_tier DESC, rank_at DESC, id DESC)
+    """)
+    await db.execute("DROP INDEX IF EXISTS idx_posts_author_created_id")
+
+# Every combination of the feed's equality filters, each with an index per sort
+# mode (migrations 8 and 9); index names use the short column names
+FEED_FILTER_COMBINATIONS = [
+    (),
+    ("post_type",),
+    ("city_id",),
+    ("super_rubric_id",),
+    ("post_type", "city_id"),
+    ("post_type", "super_rubric_id"),
+    ("city_id", "super_rubric_id"),
+    ("post_type", "city_id", "super_rubric_id"),
+]
+FEED_FILTER_SHORT_NAMES = {"post_type": "type", "city_id": "city", "super_rubric_id": "rubric"}
+
+@migration(8, "published feed indexes")
+async def published_feed_indexes(db):
+    """
+    One index per combination of the feed's equality filters, each led by status and
+    ordered like the feed, so every published-feed page is an index range in feed
+    order (an author's feed goes through author_id, status). expires_at trails the
+    key so the unexpired check and the feed counts are answered from the index
+    without visiting the table.
+    """
+    # Replaced by idx_posts_feed_type_city (same key plus expires_at) and
+    # idx_posts_feed_author (an author's posts are few, listing all statuses sorts them)
+    await db.execute("DROP INDEX IF EXISTS idx_posts_feed_type_city_rank")
+    await db.execute("DROP INDEX IF EXISTS idx_posts_author_rank")
+    
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_posts_feed_author
+        ON posts(author_id, status, rank_tier DESC, rank_at DESC, id DESC, expires_at)
+    """)
+    
+    for columns in FEED_FILTER_COMBINATIONS:
+        name = "_".join(["idx_posts_feed", *(FEED_FILTER_SHORT_NAMES[column] for column in columns)])
+        key = ", ".join(["status", *columns, "rank_tier DESC", "rank_at DESC", "id DESC", "expires_at"])
+        await db.execute(f"CREATE INDEX IF NOT EXISTS {name} ON posts({key})")
+
+@migration(9, "price and sort indexes")
+async def price_and_sort_indexes(db):
+    """
+    posts.price_base is the price converted to the base currency (RUB) with
+    currencies.base_rate, kept by triggers when a post's price or currency or a
+    rate changes, so posts in different currencies compare by price. A price
+    without a currency counts as base currency.
+    The published-feed indexes are repeated for the price and views sorts, so every
+    sort mode reads its pages in index order for any filter combination.
+    """
+    await add_column(db, "currencies", "base_rate", "REAL")
+    # Approximate seed rates; editing currencies.base_rate re-prices the posts
+    for code, rate in (("RUB", 1.0), ("USD", 90.0), ("EUR", 98.0), ("UAH", 2.2)):
+        await db.execute("UPDATE currencies SET base_rate = ? WHERE code = ? AND base_rate IS NULL", [rate, code])
+    
+    await add_column(db, "posts", "price_base", "REAL")
+    price_base = """new.price * CASE WHEN new.currency_id IS NULL THEN 1.0
+                                      ELSE (SELECT base_rate FROM currencies WHERE id = new.currency_id) END"""
+    await db.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS posts_price_base_insert AFTER INSERT ON posts BEGIN
+            UPDATE posts SET price_base = {price_base} WHERE rowid = new.rowid;
+        END
+    """)
+    await db.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS posts_price_base_update AFTER UPDATE OF price, currency_id ON posts BEGIN
+            UPDATE posts SET price_base = {price_base} WHERE rowid = new.rowid;
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS currencies_base_rate_update AFTER UPDATE OF base_rate ON currencies BEGIN
+            UPDATE posts SET price_base = price * new.base_rate WHERE currency_id = new.id;
+        END
+    """)
+    await db.execute("""
+        UPDATE posts SET price_base = price * CASE WHEN currency_id IS NULL THEN 1.0
+                                                   ELSE (SELECT base_rate FROM currencies WHERE id = posts.currency_id) END
+    """)
+    
+    # price_desc reads the price indexes backwards
+    orders = {"price": ["price_base", "id"], "views": ["views_count DESC", "id DESC"]}
+    
+    for order_name, order in orders.items():
+        for columns in FEED_FILTER_COMBINATIONS:
+            name = "_".join([f"idx_posts_{order_name}", *(FEED_FILTER_SHORT_NAMES[column] for column in columns)])
+            key = ", ".join(["status", *columns, *order, "expires_at"])
+            await db.execute(f"CREATE INDEX IF NOT EXISTS {name} ON posts({key})")
+
+@migration(10, "post viewer sketches")
+async def post_viewer_sketches(db):
+    """
+    Per-post HyperLogLog (distinct viewers) and bloom filter (viewers possibly seen)
+    blobs, see view_sketch.py. Rows go away with their post.
+    """
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS post_view_sketches (
+            post_id TEXT PRIMARY KEY,
+            hll BLOB,
+            bloom BLOB,
+            updated_at TEXT
+        )
+    """)
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS post_view_sketches_delete AFTER DELETE ON posts BEGIN
+            DELETE FROM post_view_sketches WHERE post_id = old.id;
+        END
+    """)
+
+@migration(11, "minimum stem length")
+async def minimum_stem_length(db):
+    """Re-stem posts_fts after search_index.stem() stopped cutting words below MIN_STEM_LENGTH"""
+    await db.execute("DELETE FROM posts_fts")
+    await db.execute("""
+        INSERT INTO posts_fts (rowid, post_id, title, description)
+        SELECT rowid, id, search_terms(title), search_terms(description) FROM posts
+    """)
+
+@migration(12, "trim posts indexes")
+async def trim_posts_indexes(db):
+    """
+    Every posts index is rewritten when its columns change, and status changes and
+    view flushes touch dozens of them. Drop the ones nothing needs any more:
+    status/status_type are prefixes of idx_posts_feed/idx_posts_feed_type, title was
+    for LIKE search (now posts_fts), and the views sort keeps only idx_posts_views.
+    """
+    await db.execute("DROP INDEX IF EXISTS idx_posts_status")
+    await db.execute("DROP INDEX IF EXISTS idx_posts_status_type")
+    await db.execute("DROP INDEX IF EXISTS idx_posts_title")
+    for suffix in ("type", "city", "rubric", "type_city", "type_rubric", "city_rubric", "type_city_rubric"):
+        await db.execute(f"DROP INDEX IF EXISTS idx_posts_views_{suffix}")
+
+@migration(13, "facet counters by expiry day")
+async def facet_counters_by_expiry_day(db):
+    """
+    Bucket post_facet_counts by the day posts expire (first 10 characters of
+    expires_at), so the published feed's facets sum the buckets after today and
+    count only today's posts from the table, without an expiry sweep.
+    """
+    for trigger in ("post_facet_counts_insert", "post_facet_counts_update", "post_facet_counts_delete"):
+        await db.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    await db.execute("DROP TABLE IF EXISTS post_facet_counts")
+    
+    await db.execute("""
+        CREATE TABLE post_facet_counts (
+            post_type TEXT NOT NULL,
+            super_rubric_id TEXT NOT NULL,
+            city_id TEXT NOT NULL,
+            status INTEGER NOT NULL,
+            expiry_day TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (post_type, super_rubric_id, city_id, status, expiry_day)
+        )
+    """)
+    
+    increment = """
+            INSERT INTO post_facet_counts (post_type, super_rubric_id, city_id, status, expiry_day, count)
+            VALUES (coalesce(new.post_type, ''), coalesce(new.super_rubric_id, ''), coalesce(new.city_id, ''),
+                    coalesce(new.status, 0), substr(coalesce(new.expires_at, ''), 1, 10), 1)
+            ON CONFLICT (post_type, super_rubric_id, city_id, status, expiry_day) DO UPDATE SET count = count + 1;
+    """
+    decrement = """
+            UPDATE post_facet_counts SET count = count - 1
+            WHERE post_type = coalesce(old.post_type, '') AND super_rubric_id = coalesce(old.super_rubric_id, '')
+              AND city_id = coalesce(old.city_id, '') AND status = coalesce(old.status, 0)
+              AND expiry_day = substr(coalesce(old.expires_at, ''), 1, 10);
+    """
+    await db.execute(f"""
+        CREATE TRIGGER post_facet_counts_insert AFTER INSERT ON posts BEGIN
+            {increment}
+        END
+    """)
+    await db.execute(f"""
+        CREATE TRIGGER post_facet_counts_update
+        AFTER UPDATE OF post_type, super_rubric_id, city_id, status, expires_at ON posts
+        WHEN old.post_type IS NOT new.post_type OR old.super_rubric_id IS NOT new.super_rubric_id
+          OR old.city_id IS NOT new.city_id OR old.status IS NOT new.status
+          OR substr(old.expires_at, 1, 10) IS NOT substr(new.expires_at, 1, 10)
+        BEGIN
+            {decrement}
+            {increment}
+        END
+    """)
+    await db.execute(f"""
+        CREATE TRIGGER post_facet_counts_delete AFTER DELETE ON posts BEGIN
+            {decrement}
+        END
+    """)
+    
+    await db.execute("""
+        INSERT INTO post_facet_counts (post_type, super_rubric_id, city_id, status, expiry_day, count)
+        SELECT coalesce(post_type, ''), coalesce(super_rubric_id, ''), coalesce(city_id, ''),
+               coalesce(status, 0), substr(coalesce(expires_at, ''), 1, 10), COUNT(*)
+        FROM posts
+        GROUP BY 1, 2, 3, 4, 5
+    """)
+
+@migration(14, "plain SQL search triggers")
+async def plain_sql_search_triggers(db):
+    """
+    Store the stems of title and description on posts (title_terms and
+    description_terms, computed by search_index.with_search_terms() in the
+    writer's own unit of work) and have the posts_fts triggers copy them, so the
+    triggers are plain SQL and any sqlite connection can write to posts.
+    """
+    for trigger in ("posts_fts_insert", "posts_fts_update", "posts_fts_delete"):
+        await db.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    await add_column(db, "posts", "title_terms", "TEXT")
+    await add_column(db, "posts", "description_terms", "TEXT")
+    # search_terms() is registered on the migration connection only
+    await db.execute("UPDATE posts SET title_terms = search_terms(title), description_terms = search_terms(description)")
+    
+    await db.execute("""
+        CREATE TRIGGER posts_fts_insert AFTER INSERT ON posts BEGIN
+            INSERT INTO posts_fts (rowid, post_id, title, description)
+            VALUES (new.rowid, new.id, new.title_terms, new.description_terms);
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER posts_fts_update AFTER UPDATE OF id, title_terms, description_terms ON posts BEGIN
+            DELETE FROM posts_fts WHERE rowid = old.rowid;
+            INSERT INTO posts_fts (rowid, post_id, title, description)
+            VALUES (new.rowid, new.id, new.title_terms, new.description_terms);
+        END
+    """)
+    await db.execute("""
+        CREATE TRIGGER posts_fts_delete AFTER DELETE ON posts BEGIN
+            DELETE FROM posts_fts WHERE rowid = old.rowid;
+        END
+    """)
+    
+    await db.execute("DELETE FROM posts_fts")
+    await db.execute("""
+        INSERT INTO posts_fts (rowid, post_id, title, description)
+        SELECT rowid, id, title_terms, description_terms FROM posts
+    """)
+
+async def _insert_default_data(db):
+    """Initialize default categories, currencies, and cities"""
+    # Check if data already exists
+    cursor = await db.execute("SELECT COUNT(*) FROM super_rubrics")
+    count = await cursor.fetchone()
+    if count[0] > 0:
+        return
+    
+    # Insert default currencies
+    currencies = [
+        ("rub-id", "RUB", "Российский рубль", "Російський рубль", "₽", 1, datetime.now().isoformat()),
+        ("usd-id", "USD", "Доллар США", "Долар США", "$", 1, datetime.now().isoformat()),
+        ("eur-id", "EUR", "Евро", "Євро", "€", 1, datetime.now().isoformat()),
+        ("uah-id", "UAH", "Украинская гривна", "Українська гривня", "₴", 1, datetime.now().isoformat()),
+    ]
+    
+    await db.executemany(
+        "INSERT INTO currencies (id, code, name_ru, name_ua, symbol, is_active, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        currencies
+    )
+    
+    # Insert default super rubrics
+    super_rubrics = [
+        ("job-rubric", "Работа", "Робота", "💼", 1),
+        ("service-rubric", "Услуги", "Послуги", "🛠️", 1),
+    ]
+    
+    await db.executemany(
+        "INSERT INTO super_rubrics (id, name_ru, name_ua, icon, is_active) VALUES (?, ?, ?, ?, ?)",
+        super_rubrics
+    )
+    
+    # Insert default cities
+    cities = [
+        ("moscow-city", "Москва", "Москва", 1),
+        ("spb-city", "Санкт-Петербург", "Санкт-Петербург", 1),
+        ("kiev-city", "Киев", "Київ", 1),
+        ("kharkiv-city", "Харьков", "Харків", 1),
+        ("odessa-city", "Одесса", "Одеса", 1),
+        ("minsk-city", "Минск", "Мінск", 1),
+    ]
+    
+    await db.executemany(
+        "INSERT INTO cities (id, name_ru, name_ua, is_active) VALUES (?, ?, ?, ?)",
+        cities
+    )
+    
+    # Insert default app settings
+    await db.execute(
+        "INSERT INTO app_settings (id, updated_at) VALUES (?, ?)",
+        ("default", datetime.now().isoformat())
+    )
+    
+    # Insert default packages
+    packages = [
+        (
+            "free-package", "Бесплатный", "Безкоштовний", "free", 0, "rub-id", 7, 30,
+            "1 объявление в неделю|Базовое размещение", "1 оголошення на тиждень|Базове розміщення",
+            0, 0, 0, None, 1, 1, datetime.now().isoformat(), datetime.now().isoformat()
+        ),
+        (
+            "standard-package", "Стандарт", "Стандарт", "standard", 100, "rub-id", 30, 30,
+            "Стандартное размещение|30 дней активности", "Стандартне розміщення|30 днів активності", 
+            0, 0, 0, None, 1, 2, datetime.now().isoformat(), datetime.now().isoformat()
+        ),
+        (
+            "photo-package", "С фото", "З фото", "photo", 150, "rub-id", 30, 30,
+            "Возможность добавить фото|30 дней активности", "Можливість додати фото|30 днів активності",
+            1, 0, 0, None, 1, 3, datetime.now().isoformat(), datetime.now().isoformat()
+        ),
+        (
+            "highlight-package", "Выделение", "Виділення", "highlight", 200, "rub-id", 14, 30,
+            "Выделение цветом|14 дней выделения", "Виділення кольором|14 днів виділення",
+            0, 1, 0, None, 1, 4, datetime.now().isoformat(), datetime.now().isoformat()
+        ),
+        (
+            "boost-package", "Больше показов", "Більше показів", "boost", 300, "rub-id", 7, 30,
+            "Поднятие каждые 3 дня|7 дней активности", "Підняття кожні 3 дні|7 днів активності",
+            0, 0, 1, 3, 1, 5, datetime.now().isoformat(), datetime.now().isoformat()
+        )
+    ]
+    
+    await db.executemany(
+        """INSERT INTO packages (id, name_ru, name_ua, package_type, price, currency_id, 
+           duration_days, post_lifetime_days, features_ru, features_ua, has_photo, 
+           has_highlight, has_boost, boost_interval_days, is_active, sort_order, 
+           created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        packages
+    )
+    
+    print("Default data initialized successfully")
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+async def run_migrations(db) -> Dict[str, Any]:
+    """
+    Apply pending migrations on a connection opened with isolation_level=None.
+    When the schema is current this is a single PRAGMA read.
+    Returns a report with the time spent per migration.
+    """
+    started = time.perf_counter()
+    cursor = await db.execute("PRAGMA user_version")
+    current_version = (await cursor.fetchone())[0]
+    await cursor.close()
+    
+    applied = []
+    for version, name, func in MIGRATIONS:
+        if version <= current_version:
+            continue
+        
+        step_started = time.perf_counter()
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            await func(db)
+            await db.execute(f"PRAGMA user_version = {version}")
+            await db.execute("COMMIT")
+        except Exception:
+            await db.execute("ROLLBACK")
+            print(f"❌ Migration {version} ({name}) failed, schema left at version {current_version}")
+            raise
+        
+        duration_ms = round((time.perf_counter() - step_started) * 1000, 2)
+        applied.append({"version": version, "name": name, "duration_ms": duration_ms})
+        print(f"  🗄️ Migration {version} ({name}) applied in {duration_ms} ms")
+        current_version = version
+    
+    report = {
+        "schema_version": current_version,
+        "up_to_date": not applied,
+        "migrations": applied,
+        "startup_ms": round((time.perf_counter() - started) * 1000, 2),
+        "checked_at": datetime.now().isoformat()
+    }
+    if not applied:
+        print(f"Database schema is current (version {current_version}), checked in {report['startup_ms']} ms")
+    return report
@@ -2,7 +2,7 @@
 Post-related Pydantic models
 """
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Literal
 from datetime import datetime
 
 class PostBase(BaseModel):
@@ -46,5 +46,11 @@ class PostFilter(BaseModel):
     author_id: Optional[str] = None
     super_rubric_id: Optional[str] = None
     city_id: Optional[str] = None
+    currency_id: Optional[str] = None
+    has_photo: Optional[bool] = None
+    price_min: Optional[float] = Field(None, ge=0)
+    price_max: Optional[float] = Field(None, ge=0)
+    price_currency_id: Optional[str] = None  # Currency of price_min/price_max
+    sort: Literal["newest", "price_asc", "price_desc", "views"] = "newest"
     page: int = Field(1, ge=1)
     limit: int = Field(20, ge=1, le=50)
\ No newline at end of file
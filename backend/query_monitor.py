@@ -0,0 +1,139 @@
+"""
+Query instrumentation for Database - per-fingerprint timings and a slow-query log
+"""
+import json
+import re
+from collections import deque
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+@lru_cache(maxsize=2048)
+def fingerprint(query: str) -> str:
+    """Normalise SQL so queries that differ only in literals or IN-list length share a fingerprint"""
+    normalized = _STRING_LITERAL.sub("?", query)
+    normalized = _NUMBER_LITERAL.sub("?", normalized)
+    normalized = _PLACEHOLDER_LIST.sub("(...)", normalized)
+    return _WHITESPACE.sub(" ", normalized).strip()
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(percent / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+class QueryStats:
+    """Rolling statistics for one query fingerprint"""
+    
+    def __init__(self, sample_size: int):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.durations = deque(maxlen=sample_size)
+        self.waits = deque(maxlen=sample_size)
+    
+    def add(self, duration_ms: float, wait_ms: float, rows: int):
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        self.rows += rows
+        self.durations.append(duration_ms)
+        self.waits.append(wait_ms)
+    
+    def summary(self) -> Dict[str, Any]:
+        durations = sorted(self.durations)
+        waits = sorted(self.waits)
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0,
+            "p50_ms": round(_percentile(durations, 50), 3),
+            "p95_ms": round(_percentile(durations, 95), 3),
+            "p99_ms": round(_percentile(durations, 99), 3),
+            "max_ms": round(self.max_ms, 3),
+            "wait_p50_ms": round(_percentile(waits, 50), 3),
+            "wait_p95_ms": round(_percentile(waits, 95), 3),
+            "avg_rows": round(self.rows / self.count, 2) if self.count else 0
+        }
+
+class QueryMonitor:
+    """
+    Collects timings for every Database call.
+    
+    Execution time and wait-for-connection time are kept per fingerprint in
+    rolling windows of `sample_size` samples. Queries slower than
+    `slow_query_ms` are kept in a bounded slow-query log (and appended to
+    `slow_query_log_path` as JSON lines when configured).
+    """
+    
+    def __init__(self, enabled: bool = True, slow_query_ms: float = 100,
+                 sample_size: int = 500, slow_log_size: int = 100,
+                 slow_query_log_path: Optional[str] = None):
+        self.enabled = enabled
+        self.slow_query_ms = slow_query_ms
+        self.sample_size = sample_size
+        self.slow_query_log_path = slow_query_log_path
+        self.started_at = datetime.now().isoformat()
+        self._stats: Dict[str, QueryStats] = {}
+        self._slow_queries = deque(maxlen=slow_log_size)
+    
+    def record(self, query: str, duration_ms: float, wait_ms: float = 0.0, rows: int = 0) -> bool:
+        """Record one execution; returns True when it crossed the slow-query threshold"""
+        if not self.enabled:
+            return False
+        
+        key = fingerprint(query)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = QueryStats(self.sample_size)
+        stats.add(duration_ms, wait_ms, max(rows, 0))
+        
+        return duration_ms >= self.slow_query_ms
+    
+    def log_slow_query(self, query: str, duration_ms: float, wait_ms: float, rows: int, plan: Optional[List[str]]):
+        """Add an entry to the slow-query log"""
+        entry = {
+            "fingerprint": fingerprint(query),
+            "duration_ms": round(duration_ms, 3),
+            "wait_ms": round(wait_ms, 3),
+            "rows": rows,
+            "query_plan": plan,
+            "at": datetime.now().isoformat()
+        }
+        self._slow_queries.append(entry)
+        print(f"🐢 Slow query ({entry['duration_ms']} ms): {entry['fingerprint'][:200]}")
+        
+        if self.slow_query_log_path:
+            try:
+                with open(self.slow_query_log_path, "a", encoding="utf-8") as log_file:
+                    log_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            except OSError as e:
+                print(f"Warning: Could not write slow query log: {e}")
+    
+    def reset(self):
+        self._stats.clear()
+        self._slow_queries.clear()
+        self.started_at = datetime.now().isoformat()
+    
+    def snapshot(self, limit: int = 50) -> Dict[str, Any]:
+        """Aggregate statistics ordered by total time spent, plus the recent slow queries"""
+        queries = [
+            {"fingerprint": key, **stats.summary()}
+            for key, stats in self._stats.items()
+        ]
+        queries.sort(key=lambda item: item["total_ms"], reverse=True)
+        
+        return {
+            "enabled": self.enabled,
+            "since": self.started_at,
+            "slow_query_ms": self.slow_query_ms,
+            "fingerprints": len(queries),
+            "queries": queries[:limit],
+            "slow_queries": list(reversed(self._slow_queries))
+        }
@@ -0,0 +1,57 @@
+"""
+In-process copy of the reference tables posts point to (cities, currencies,
+super rubrics). They hold a few dozen rows and change only through the admin
+panel, so they are read whole and kept in memory; feed rows are expanded with
+them without joins or per-row queries.
+"""
+import time
+from typing import Any, Dict, Optional
+from database import db
+
+# Expandable objects: name -> (table, posts column, columns)
+REFERENCE_TABLES = {
+    "city": ("cities", "city_id", ("id", "name_ru", "name_ua")),
+    "currency": ("currencies", "currency_id", ("id", "code", "symbol", "name_ru", "name_ua")),
+    "super_rubric": ("super_rubrics", "super_rubric_id", ("id", "name_ru", "name_ua", "icon")),
+}
+
+class ReferenceCache:
+    """
+    name -> {id: object} for every REFERENCE_TABLES table, including inactive rows
+    (posts keep pointing to them). Reloaded after `ttl` seconds or invalidate().
+    """
+    
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.loads = 0
+        self.hits = 0
+        self._objects: Optional[Dict[str, Dict[str, Dict[str, Any]]]] = None
+        self._loaded_at = 0.0
+    
+    async def get(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        if self._objects is not None and time.monotonic() - self._loaded_at < self.ttl:
+            self.hits += 1
+            return self._objects
+        
+        objects = {}
+        for name, (table, _, columns) in REFERENCE_TABLES.items():
+            rows = await db.fetchall(f"SELECT {', '.join(columns)} FROM {table}")
+            objects[name] = {row["id"]: row for row in rows}
+        self._objects = objects
+        self._loaded_at = time.monotonic()
+        self.loads += 1
+        return objects
+    
+    def invalidate(self):
+        self._objects = None
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.loads
+        return {
+            "loaded": self._objects is not None,
+            "objects": {name: len(objects) for name, objects in (self._objects or {}).items()},
+            "ttl": self.ttl,
+            "loads": self.loads,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0
+        }
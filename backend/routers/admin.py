@@ -2,11 +2,15 @@
 Admin router - handles administrative operations
 """
 from fastapi import APIRouter, Request, HTTPException, Depends
-from database import db
+from database import db, query_monitor
 from datetime import datetime
 from services.stats_service import StatsService
+from services.post_service import PostService
+from feed_index import KEY_COLUMNS
+from search_index import with_search_terms
 from background_tasks import manual_expire_posts, manual_boost_posts
-from config import ADMIN_USERNAME, ADMIN_PASSWORD
+from config import ADMIN_USERNAME, ADMIN_PASSWORD, ADMIN_POSTS_MAX_LIMIT, ADMIN_POSTS_STREAM_THRESHOLD
+from utils.json_response import stream_json_page
 import base64
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
@@ -26,7 +30,7 @@ def check_admin_auth(request: Request):
         # Check against environment variables
         if username != ADMIN_USERNAME or password != ADMIN_PASSWORD:
             raise HTTPException(status_code=401, detail="Invalid credentials")
-        
+    
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid authentication format")
 
@@ -45,7 +49,8 @@ async def get_moderation_statistics():
 @router.get("/posts", dependencies=[Depends(check_admin_auth)])
 async def admin_get_posts(page: int = 1, limit: int = 50, status: int = None):
     """Get all posts for admin with optional status filter"""
-    offset = (page - 1) * limit
+    limit = min(max(1, limit), ADMIN_POSTS_MAX_LIMIT)
+    offset = (max(1, page) - 1) * limit
     
     query = "SELECT * FROM posts"
     params = []
@@ -57,8 +62,6 @@ async def admin_get_posts(page: int = 1, limit: int = 50, status: int = None):
     query += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
     params.extend([limit, offset])
     
-    posts = await db.fetchall(query, params)
-    
     # Get total count
     count_query = "SELECT COUNT(*) as total FROM posts"
     count_params = []
@@ -67,13 +70,17 @@ async def admin_get_posts(page: int = 1, limit: int = 50, status: int = None):
         count_params.append(status)
     
     total_result = await db.fetchone(count_query, count_params)
-    
-    return {
-        "posts": posts,
+    meta = {
         "total": total_result["total"] if total_result else 0,
         "page": page,
         "limit": limit
     }
+    
+    if limit <= ADMIN_POSTS_STREAM_THRESHOLD:
+        return {"posts": await db.fetchall(query, params), **meta}
+    
+    # Stream large pages in batches so they are never built whole in memory
+    return await stream_json_page("posts", db.iterate(query, params, batch_size=200), meta)
 
 @router.put("/posts/{post_id}", dependencies=[Depends(check_admin_auth)])
 async def admin_update_post(post_id: str, request: Request):
@@ -81,7 +88,8 @@ async def admin_update_post(post_id: str, request: Request):
     data = await request.json()
     data["updated_at"] = datetime.now().isoformat()
     
-    rows_affected = await db.update("posts", data, "id = ?", [post_id])
+    rows_affected = await db.update("posts", with_search_terms(data), "id = ?", [post_id])
+    await PostService.refresh_feed([post_id], filters_changed=any(column in data for column in KEY_COLUMNS))
     
     if rows_affected == 0:
         raise HTTPException(status_code=404, detail="Post not found")
@@ -92,6 +100,7 @@ async def admin_update_post(post_id: str, request: Request):
 async def admin_delete_post(post_id: str):
     """Delete post (admin only)"""
     rows_affected = await db.delete("posts", "id = ?", [post_id])
+    await PostService.refresh_feed([post_id])
     
     if rows_affected == 0:
         raise HTTPException(status_code=404, detail="Post not found")
@@ -193,6 +202,7 @@ async def admin_create_category(request: Request):
     }
     
     category_id = await db.insert("super_rubrics", category_data)
+    PostService.refresh_references()
     category_data["id"] = category_id
     
     return category_data
@@ -203,6 +213,7 @@ async def admin_update_category(category_id: str, request: Request):
     data = await request.json()
     
     rows_affected = await db.update("super_rubrics", data, "id = ?", [category_id])
+    PostService.refresh_references()
     
     if rows_affected == 0:
         raise HTTPException(status_code=404, detail="Category not found")
@@ -219,6 +230,7 @@ async def admin_delete_category(category_id: str):
         raise HTTPException(status_code=400, detail=f"Cannot delete category. It's used in {posts_count['count']} posts")
     
     rows_affected = await db.delete("super_rubrics", "id = ?", [category_id])
+    PostService.refresh_references()
     
     if rows_affected == 0:
         raise HTTPException(status_code=404, detail="Category not found")
@@ -244,6 +256,7 @@ async def admin_create_city(request: Request):
     }
     
     city_id = await db.insert("cities", city_data)
+    PostService.refresh_references()
     city_data["id"] = city_id
     
     return city_data
@@ -254,6 +267,7 @@ async def admin_update_city(city_id: str, request: Request):
     data = await request.json()
     
     rows_affected = await db.update("cities", data, "id = ?", [city_id])
+    PostService.refresh_references()
     
     if rows_affected == 0:
         raise HTTPException(status_code=404, detail="City not found")
@@ -270,6 +284,7 @@ async def admin_delete_city(city_id: str):
         raise HTTPException(status_code=400, detail=f"Cannot delete city. It's used in {posts_count['count']} posts")
     
     rows_affected = await db.delete("cities", "id = ?", [city_id])
+    PostService.refresh_references()
     
     if rows_affected == 0:
         raise HTTPException(status_code=404, detail="City not found")
@@ -292,4 +307,25 @@ async def admin_boost_posts():
 @router.get("/tasks/status", dependencies=[Depends(check_admin_auth)])
 async def admin_tasks_status():
     """Get background tasks status"""
-    return await StatsService.get_moderation_stats()
\ No newline at end of file
+    return await StatsService.get_moderation_stats()
+
+# Database instrumentation endpoints
+@router.get("/db/health", dependencies=[Depends(check_admin_auth)])
+async def admin_db_health():
+    """Full database diagnostics: every pooled connection pinged, pragma values, schema"""
+    return {
+        **await db.health_check(),
+        "connections": await db.check_connections(),
+        "settings": await db.get_settings()
+    }
+
+@router.get("/db/query-stats", dependencies=[Depends(check_admin_auth)])
+async def admin_query_stats(limit: int = 50):
+    """Get per-query timings (rolling percentiles) and the slow-query log"""
+    return query_monitor.snapshot(limit)
+
+@router.post("/db/query-stats/reset", dependencies=[Depends(check_admin_auth)])
+async def admin_reset_query_stats():
+    """Reset collected query statistics"""
+    query_monitor.reset()
+    return {"success": True, "message": "Query statistics reset"}
\ No newline at end of file
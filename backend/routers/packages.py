@@ -110,28 +110,36 @@ async def confirm_payment(request: Request):
             user_package_id = str(uuid.uuid4())
             created_at = datetime.now().isoformat()
             expires_at = (datetime.now() + timedelta(days=package["duration_days"])).isoformat()
-            
-            await db.execute("""
-                INSERT INTO user_packages 
-                (id, user_id, package_id, purchased_at, expires_at, is_active, payment_status, 
-                telegram_charge_id, provider_charge_id, amount, currency_code, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, [
-                user_package_id, user_id, package_id, created_at, expires_at, 
-                1, "completed", telegram_charge_id, provider_charge_id, amount, currency, created_at
-            ])
-        else:
-            # Update existing pending payment
-            await db.execute("""
-                UPDATE user_packages 
-                SET payment_status = 'completed', 
-                    is_active = 1,
-                    telegram_charge_id = ?,
-                    provider_charge_id = ?,
-                    amount = ?,
-                    currency_code = ?
-                WHERE id = ?
-            """, [telegram_charge_id, provider_charge_id, amount, currency, user_package["id"]])
+        
+        async with db.transaction() as tx:
+            if not user_package:
+                # Skipped when this charge was already recorded (a repeated confirmation)
+                tx.execute("""
+                    INSERT INTO user_packages 
+                    (id, user_id, package_id, purchased_at, expires_at, is_active, payment_status, 
+                    telegram_charge_id, provider_charge_id, amount, currency_code, created_at)
+                    SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+                    WHERE NOT EXISTS (SELECT 1 FROM user_packages WHERE telegram_charge_id = ?)
+                """, [
+                    user_package_id, user_id, package_id, created_at, expires_at, 
+                    1, "completed", telegram_charge_id, provider_charge_id, amount, currency, created_at,
+                    telegram_charge_id
+                ])
+            else:
+                # Update existing pending payment (only if nobody confirmed it in the meantime)
+                tx.execute("""
+                    UPDATE user_packages 
+                    SET payment_status = 'completed', 
+                        is_active = 1,
+                        telegram_charge_id = ?,
+                        provider_charge_id = ?,
+                        amount = ?,
+                        currency_code = ?
+                    WHERE id = ? AND payment_status = 'pending'
+                """, [telegram_charge_id, provider_charge_id, amount, currency, user_package["id"]])
+        
+        if tx.rowcounts[0] == 0:
+            raise HTTPException(status_code=409, detail="Payment already confirmed")
         
         return {
             "success": True,
@@ -139,7 +147,9 @@ async def confirm_payment(request: Request):
             "package_id": package_id,
             "user_id": user_id
         }
-        
+    
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error confirming payment: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to confirm payment")
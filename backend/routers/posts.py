@@ -2,10 +2,13 @@
 Posts router - handles job and service posts
 This router uses PostService to eliminate code duplication
 """
-from fastapi import APIRouter, Request, HTTPException
+from fastapi import APIRouter, Request, HTTPException, Header, Query
 from services.post_service import PostService
 from services.moderation_service import ModerationService
 from database import db
+from view_counter import view_counter
+from config import POST_BATCH_MAX_IDS
+from utils.json_response import cached_json_response
 from datetime import datetime
 import uuid
 
@@ -18,21 +21,81 @@ async def get_posts(
     author_id: str = None,
     super_rubric_id: str = None,
     city_id: str = None,
+    currency_id: str = None,
+    has_photo: bool = None,
+    price_min: float = Query(None, ge=0),
+    price_max: float = Query(None, ge=0),
+    price_currency_id: str = None,
+    sort: str = None,
+    expand: str = None,
     page: int = 1,
-    limit: int = 20
+    limit: int = 20,
+    cursor: str = None,
+    approximate_total: bool = False,
+    facets: bool = False,
+    if_none_match: str = Header(None)
 ):
-    """Get posts with filters and pagination"""
+    """Get posts with filters and pagination (ETag / If-None-Match aware)"""
     filters = {
         "post_type": post_type,
         "search": search,
         "author_id": author_id,
         "super_rubric_id": super_rubric_id,
         "city_id": city_id,
+        "currency_id": currency_id,
+        "has_photo": has_photo,
+        "price_min": price_min,
+        "price_max": price_max,
+        "price_currency_id": price_currency_id,
+        "sort": sort,
+        "expand": expand,
         "page": page,
-        "limit": limit
+        "limit": limit,
+        "cursor": cursor,
+        "approximate_total": approximate_total,
+        "facets": facets
     }
     
-    return await PostService.get_posts_with_filters(filters)
+    try:
+        body, etag = await PostService.get_feed_page(filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return cached_json_response(body, etag, if_none_match)
+
+@router.get("/facets")
+async def get_post_facets(
+    post_type: str = None,
+    search: str = None,
+    author_id: str = None,
+    super_rubric_id: str = None,
+    city_id: str = None,
+    currency_id: str = None,
+    has_photo: bool = None,
+    price_min: float = Query(None, ge=0),
+    price_max: float = Query(None, ge=0),
+    price_currency_id: str = None,
+    sort: str = None
+):
+    """Post counts per post type, rubric and city for the current feed filters"""
+    filters = {
+        "post_type": post_type,
+        "search": search,
+        "author_id": author_id,
+        "super_rubric_id": super_rubric_id,
+        "city_id": city_id,
+        "currency_id": currency_id,
+        "has_photo": has_photo,
+        "price_min": price_min,
+        "price_max": price_max,
+        "price_currency_id": price_currency_id,
+        "sort": sort
+    }
+    
+    try:
+        return await PostService.get_feed_facets(filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/jobs")
 async def create_job_post(request: Request):
@@ -57,7 +120,7 @@ async def create_job_post(request: Request):
         post_data.update(moderation_result)
         
         return post_data
-        
+    
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -86,12 +149,26 @@ async def create_service_post(request: Request):
         post_data.update(moderation_result)
         
         return post_data
-        
+    
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating service post: {str(e)}")
 
+@router.post("/batch")
+async def get_posts_batch(request: Request):
+    """Get several posts by id in one request"""
+    data = await request.json()
+    post_ids = data.get("ids") if isinstance(data, dict) else None
+    
+    if not isinstance(post_ids, list) or not all(isinstance(post_id, str) for post_id in post_ids):
+        raise HTTPException(status_code=400, detail="ids must be a list of post ids")
+    if len(post_ids) > POST_BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {POST_BATCH_MAX_IDS} ids per request")
+    
+    posts, missing = await PostService.get_post_details(post_ids)
+    return {"posts": posts, "missing": missing}
+
 @router.put("/{post_id}/status")
 async def update_post_status(post_id: str, request: Request):
     """Update post status"""
@@ -106,16 +183,16 @@ async def update_post_status(post_id: str, request: Request):
     return {"message": "Status updated successfully"}
 
 @router.get("/{post_id}")
-async def get_post(post_id: str):
-    """Get a single post by ID"""
-    post = await db.fetchone("SELECT * FROM posts WHERE id = ?", [post_id])
+async def get_post(post_id: str, user_id: str = None):
+    """Get a single post by ID with its author, city, currency and rubric"""
+    post = await PostService.get_post_detail(post_id)
     
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     
-    # Increment view count
-    await db.update("posts", {"views_count": post["views_count"] + 1}, "id = ?", [post_id])
-    post["views_count"] += 1
+    # Count the view; it is written in the next batch, so add the unwritten ones
+    post["views_count"] = (post["views_count"] or 0) + view_counter.record(post_id)
+    post["unique_viewers"] = await view_counter.record_viewer(post_id, user_id)
     
     return post
 
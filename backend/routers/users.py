@@ -6,6 +6,7 @@ from database import db
 from datetime import datetime
 from services.post_service import PostService
 from services.stats_service import StatsService
+from utils.json_response import json_response
 
 router = APIRouter(prefix="/api/users", tags=["users"])
 
@@ -55,15 +56,20 @@ async def get_user(user_id: str):
     return user
 
 @router.get("/{user_id}/posts")
-async def get_user_posts(user_id: str, page: int = 1, limit: int = 20):
-    """Get posts by user"""
+async def get_user_posts(user_id: str, page: int = 1, limit: int = 20, cursor: str = None):
+    """Get posts by user (page number or next_cursor from the previous page)"""
     filters = {
         "author_id": user_id,
         "page": page,
-        "limit": limit
+        "limit": limit,
+        "cursor": cursor,
+        "include_unpublished": True
     }
     
-    return await PostService.get_posts_with_filters(filters)
+    try:
+        return json_response(await PostService.get_posts_with_filters(filters, compact=True))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/{user_id}/stats")
 async def get_user_statistics(user_id: str):
@@ -0,0 +1,187 @@
+"""
+Full-text search helpers for the posts_fts index.
+
+Post text is normalised and stemmed in Python at write time (into the
+title_terms/description_terms columns that the posts_fts triggers copy) and
+the same normalisation is applied to the query, so FTS5 only compares
+precomputed stems and no per-row work happens at query time.
+"""
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# Longer inputs are truncated; every extra term is another posting-list intersection
+MAX_SEARCH_TERMS = 8
+
+# A prefix this short matches too many unrelated stems
+PREFIX_MIN_LENGTH = 4
+
+# bm25 column weights for (post_id, title, description): title matches rank higher
+BM25_WEIGHTS = (0.0, 10.0, 1.0)
+
+# Russian and Ukrainian spellings folded together before stemming:
+# ё/є -> е, і/ї -> и, ґ -> г; apostrophes inside Ukrainian words are dropped
+_CHAR_MAP = str.maketrans({
+    "ё": "е", "є": "е", "і": "и", "ї": "и", "ґ": "г",
+    "'": None, "’": None, "ʼ": None, "`": None,
+})
+
+_VOWELS = frozenset("аеиоуыэюя")
+
+# Endings are never stripped below this length: "киев" stays "киев" instead of
+# becoming "ки" and colliding with every other short stem
+MIN_STEM_LENGTH = 3
+
+def _endings(*endings: str) -> tuple:
+    # Longest ending first so the longest match wins
+    return tuple(sorted(endings, key=len, reverse=True))
+
+# Suffix classes of the Snowball Russian stemmer, extended with Ukrainian
+# case endings (written after _CHAR_MAP folding). *_AFTER_A groups only match
+# when preceded by а or я.
+PERFECTIVE_GERUND_AFTER_A = _endings("в", "вши", "вшись")
+PERFECTIVE_GERUND = _endings("ив", "ивши", "ившись", "ыв", "ывши", "ывшись")
+REFLEXIVE = _endings("ся", "сь")
+ADJECTIVE = _endings(
+    "ее", "ие", "ые", "ое", "ими", "ыми", "ей", "ий", "ый", "ой", "ем", "им", "ым", "ом",
+    "его", "ого", "ему", "ому", "их", "ых", "ую", "юю", "ая", "яя", "ою", "ею",
+    # Ukrainian feminine genitive (-ої)
+    "ои"
+)
+PARTICIPLE_AFTER_A = _endings("ем", "нн", "вш", "ющ", "щ")
+PARTICIPLE = _endings("ивш", "ывш", "ующ")
+VERB_AFTER_A = _endings(
+    "ла", "на", "ете", "йте", "ли", "й", "л", "ем", "н", "ло", "но", "ет", "ют", "ны", "ть", "ешь", "нно"
+)
+VERB = _endings(
+    "ила", "ыла", "ена", "ейте", "уйте", "ите", "или", "ыли", "ей", "уй", "ил", "ыл", "им", "ым",
+    "ен", "ило", "ыло", "ено", "ят", "ует", "уют", "ит", "ыт", "ены", "ить", "ыть", "ишь", "ую", "ю"
+)
+NOUN = _endings(
+    "а", "ев", "ов", "ие", "ье", "е", "иями", "ями", "ами", "еи", "ии", "и", "ией", "ей", "ой",
+    "ий", "й", "иям", "ям", "ием", "ем", "ам", "ом", "о", "у", "ах", "иях", "ях", "ы", "ь", "ию",
+    "ью", "ю", "ия", "ья", "я",
+    # Ukrainian dative/instrumental forms
+    "ови", "еви", "ою", "ею"
+)
+SUPERLATIVE = _endings("ейш", "ейше")
+
+def _strip(word: str, rv: int, endings: tuple, after_a: bool = False) -> Optional[str]:
+    """Remove the longest ending that lies inside RV; None when nothing matched"""
+    for ending in endings:
+        if not word.endswith(ending):
+            continue
+        start = len(word) - len(ending)
+        if start < rv:
+            continue
+        if after_a and (start - 1 < rv or word[start - 1] not in "ая"):
+            continue
+        return word[:start]
+    return None
+
+def normalize(text: str) -> str:
+    """Lower-case and fold Russian/Ukrainian spelling variants"""
+    return text.lower().translate(_CHAR_MAP)
+
+@lru_cache(maxsize=50000)
+def stem(word: str) -> str:
+    """
+    Light Russian/Ukrainian stemmer (Snowball Russian steps 1, 2 and 4) for an
+    already normalised word. Non-Cyrillic words are returned unchanged.
+    """
+    # RV is the part of the word after the first vowel, and never shorter than a stem
+    rv = next((index + 1 for index, char in enumerate(word) if char in _VOWELS), None)
+    if rv is None:
+        return word
+    rv = max(rv, MIN_STEM_LENGTH)
+    if rv >= len(word):
+        return word
+    
+    # Step 1: gerunds, otherwise reflexive + adjectival / verb / noun endings
+    stemmed = _strip(word, rv, PERFECTIVE_GERUND_AFTER_A, after_a=True)
+    if stemmed is None:
+        stemmed = _strip(word, rv, PERFECTIVE_GERUND)
+    if stemmed is None:
+        stemmed = _strip(word, rv, REFLEXIVE) or word
+        adjective = _strip(stemmed, rv, ADJECTIVE)
+        if adjective is not None:
+            stemmed = (
+                _strip(adjective, rv, PARTICIPLE_AFTER_A, after_a=True)
+                or _strip(adjective, rv, PARTICIPLE)
+                or adjective
+            )
+        else:
+            stemmed = (
+                _strip(stemmed, rv, VERB_AFTER_A, after_a=True)
+                or _strip(stemmed, rv, VERB)
+                or _strip(stemmed, rv, NOUN)
+                or stemmed
+            )
+    
+    # Step 2: trailing и
+    if stemmed.endswith("и") and len(stemmed) - 1 >= rv:
+        stemmed = stemmed[:-1]
+    
+    # Step 4: superlative, double н, soft sign
+    stemmed = _strip(stemmed, rv, SUPERLATIVE) or stemmed
+    if stemmed.endswith("нн") and len(stemmed) - 2 >= rv:
+        stemmed = stemmed[:-1]
+    elif stemmed.endswith("ь") and len(stemmed) - 1 >= rv:
+        stemmed = stemmed[:-1]
+    
+    return stemmed
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Normalised stems of every word in text"""
+    if not text:
+        return []
+    return [stem(word) for word in _WORD.findall(normalize(text))]
+
+def search_terms(text: Optional[str]) -> Optional[str]:
+    """Index-time representation of a text column: its stems separated by spaces"""
+    if text is None:
+        return None
+    return " ".join(tokenize(text))
+
+# Source column -> column holding its stems, indexed by posts_fts
+TERM_COLUMNS = {"title": "title_terms", "description": "description_terms"}
+
+def with_search_terms(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Copy of a posts insert/update record with the stems of every title or
+    description it sets. Writes that change the text without them leave the
+    post's search index stale.
+    """
+    record = dict(record)
+    for column, terms_column in TERM_COLUMNS.items():
+        if column in record:
+            record[terms_column] = search_terms(record[column])
+    return record
+
+async def register_search_functions(conn):
+    """Register search_terms() for the migrations that re-stem existing posts in SQL"""
+    await conn.create_function("search_terms", 1, search_terms, deterministic=True)
+
+def build_match_query(search: Optional[str]) -> Optional[str]:
+    """
+    Turn free user input into an FTS5 MATCH expression over stemmed terms.
+    Every stem becomes a quoted term and all terms must match, so FTS5
+    operators and punctuation in the input are never interpreted. Stems match
+    exactly; only the last term, which may still be being typed, matches as a
+    prefix, and only once it has PREFIX_MIN_LENGTH characters.
+    Returns None when the input contains no searchable words.
+    """
+    terms = list(dict.fromkeys(tokenize(search)))[:MAX_SEARCH_TERMS]
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    if len(terms[-1]) >= PREFIX_MIN_LENGTH:
+        quoted[-1] += "*"
+    return " ".join(quoted)
+
+def bm25_rank(table: str = "posts_fts") -> str:
+    """ORDER BY expression ranking matches by relevance (bm25 is lower for better matches)"""
+    weights = ", ".join(str(weight) for weight in BM25_WEIGHTS)
+    return f"bm25({table}, {weights})"
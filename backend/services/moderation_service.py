@@ -4,6 +4,7 @@ Moderation service - handles AI moderation and approval workflows
 from datetime import datetime
 from typing import Dict, Any, Optional
 from database import db
+from services.post_service import PostService
 from ai_moderation import moderate_post_content, telegram_notifier
 
 class ModerationService:
@@ -18,19 +19,21 @@ class ModerationService:
             # Start AI moderation process
             moderation_result = await moderate_post_content(post_data)
             
-            # Log AI moderation result
-            if moderation_result.get("ai_result"):
-                await ModerationService._log_ai_moderation(
-                    post_data["id"], 
-                    moderation_result["ai_result"]
-                )
-            
-            # Update post status based on moderation result
+            # Log AI moderation result and update post status in one commit
             final_status = moderation_result.get("final_status", 3)
-            await db.update("posts", {
-                "status": final_status,
-                "ai_moderation_passed": moderation_result["decision"] != "rejected"
-            }, "id = ?", [post_data["id"]])
+            async with db.transaction() as tx:
+                if moderation_result.get("ai_result"):
+                    ModerationService._log_ai_moderation(
+                        tx,
+                        post_data["id"], 
+                        moderation_result["ai_result"]
+                    )
+                
+                tx.update("posts", {
+                    "status": final_status,
+                    "ai_moderation_passed": moderation_result["decision"] != "rejected"
+                }, "id = ?", [post_data["id"]])
+            await PostService.refresh_feed([post_data["id"]])
             
             # Send notification to moderator if needed
             if moderation_result.get("should_notify_moderator") and telegram_notifier:
@@ -49,6 +52,7 @@ class ModerationService:
             print(f"Error in moderation process: {str(e)}")
             # If moderation fails, set status to manual review
             await db.update("posts", {"status": 3}, "id = ?", [post_data["id"]])
+            await PostService.refresh_feed([post_data["id"]])
             return {
                 "status": 3,
                 "ai_moderation_passed": False,
@@ -75,6 +79,7 @@ class ModerationService:
                 "status": new_status,
                 "updated_at": datetime.now().isoformat()
             }, "id = ?", [post_id])
+            await PostService.refresh_feed([post_id])
             
             # If post was premium and rejected - handle refund
             if action == "reject" and post.get("is_premium"):
@@ -94,8 +99,8 @@ class ModerationService:
             return False
     
     @staticmethod
-    async def _log_ai_moderation(post_id: str, ai_result: Dict[str, Any]):
-        """Log AI moderation result"""
+    def _log_ai_moderation(tx, post_id: str, ai_result: Dict[str, Any]):
+        """Log AI moderation result as part of a transaction"""
         ai_log_data = {
             "post_id": post_id,
             "ai_decision": ai_result["decision"],
@@ -103,7 +108,7 @@ class ModerationService:
             "ai_reason": ai_result["reason"],
             "moderated_at": datetime.now().isoformat()
         }
-        await db.insert("ai_moderation_log", ai_log_data)
+        tx.insert("ai_moderation_log", ai_log_data)
     
     @staticmethod
     async def _handle_refund(post_id: str, author_id: str):
@@ -4,9 +4,86 @@ This service eliminates code duplication between job and service posts
 """
 import uuid
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
-from database import db
-from config import DEFAULT_POST_LIFETIME_DAYS, FREE_POST_COOLDOWN_DAYS
+from typing import Optional, Dict, Any, List, Tuple
+from database import db, RowSet
+from config import (
+    DEFAULT_POST_LIFETIME_DAYS, FREE_POST_COOLDOWN_DAYS, MAX_PAGE_SIZE,
+    FEED_COUNT_CACHE_TTL, FEED_COUNT_CACHE_SIZE, FEED_APPROXIMATE_COUNT_LIMIT,
+    FEED_HOT_INDEX_ENABLED, FEED_HOT_INDEX_PAGES, FEED_HOT_INDEX_MAX_KEYS, FEED_HOT_INDEX_WARM_ROWS,
+    FEED_PAGE_CACHE_TTL, FEED_PAGE_CACHE_SIZE, POST_DETAIL_CACHE_TTL, POST_DETAIL_CACHE_SIZE,
+    REFERENCE_CACHE_TTL
+)
+from cache import TTLCache, TaggedTTLCache
+from feed_index import HotFeedIndex, KEY_COLUMNS
+from reference_data import ReferenceCache, REFERENCE_TABLES
+from search_index import build_match_query, bm25_rank, with_search_terms
+from utils.pagination import encode_cursor, decode_cursor
+from utils.json_response import render_json, etag_for
+
+# Feed totals keyed by the normalised filter set; cleared whenever posts are
+# added, removed or change status
+feed_count_cache = TTLCache(FEED_COUNT_CACHE_SIZE, FEED_COUNT_CACHE_TTL)
+
+# First FEED_HOT_INDEX_PAGES pages of every post_type/city/rubric feed, kept in memory
+hot_feed_index = (
+    HotFeedIndex(FEED_HOT_INDEX_PAGES * MAX_PAGE_SIZE, FEED_HOT_INDEX_MAX_KEYS)
+    if FEED_HOT_INDEX_ENABLED else None
+)
+
+# Rendered JSON of public feed pages, tagged with the post_type/city/rubric feed they
+# belong to and the posts they show (see get_feed_page and refresh_feed)
+feed_page_cache = TaggedTTLCache(FEED_PAGE_CACHE_SIZE, FEED_PAGE_CACHE_TTL)
+
+# Post detail records (get_post_detail) keyed and tagged by post id; refresh_feed drops them
+post_detail_cache = TaggedTTLCache(POST_DETAIL_CACHE_SIZE, POST_DETAIL_CACHE_TTL)
+
+# Cities, currencies and rubrics for feed rows requested with "expand"
+reference_cache = ReferenceCache(REFERENCE_CACHE_TTL)
+
+# Related records nested into a post detail: name -> (table, posts column, columns)
+DETAIL_JOINS = {
+    "author": ("users", "author_id", ("id", "first_name", "last_name", "username")),
+    **REFERENCE_TABLES,
+}
+
+POST_DETAIL_QUERY = "SELECT p.*, {columns} FROM posts p {joins}".format(
+    columns=", ".join(
+        f"{name}.{column} AS {name}__{column}"
+        for name, (_, _, columns) in DETAIL_JOINS.items() for column in columns
+    ),
+    joins=" ".join(
+        f"LEFT JOIN {table} {name} ON {name}.id = p.{foreign_key}"
+        for name, (table, foreign_key, _) in DETAIL_JOINS.items()
+    )
+)
+
+# Feed columns with per-value counts (see get_feed_facets)
+FACET_COLUMNS = ("post_type", "super_rubric_id", "city_id")
+
+# Status of posts visible in the public feed
+PUBLISHED_STATUS = 4
+
+# Highlighted, then other paid, then free posts; boosts move rank_at forward
+FEED_ORDER = "p.rank_tier DESC, p.rank_at DESC, p.id DESC"
+
+# Sort modes: ORDER BY, the columns a keyset cursor carries and the cursor comparison.
+# "newest" is the ranked feed order above; the price sorts only list posts with a price.
+FEED_SORTS = {
+    "newest": (FEED_ORDER, ("rank_tier", "rank_at", "id"), "<"),
+    "price_asc": ("p.price_base, p.id", ("price_base", "id"), ">"),
+    "price_desc": ("p.price_base DESC, p.id DESC", ("price_base", "id"), "<"),
+    "views": ("p.views_count DESC, p.id DESC", ("views_count", "id"), "<"),
+}
+DEFAULT_FEED_SORT = "newest"
+PRICE_SORTS = ("price_asc", "price_desc")
+
+# Feed filters besides search, author and the facets (see _build_feed_filters)
+VALUE_FILTERS = ("currency_id", "has_photo", "price_min", "price_max", "price_currency_id")
+
+FEED_COLUMNS = """p.id, p.title, p.description, p.post_type, p.price, p.currency_id, p.city_id, 
+                  p.super_rubric_id, p.author_id, p.status, p.has_photo, p.has_highlight, 
+                  p.has_boost, p.views_count, p.created_at, p.expires_at, p.rank_tier, p.rank_at,
+                  p.price_base"""
 
 class PostService:
     """Service for handling post operations"""
@@ -53,19 +130,22 @@ class PostService:
             "created_at": datetime.now().isoformat(),
             "updated_at": datetime.now().isoformat()
         }
+        post_record["rank_at"] = post_record["created_at"]
         
-        # Insert post
-        post_id = await db.insert("posts", post_record)
-        post_record["id"] = post_id
-        
-        # Handle free post tracking
-        if not package_id or package_id == "free-package":
-            await PostService._record_free_post_usage(author_id)
-        
-        # Schedule boosts if needed
-        if package and package["has_boost"]:
-            await PostService._schedule_post_boost(post_id, package)
+        # Insert post together with its free-post tracking and boost schedule in one commit
+        async with db.transaction() as tx:
+            post_id = tx.insert("posts", with_search_terms(post_record))
+            post_record["id"] = post_id
+            
+            # Handle free post tracking
+            if not package_id or package_id == "free-package":
+                PostService._record_free_post_usage(tx, author_id)
+            
+            # Schedule boosts if needed
+            if package and package["has_boost"]:
+                PostService._schedule_post_boost(tx, post_id, package)
         
+        await PostService.refresh_feed([post_id])
         return post_record
     
     @staticmethod
@@ -90,19 +170,19 @@ class PostService:
         }
     
     @staticmethod
-    async def _record_free_post_usage(user_id: str):
-        """Record free post usage"""
+    def _record_free_post_usage(tx, user_id: str):
+        """Record free post usage as part of a transaction"""
         next_free_date = (datetime.now() + timedelta(days=FREE_POST_COOLDOWN_DAYS)).isoformat()
         free_post_data = {
             "user_id": user_id,
             "created_at": datetime.now().isoformat(),
             "next_free_post_at": next_free_date
         }
-        await db.insert("user_free_posts", free_post_data)
+        tx.insert("user_free_posts", free_post_data)
     
     @staticmethod
-    async def _schedule_post_boost(post_id: str, package: Dict[str, Any]):
-        """Schedule post boost"""
+    def _schedule_post_boost(tx, post_id: str, package: Dict[str, Any]):
+        """Schedule post boost as part of a transaction"""
         boost_data = {
             "post_id": post_id,
             "next_boost_at": (datetime.now() + timedelta(days=package["boost_interval_days"])).isoformat(),
@@ -110,92 +190,435 @@ class PostService:
             "is_active": True,
             "created_at": datetime.now().isoformat()
         }
-        await db.insert("post_boost_schedule", boost_data)
+        tx.insert("post_boost_schedule", boost_data)
     
     @staticmethod
-    async def get_posts_with_filters(filters: Dict[str, Any]) -> Dict[str, Any]:
-        """Get posts with filters and pagination"""
+    def _build_feed_filters(filters: Dict[str, Any], include_facets: bool = True,
+                            now: Optional[str] = None) -> Tuple[str, List[str], List[Any], Optional[str]]:
+        """FROM clause, WHERE conditions, parameters and FTS MATCH expression for a feed filter set"""
+        conditions = []
+        params = []
+        from_clause = "posts p"
+        
+        match_query = build_match_query(filters.get("search"))
+        if match_query:
+            # Full-text search drives the join: matching rows come from the FTS index,
+            # the remaining filters are applied to the joined posts rows
+            from_clause = "posts_fts JOIN posts p ON p.id = posts_fts.post_id"
+            conditions.append("posts_fts MATCH ?")
+            params.append(match_query)
+        
+        if not filters.get("include_unpublished"):
+            conditions.append("p.status = ?")
+            params.append(PUBLISHED_STATUS)
+            conditions.append("p.expires_at > ?")
+            params.append(now or datetime.now().isoformat())
+        
+        if filters.get("author_id"):
+            conditions.append("p.author_id = ?")
+            params.append(filters["author_id"])
+        
+        if include_facets:
+            # With an author filter the unary + keeps the planner on the author index
+            # (an author has a handful of posts) instead of a wider facet index; the
+            # views sort has a single index (views_count is rewritten on every view
+            # flush) and filters the facets while reading it
+            prefix = "+" if filters.get("author_id") or PostService._feed_sort(filters) == "views" else ""
+            for column in FACET_COLUMNS:
+                if filters.get(column):
+                    conditions.append(f"{prefix}p.{column} = ?")
+                    params.append(filters[column])
+        
+        if filters.get("currency_id"):
+            conditions.append("p.currency_id = ?")
+            params.append(filters["currency_id"])
+        if filters.get("has_photo") is not None:
+            conditions.append("p.has_photo = ?")
+            params.append(1 if filters["has_photo"] else 0)
+        
+        # Outside the price sorts the unary + keeps a price range from pulling the
+        # planner onto a price index, which would need a sort for the page order
+        price_sort = PostService._feed_sort(filters) in PRICE_SORTS
+        price_column = "p.price_base" if price_sort else "+p.price_base"
+        price_currency = filters.get("price_currency_id") or filters.get("currency_id")
+        for name, operator in (("price_min", ">="), ("price_max", "<=")):
+            if filters.get(name) is None:
+                continue
+            if price_currency:
+                conditions.append(f"{price_column} {operator} ? * (SELECT base_rate FROM currencies WHERE id = ?)")
+                params.extend([filters[name], price_currency])
+            else:
+                conditions.append(f"{price_column} {operator} ?")
+                params.append(filters[name])
+        if price_sort:
+            conditions.append("p.price_base IS NOT NULL")
+        
+        return from_clause, conditions, params, match_query
+    
+    @staticmethod
+    def _feed_sort(filters: Dict[str, Any]) -> str:
+        """Validated sort mode of a feed filter set"""
+        sort = filters.get("sort") or DEFAULT_FEED_SORT
+        if sort not in FEED_SORTS:
+            raise ValueError(f"Invalid sort, expected one of: {', '.join(FEED_SORTS)}")
+        return sort
+    
+    @staticmethod
+    def _build_feed_page_query(filters: Dict[str, Any], limit: int, offset: int,
+                               now: Optional[str] = None) -> Tuple[str, List[Any], int]:
+        """SQL, parameters and effective offset of one feed page (ValueError for a bad cursor)"""
+        from_clause, conditions, params, match_query = PostService._build_feed_filters(filters, now=now)
+        sort = PostService._feed_sort(filters)
+        order_by, cursor_columns, comparison = FEED_SORTS[sort]
+        if match_query and sort == DEFAULT_FEED_SORT:
+            order_by = f"{bm25_rank()}, {FEED_ORDER}"
+        
+        cursor = filters.get("cursor")
+        if cursor:
+            if match_query:
+                offset = PostService._decode_feed_cursor(cursor, search=True)
+            else:
+                columns = ", ".join(f"p.{column}" for column in cursor_columns)
+                placeholders = ", ".join("?" for _ in cursor_columns)
+                conditions.append(f"({columns}) {comparison} ({placeholders})")
+                params.extend(PostService._decode_feed_cursor(cursor, search=False, sort=sort))
+                offset = 0
+        
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"""SELECT {FEED_COLUMNS}
+                    FROM {from_clause} {where_clause}
+                    ORDER BY {order_by} LIMIT ? OFFSET ?"""
+        return query, params + [limit, offset], offset
+    
+    @staticmethod
+    def _feed_expand(filters: Dict[str, Any]) -> Tuple[str, ...]:
+        """Validated reference objects to attach to feed rows, in REFERENCE_TABLES order"""
+        expand = filters.get("expand") or ()
+        if isinstance(expand, str):
+            expand = expand.split(",")
+        names = {name.strip() for name in expand if name.strip()}
+        unknown = names - set(REFERENCE_TABLES)
+        if unknown:
+            raise ValueError(f"Invalid expand, expected any of: {', '.join(REFERENCE_TABLES)}")
+        return tuple(name for name in REFERENCE_TABLES if name in names)
+    
+    @staticmethod
+    def _expand_posts(posts, expand: Tuple[str, ...], references: Dict[str, Dict[str, Any]]):
+        """Feed rows (RowSet or dicts) with the `expand` reference objects added (None when unknown)"""
+        foreign_keys = [REFERENCE_TABLES[name][1] for name in expand]
+        if isinstance(posts, RowSet):
+            positions = [posts.columns.index(foreign_key) for foreign_key in foreign_keys]
+            rows = [
+                tuple(row) + tuple(
+                    references[name].get(row[position]) for name, position in zip(expand, positions)
+                )
+                for row in posts.rows
+            ]
+            return RowSet(tuple(posts.columns) + expand, rows)
+        
+        for post in posts:
+            for name, foreign_key in zip(expand, foreign_keys):
+                post[name] = references[name].get(post[foreign_key])
+        return posts
+    
+    @staticmethod
+    def _decode_feed_cursor(cursor: str, search: bool, sort: str = DEFAULT_FEED_SORT):
+        """Offset of a search cursor, or the sort-order position of a feed cursor"""
+        if search:
+            offset = decode_cursor(cursor, 1)[0]
+            if not isinstance(offset, int) or offset < 0:
+                raise ValueError("Invalid cursor")
+            return offset
+        
+        if sort == DEFAULT_FEED_SORT:
+            position = decode_cursor(cursor, 3)
+            if not isinstance(position[0], int) or not all(isinstance(value, str) for value in position[1:]):
+                raise ValueError("Invalid cursor")
+            return position
+        
+        position = decode_cursor(cursor, 2)
+        if (not isinstance(position[0], (int, float)) or isinstance(position[0], bool)
+                or not isinstance(position[1], str)):
+            raise ValueError("Invalid cursor")
+        return position
+    
+    @staticmethod
+    def _build_feed_count_query(filters: Dict[str, Any], approximate: bool = False,
+                                now: Optional[str] = None) -> Tuple[str, List[Any]]:
+        """SQL and parameters counting the posts of a feed filter set (capped when approximate)"""
+        from_clause, conditions, params, _ = PostService._build_feed_filters(filters, now=now)
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        if approximate:
+            # One row past the cap is enough to know the total exceeds it
+            query = f"""SELECT COUNT(*) as total FROM (
+                            SELECT 1 FROM {from_clause} {where_clause} LIMIT ?
+                        )"""
+            return query, params + [FEED_APPROXIMATE_COUNT_LIMIT + 1]
+        return f"SELECT COUNT(*) as total FROM {from_clause} {where_clause}", params
+    
+    @staticmethod
+    def _build_feed_facet_query(filters: Dict[str, Any], now: Optional[str] = None) -> Tuple[str, List[Any]]:
+        """SQL and parameters counting the posts of a feed filter set per facet combination"""
+        from_clause, conditions, params, _ = PostService._build_feed_filters(filters, include_facets=False, now=now)
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"""SELECT p.post_type, p.super_rubric_id, p.city_id, COUNT(*) AS count
+                    FROM {from_clause} {where_clause}
+                    GROUP BY p.post_type, p.super_rubric_id, p.city_id"""
+        return query, params
+    
+    @staticmethod
+    def _build_facet_counter_queries(include_unpublished: bool,
+                                     now: Optional[datetime] = None) -> List[Tuple[str, List[Any]]]:
+        """Queries summing post_facet_counts per facet combination (published: by expiry day, today from posts)"""
+        if include_unpublished:
+            return [("""SELECT post_type, super_rubric_id, city_id, SUM(count) AS count
+                        FROM post_facet_counts
+                        GROUP BY post_type, super_rubric_id, city_id
+                        HAVING SUM(count) > 0""", [])]
+        
+        # Counters of later expiry days are all still in the feed; posts expiring
+        # today are counted from the expires_at index (the unary + keeps the planner
+        # off the status-led indexes), past days are left out
+        now = now or datetime.now()
+        today = now.date().isoformat()
+        return [
+            ("""SELECT post_type, super_rubric_id, city_id, SUM(count) AS count
+                FROM post_facet_counts
+                WHERE status = ? AND expiry_day > ?
+                GROUP BY post_type, super_rubric_id, city_id
+                HAVING SUM(count) > 0""", [PUBLISHED_STATUS, today]),
+            ("""SELECT p.post_type, p.super_rubric_id, p.city_id, COUNT(*) AS count
+                FROM posts p
+                WHERE p.expires_at > ? AND p.expires_at < ? AND +p.status = ?
+                GROUP BY p.post_type, p.super_rubric_id, p.city_id""",
+             [now.isoformat(), (now.date() + timedelta(days=1)).isoformat(), PUBLISHED_STATUS]),
+        ]
+    
+    @staticmethod
+    async def get_posts_with_filters(filters: Dict[str, Any], compact: bool = False) -> Dict[str, Any]:
+        """Get posts with filters and pagination (page or keyset cursor)"""
         # Extract parameters
-        post_type = filters.get("post_type")
-        search = filters.get("search")
-        author_id = filters.get("author_id")
-        super_rubric_id = filters.get("super_rubric_id")
-        city_id = filters.get("city_id")
+        cursor = filters.get("cursor")
+        approximate_total = bool(filters.get("approximate_total"))
         page = max(1, filters.get("page", 1))
         limit = min(50, max(1, filters.get("limit", 20)))
         
         offset = (page - 1) * limit
+        now = datetime.now().isoformat()
+        match_query = build_match_query(filters.get("search"))
+        sort = PostService._feed_sort(filters)
+        expand = PostService._feed_expand(filters)
         
-        # Build query
-        query = """SELECT id, title, description, post_type, price, currency_id, city_id, 
-                          super_rubric_id, author_id, status, has_photo, has_highlight, 
-                          has_boost, views_count, created_at, expires_at 
-                   FROM posts WHERE 1=1"""
-        params = []
+        # The first pages of the plain published feed come from the in-memory index
+        hot_page = None
+        if (hot_feed_index is not None and not match_query and sort == DEFAULT_FEED_SORT
+                and not filters.get("author_id") and not filters.get("include_unpublished")
+                and all(filters.get(name) is None for name in VALUE_FILTERS)):
+            hot_page = await PostService._hot_feed_page(filters, limit, offset, now)
         
-        if post_type:
-            query += " AND post_type = ?"
-            params.append(post_type)
+        hot_total = None
+        if hot_page is not None:
+            rows, hot_total = hot_page
+            columns = hot_feed_index.columns
+            posts = RowSet(columns, rows) if compact else [dict(zip(columns, row)) for row in rows]
+        else:
+            # Execute query
+            query, params, offset = PostService._build_feed_page_query(filters, limit, offset, now=now)
+            posts = await db.fetchall(query, params, compact=compact)
         
-        if search:
-            query += " AND (title LIKE ? OR description LIKE ?)"
-            search_term = f"%{search}%"
-            params.extend([search_term, search_term])
+        next_cursor = None
+        if len(posts) == limit:
+            if match_query:
+                next_cursor = encode_cursor([offset + limit])
+            else:
+                last_post = posts[-1]
+                next_cursor = encode_cursor([last_post[column] for column in FEED_SORTS[sort][1]])
         
-        if author_id:
-            query += " AND author_id = ?"
-            params.append(author_id)
+        # Count total posts (cached per normalised filter set)
+        count_key = (
+            match_query, bool(filters.get("include_unpublished")), approximate_total,
+            filters.get("author_id"), *(filters.get(column) for column in FACET_COLUMNS),
+            *(filters.get(name) for name in VALUE_FILTERS), sort in PRICE_SORTS
+        )
+        total = hot_total if hot_total is not None else feed_count_cache.get(count_key)
+        if total is None:
+            generation = feed_count_cache.generation
+            count_query, count_params = PostService._build_feed_count_query(filters, approximate_total, now=now)
+            total_result = await db.fetchone(count_query, count_params)
+            total = total_result["total"] if total_result else 0
+            feed_count_cache.set(count_key, total, generation)
+        
+        total_is_estimate = approximate_total and total > FEED_APPROXIMATE_COUNT_LIMIT
+        if total_is_estimate:
+            total = FEED_APPROXIMATE_COUNT_LIMIT
+        
+        if expand:
+            posts = PostService._expand_posts(posts, expand, await reference_cache.get())
         
-        if super_rubric_id:
-            query += " AND super_rubric_id = ?"
-            params.append(super_rubric_id)
+        if cursor:
+            result = {
+                "posts": posts,
+                "total": total,
+                "total_is_estimate": total_is_estimate,
+                "limit": limit,
+                "next_cursor": next_cursor
+            }
+        else:
+            result = {
+                "posts": posts,
+                "total": total,
+                "total_is_estimate": total_is_estimate,
+                "page": page,
+                "limit": limit,
+                "pages": (total + limit - 1) // limit,
+                "next_cursor": next_cursor
+            }
         
-        if city_id:
-            query += " AND city_id = ?"
-            params.append(city_id)
+        if filters.get("facets"):
+            result["facets"] = await PostService.get_feed_facets(filters)
         
-        # Add ordering and pagination
-        query += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
-        params.extend([limit, offset])
+        return result
+    
+    @staticmethod
+    async def get_feed_page(filters: Dict[str, Any]) -> Tuple[bytes, str]:
+        """A feed page rendered to JSON with its ETag, cached for the public feed"""
+        cacheable = not (
+            filters.get("search") or filters.get("author_id") or filters.get("include_unpublished")
+        )
+        if not cacheable:
+            body = render_json(await PostService.get_posts_with_filters(filters, compact=True)).encode()
+            return body, etag_for(body)
         
-        # Execute query
-        posts = await db.fetchall(query, params)
+        feed_key = HotFeedIndex.key_for(filters)
+        cache_key = (
+            feed_key, max(1, filters.get("page", 1)), min(50, max(1, filters.get("limit", 20))),
+            filters.get("cursor"), bool(filters.get("approximate_total")), bool(filters.get("facets")),
+            PostService._feed_sort(filters), PostService._feed_expand(filters),
+            *(filters.get(name) for name in VALUE_FILTERS)
+        )
+        cached = feed_page_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
-        # Count total posts
-        count_query = "SELECT COUNT(*) as total FROM posts WHERE 1=1"
-        count_params = []
+        generation = feed_page_cache.generation
+        result = await PostService.get_posts_with_filters(filters, compact=True)
+        body = render_json(result).encode()
+        cached = (body, etag_for(body))
         
-        if post_type:
-            count_query += " AND post_type = ?"
-            count_params.append(post_type)
+        posts = result["posts"]
+        tags = [("feed", feed_key)]
+        if filters.get("facets"):
+            # Facet counts cover other feeds too
+            tags.append("facets")
         
-        if search:
-            count_query += " AND (title LIKE ? OR description LIKE ?)"
-            search_term = f"%{search}%"
-            count_params.extend([search_term, search_term])
+        ttl = None
+        if len(posts):
+            # Expanded rows are plain tuples, so read the column by position
+            position = posts.columns.index("expires_at")
+            first_expiry = min(row[position] for row in posts.rows)
+            ttl = max(0.0, (datetime.fromisoformat(first_expiry) - datetime.now()).total_seconds())
         
-        if author_id:
-            count_query += " AND author_id = ?"
-            count_params.append(author_id)
+        feed_page_cache.set(cache_key, cached, generation, ttl=ttl, tags=tags)
+        return cached
+    
+    @staticmethod
+    async def get_feed_facets(filters: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+        """Post counts per value of every FACET_COLUMNS column, each facet without its own filter"""
+        match_query = build_match_query(filters.get("search"))
+        include_unpublished = bool(filters.get("include_unpublished"))
+        price_sort = PostService._feed_sort(filters) in PRICE_SORTS
+        value_filters = tuple(filters.get(name) for name in VALUE_FILTERS)
+        cache_key = ("facets", match_query, include_unpublished, filters.get("author_id"), value_filters, price_sort)
+        combinations = feed_count_cache.get(cache_key)
         
-        if super_rubric_id:
-            count_query += " AND super_rubric_id = ?"
-            count_params.append(super_rubric_id)
+        if combinations is None:
+            generation = feed_count_cache.generation
+            if match_query or filters.get("author_id") or price_sort or any(value is not None for value in value_filters):
+                rows = await db.fetchall(*PostService._build_feed_facet_query(filters))
+            else:
+                rows = []
+                for query, params in PostService._build_facet_counter_queries(include_unpublished):
+                    rows.extend(await db.fetchall(query, params))
+            
+            # Counters store NULL as ''
+            combinations = [
+                (tuple(row[column] or None for column in FACET_COLUMNS), row["count"])
+                for row in rows
+            ]
+            feed_count_cache.set(cache_key, combinations, generation)
         
-        if city_id:
-            count_query += " AND city_id = ?"
-            count_params.append(city_id)
+        selected = [filters.get(column) for column in FACET_COLUMNS]
+        facets = {}
+        for index, column in enumerate(FACET_COLUMNS):
+            counts = {}
+            for values, count in combinations:
+                if all(
+                    not selected[other] or values[other] == selected[other]
+                    for other in range(len(FACET_COLUMNS)) if other != index
+                ):
+                    counts[values[index]] = counts.get(values[index], 0) + count
+            facets[column] = [
+                {"value": value, "count": count}
+                for value, count in sorted(counts.items(), key=lambda item: -item[1])
+            ]
         
-        total_result = await db.fetchone(count_query, count_params)
-        total = total_result["total"] if total_result else 0
+        return facets
+    
+    @staticmethod
+    async def get_post_detail(post_id: str) -> Optional[Dict[str, Any]]:
+        """A post with its author, city, currency and rubric nested in, or None"""
+        record = post_detail_cache.get(post_id)
+        if record is None:
+            generation = post_detail_cache.generation
+            row = await db.fetchone(f"{POST_DETAIL_QUERY} WHERE p.id = ?", [post_id])
+            if row is None:
+                return None
+            
+            record = PostService._detail_record(row)
+            post_detail_cache.set(post_id, record, generation, tags=[post_id])
         
-        return {
-            "posts": posts,
-            "total": total,
-            "page": page,
-            "limit": limit,
-            "pages": (total + limit - 1) // limit
-        }
+        # Callers may edit the copy (e.g. live view counts); the nested records are shared
+        return dict(record)
+    
+    @staticmethod
+    async def get_post_details(post_ids: List[str]) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """Detail records of several posts in request order, plus the ids that do not exist"""
+        post_ids = list(dict.fromkeys(post_ids))
+        records = {}
+        for post_id in post_ids:
+            record = post_detail_cache.get(post_id)
+            if record is not None:
+                records[post_id] = record
+        
+        uncached = [post_id for post_id in post_ids if post_id not in records]
+        if uncached:
+            generation = post_detail_cache.generation
+            placeholders = ", ".join("?" for _ in uncached)
+            rows = await db.fetchall(f"{POST_DETAIL_QUERY} WHERE p.id IN ({placeholders})", uncached)
+            for row in rows:
+                record = records[row["id"]] = PostService._detail_record(row)
+                post_detail_cache.set(row["id"], record, generation, tags=[row["id"]])
+        
+        posts = [dict(records[post_id]) for post_id in post_ids if post_id in records]
+        missing = [post_id for post_id in post_ids if post_id not in records]
+        return posts, missing
+    
+    @staticmethod
+    def _detail_record(row: Dict[str, Any]) -> Dict[str, Any]:
+        """Nest the joined DETAIL_JOINS columns of a POST_DETAIL_QUERY row"""
+        record = {key: value for key, value in row.items() if "__" not in key}
+        for name, (_, _, columns) in DETAIL_JOINS.items():
+            related = {column: row[f"{name}__{column}"] for column in columns}
+            record[name] = related if related["id"] is not None else None
+        return record
+    
+    @staticmethod
+    def apply_view_counts(counts: Dict[str, int]):
+        """Add view counts just written to posts.views_count to the cached detail records"""
+        for post_id, count in counts.items():
+            record = post_detail_cache.peek(post_id)
+            if record is not None:
+                record["views_count"] = (record["views_count"] or 0) + count
     
     @staticmethod
     async def update_post_status(post_id: str, status: int) -> bool:
@@ -206,4 +629,111 @@ class PostService:
         }
         
         rows_affected = await db.update("posts", update_data, "id = ?", [post_id])
-        return rows_affected > 0
\ No newline at end of file
+        await PostService.refresh_feed([post_id])
+        return rows_affected > 0
+    
+    @staticmethod
+    async def refresh_feed(post_ids: List[str], filters_changed: bool = False):
+        """Update cached feed data after posts changed (filters_changed when their feed columns may have)"""
+        feed_count_cache.clear()
+        post_detail_cache.invalidate(post_ids)
+        if filters_changed or not post_ids:
+            feed_page_cache.clear()
+        if not post_ids:
+            return
+        
+        # Concurrent refreshes of a post may finish out of order; the version taken
+        # before the read keeps an older row from replacing a newer one
+        version = hot_feed_index.begin_refresh() if hot_feed_index is not None else None
+        try:
+            now = datetime.now().isoformat()
+            placeholders = ", ".join("?" for _ in post_ids)
+            rows = await db.fetchall(
+                f"SELECT {FEED_COLUMNS} FROM posts p WHERE p.id IN ({placeholders})",
+                list(post_ids), compact=True
+            )
+            
+            # A post's feeds follow from its post_type/city/rubric, read again here
+            tags = {"facets"}
+            found = set()
+            for row in rows.rows:
+                found.add(row["id"])
+                tags.update(("feed", key) for key in HotFeedIndex.keys_for_row(row))
+            
+            deleted = [post_id for post_id in post_ids if post_id not in found]
+            for post_id in deleted:
+                previous = hot_feed_index.row(post_id) if hot_feed_index is not None else None
+                if previous is None:
+                    # Nothing left to tell which feeds a deleted post was in
+                    feed_page_cache.clear()
+                    break
+                tags.update(("feed", key) for key in HotFeedIndex.keys_for_row(previous))
+            feed_page_cache.invalidate(tags)
+            
+            if hot_feed_index is None:
+                return
+            for row in rows.rows:
+                hot_feed_index.add(row, now, version)
+            for post_id in deleted:
+                hot_feed_index.remove(post_id, version)
+        finally:
+            if version is not None:
+                hot_feed_index.end_refresh(version)
+    
+    @staticmethod
+    def refresh_references():
+        """Drop cached data that embeds cities, currencies or rubrics after they were edited"""
+        reference_cache.invalidate()
+        feed_page_cache.clear()
+        post_detail_cache.clear()
+    
+    @staticmethod
+    async def warm_feed_index():
+        """Build the hot feed index from the top FEED_HOT_INDEX_WARM_ROWS published posts"""
+        if hot_feed_index is None:
+            return
+        
+        query, params, _ = PostService._build_feed_page_query({}, FEED_HOT_INDEX_WARM_ROWS, 0)
+        rows = await db.fetchall(query, params, compact=True)
+        hot_feed_index.columns = rows.columns
+        hot_feed_index.build(rows.rows, complete=len(rows) < FEED_HOT_INDEX_WARM_ROWS)
+        
+        stats = hot_feed_index.stats()
+        print(f"Feed index warmed: {stats['keys']} feeds, {stats['posts']} posts")
+    
+    @staticmethod
+    async def _hot_feed_page(filters: Dict[str, Any], limit: int, offset: int, now: str):
+        """A page from the hot feed index as (rows, total or None), or None to read it from SQL"""
+        after = None
+        if filters.get("cursor"):
+            after = tuple(PostService._decode_feed_cursor(filters["cursor"], search=False))
+            offset = 0
+        
+        key = HotFeedIndex.key_for(filters)
+        if not hot_feed_index.has_key(key):
+            if after is not None or offset + limit > hot_feed_index.capacity:
+                return None
+            
+            generation = hot_feed_index.generation
+            key_filters = dict(zip(KEY_COLUMNS, key))
+            query, params, _ = PostService._build_feed_page_query(
+                key_filters, hot_feed_index.capacity + 1, 0, now=now
+            )
+            rows = await db.fetchall(query, params, compact=True)
+            if generation != hot_feed_index.generation:
+                return None
+            hot_feed_index.columns = rows.columns
+            hot_feed_index.load(key, rows.rows, complete=len(rows) <= hot_feed_index.capacity)
+        
+        return hot_feed_index.page(key, offset, limit, now, after)
+    
+    @staticmethod
+    def feed_cache_stats() -> Dict[str, Any]:
+        """Hit ratios of the feed and post detail caches, for the health endpoint"""
+        return {
+            "counts": feed_count_cache.stats(),
+            "pages": feed_page_cache.stats(),
+            "post_details": post_detail_cache.stats(),
+            "references": reference_cache.stats(),
+            "hot_index": hot_feed_index.stats() if hot_feed_index is not None else None
+        }
\ No newline at end of file
@@ -0,0 +1,93 @@
+"""
+JSON response helpers for large listings
+"""
+import hashlib
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional
+from fastapi.responses import Response, StreamingResponse
+
+def dumps(value: Any) -> str:
+    """Serialize a value the same way FastAPI's JSONResponse does"""
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+async def _next_batch(batches: AsyncIterator[List[Dict[str, Any]]]) -> Optional[List[Dict[str, Any]]]:
+    try:
+        return await batches.__anext__()
+    except StopAsyncIteration:
+        return None
+
+async def _stream_page(items_key: str, first_batch: List[Dict[str, Any]],
+                       batches: AsyncIterator[List[Dict[str, Any]]], meta: Dict[str, Any]):
+    try:
+        yield '{' + dumps(items_key) + ':['
+        first = True
+        batch = first_batch
+        while batch:
+            for item in batch:
+                yield ('' if first else ',') + dumps(item)
+                first = False
+            batch = await _next_batch(batches)
+        yield ']'
+        for key, value in meta.items():
+            yield ',' + dumps(key) + ':' + dumps(value)
+        yield '}'
+    except Exception as e:
+        # Headers are sent already: the client gets a truncated (invalid) body
+        print(f"❌ Error streaming {items_key}: {str(e)}")
+        raise
+    finally:
+        # Ended, failed or the client went away: release the reader connection now
+        await batches.aclose()
+
+async def stream_json_page(items_key: str, batches: AsyncIterator[List[Dict[str, Any]]],
+                           meta: Dict[str, Any]) -> StreamingResponse:
+    """
+    Stream {items_key: [...], **meta} without materialising the whole list,
+    consuming row batches as produced by db.iterate(). The first batch is read
+    before the response starts, so query errors still fail with a 500.
+    """
+    try:
+        first_batch = await _next_batch(batches)
+    except Exception:
+        await batches.aclose()
+        raise
+    return StreamingResponse(_stream_page(items_key, first_batch, batches, meta), media_type="application/json")
+
+def render_json(value: Any) -> str:
+    """
+    Serialize a response payload, letting compact values (db RowSet) render themselves
+    so their rows are never turned into dicts
+    """
+    if hasattr(value, "to_json"):
+        return value.to_json()
+    if isinstance(value, dict):
+        return '{' + ','.join(dumps(str(key)) + ':' + render_json(item) for key, item in value.items()) + '}'
+    if isinstance(value, (list, tuple)):
+        return '[' + ','.join(render_json(item) for item in value) + ']'
+    return dumps(value)
+
+def json_response(payload: Any, status_code: int = 200) -> Response:
+    """Return a payload rendered with render_json()"""
+    return Response(content=render_json(payload), status_code=status_code, media_type="application/json")
+
+def etag_for(body: bytes) -> str:
+    """Strong ETag for a rendered response body"""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True when an If-None-Match header lists the ETag (or is *)"""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    # Weak comparison, as If-None-Match requires
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+def cached_json_response(body: bytes, etag: str, if_none_match: Optional[str] = None) -> Response:
+    """
+    Return a pre-rendered JSON body with its ETag, or an empty 304 when the
+    client already holds that version
+    """
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
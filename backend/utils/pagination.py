@@ -0,0 +1,23 @@
+"""
+Opaque cursors for keyset pagination
+"""
+import base64
+import json
+from typing import Any, List
+
+def encode_cursor(values: List[Any]) -> str:
+    """Pack the sort key of the last row of a page into a URL-safe token"""
+    raw = json.dumps(values, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str, length: int) -> List[Any]:
+    """Unpack a cursor produced by encode_cursor; raises ValueError for anything else"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+    
+    if not isinstance(values, list) or len(values) != length:
+        raise ValueError("Invalid cursor")
+    return values
@@ -0,0 +1,195 @@
+"""
+Write-behind counter for post page views.
+
+A view only increments an in-memory counter; the counters are summed per post
+and written with one batched UPDATE every VIEW_FLUSH_INTERVAL seconds and on
+shutdown, instead of a read-modify-write transaction per view. Until then the
+unflushed views are added to the count a response reports.
+
+Distinct viewers are counted with per-post sketches (view_sketch.py) cached in
+memory and upserted with the same flush; the sketches are the record of who
+viewed a post. With VIEW_RECORD_ROWS a post_views row is kept per viewer as
+well, and the bloom filter gates its lookup: a viewer it has never seen gets a
+row without reading the table first.
+"""
+import asyncio
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from database import db
+from config import VIEW_FLUSH_INTERVAL, VIEW_SKETCH_CACHE_SIZE, VIEW_RECORD_ROWS
+from view_sketch import HyperLogLog, BloomFilter, viewer_hash
+from services.post_service import PostService
+
+class PostViewSketch:
+    """Viewer sketches of one post"""
+    __slots__ = ("hll", "bloom")
+    
+    def __init__(self, hll: Optional[bytes] = None, bloom: Optional[bytes] = None):
+        self.hll = HyperLogLog(hll)
+        self.bloom = BloomFilter(bloom)
+
+class ViewCounter:
+    """Per-post view increments, new viewers and changed sketches waiting to be written"""
+    
+    def __init__(self, interval: float, sketch_cache_size: int, record_rows: bool = False):
+        self.interval = interval
+        self.sketch_cache_size = sketch_cache_size
+        self.record_rows = record_rows
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.flushed_views = 0
+        self.viewer_lookups = 0
+        self.skipped_lookups = 0
+        self._pending: Dict[str, int] = {}
+        # Increments of the batch being written, still counted until it commits
+        self._flushing: Dict[str, int] = {}
+        # (post_id, user_id) -> viewed_at of post_views rows to insert (record_rows only)
+        self._new_viewers: Dict[Tuple[str, str], str] = {}
+        self._sketches: "OrderedDict[str, PostViewSketch]" = OrderedDict()
+        self._dirty_sketches: Dict[str, PostViewSketch] = {}
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+    
+    def record(self, post_id: str) -> int:
+        """Count one view; returns the post's views not yet written to the database"""
+        self._pending[post_id] = self._pending.get(post_id, 0) + 1
+        return self.unflushed(post_id)
+    
+    def unflushed(self, post_id: str) -> int:
+        return self._pending.get(post_id, 0) + self._flushing.get(post_id, 0)
+    
+    async def record_viewer(self, post_id: str, user_id: Optional[str]) -> int:
+        """
+        Add a viewer to the post's sketches (and, with record_rows, remember the first
+        view in post_views); returns the estimated number of distinct viewers. With
+        user_id None only the estimate is returned.
+        """
+        sketch = await self._sketch(post_id)
+        if not user_id:
+            return sketch.hll.count()
+        
+        value_hash = viewer_hash(user_id)
+        changed = sketch.hll.add(value_hash)
+        if sketch.bloom.add(value_hash):
+            # Possibly seen before: the bloom filter can be wrong, post_views cannot
+            if self.record_rows and (post_id, user_id) not in self._new_viewers:
+                self.viewer_lookups += 1
+                seen = await db.fetchone(
+                    "SELECT 1 AS seen FROM post_views WHERE post_id = ? AND user_id = ?", [post_id, user_id]
+                )
+                if seen is None:
+                    self._new_viewers[(post_id, user_id)] = datetime.now().isoformat()
+        else:
+            if self.record_rows:
+                self.skipped_lookups += 1
+                self._new_viewers[(post_id, user_id)] = datetime.now().isoformat()
+            changed = True
+        
+        if changed:
+            self._dirty_sketches[post_id] = sketch
+        return sketch.hll.count()
+    
+    async def flush(self) -> int:
+        """Write pending view counts, viewers and sketches in one transaction; returns the views written"""
+        async with self._lock:
+            if not (self._pending or self._new_viewers or self._dirty_sketches):
+                return 0
+            
+            self._flushing, self._pending = self._pending, {}
+            new_viewers, self._new_viewers = self._new_viewers, {}
+            sketches, self._dirty_sketches = self._dirty_sketches, {}
+            now = datetime.now().isoformat()
+            try:
+                async with db.transaction() as tx:
+                    for post_id, count in self._flushing.items():
+                        tx.execute("UPDATE posts SET views_count = views_count + ? WHERE id = ?", [count, post_id])
+                    for (post_id, user_id), viewed_at in new_viewers.items():
+                        tx.execute(
+                            """INSERT OR IGNORE INTO post_views (id, post_id, user_id, viewed_at)
+                               VALUES (?, ?, ?, ?)""",
+                            [str(uuid.uuid4()), post_id, user_id, viewed_at]
+                        )
+                    for post_id, sketch in sketches.items():
+                        # Merged with the stored blobs, which other processes may have extended
+                        tx.execute(
+                            """INSERT INTO post_view_sketches (post_id, hll, bloom, updated_at)
+                               SELECT ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM posts WHERE id = ?)
+                               ON CONFLICT (post_id) DO UPDATE SET
+                                   hll = hll_merge(hll, excluded.hll),
+                                   bloom = bloom_merge(bloom, excluded.bloom),
+                                   updated_at = excluded.updated_at""",
+                            [post_id, sketch.hll.to_bytes(), sketch.bloom.to_bytes(), now, post_id]
+                        )
+            except Exception as e:
+                # Nothing was committed; keep everything for the next flush
+                for post_id, count in self._flushing.items():
+                    self._pending[post_id] = self._pending.get(post_id, 0) + count
+                self._new_viewers = {**new_viewers, **self._new_viewers}
+                self._dirty_sketches = {**sketches, **self._dirty_sketches}
+                self.failed_flushes += 1
+                print(f"❌ Error flushing view counts: {str(e)}")
+                return 0
+            finally:
+                flushed, self._flushing = self._flushing, {}
+            
+            # Cached post details now lag the table by these views
+            PostService.apply_view_counts(flushed)
+            views = sum(flushed.values())
+            self.flushes += 1
+            self.flushed_views += views
+            return views
+    
+    def start(self):
+        """Start the periodic flush"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+    
+    async def stop(self):
+        """Stop the periodic flush and write what is left (call before the database closes)"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.viewer_lookups + self.skipped_lookups
+        return {
+            "pending_posts": len(self._pending),
+            "pending_views": sum(self._pending.values()),
+            "pending_viewers": len(self._new_viewers),
+            "flush_interval": self.interval,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "flushed_views": self.flushed_views,
+            "cached_sketches": len(self._sketches),
+            "record_rows": self.record_rows,
+            "viewer_lookups": self.viewer_lookups,
+            "skipped_lookups": self.skipped_lookups,
+            "skipped_lookup_rate": round(self.skipped_lookups / lookups, 4) if lookups else 0
+        }
+    
+    async def _sketch(self, post_id: str) -> PostViewSketch:
+        """The post's sketches, loaded from post_view_sketches on first use and kept LRU"""
+        sketch = self._sketches.get(post_id)
+        if sketch is None:
+            row = await db.fetchone("SELECT hll, bloom FROM post_view_sketches WHERE post_id = ?", [post_id])
+            # Another request may have loaded it meanwhile
+            sketch = self._sketches.get(post_id) or self._dirty_sketches.get(post_id)
+            if sketch is None:
+                sketch = PostViewSketch(row["hll"], row["bloom"]) if row else PostViewSketch()
+            self._sketches[post_id] = sketch
+            # Evicted sketches with unwritten viewers stay in _dirty_sketches until the flush
+            while len(self._sketches) > self.sketch_cache_size:
+                self._sketches.popitem(last=False)
+        self._sketches.move_to_end(post_id)
+        return sketch
+    
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+view_counter = ViewCounter(VIEW_FLUSH_INTERVAL, VIEW_SKETCH_CACHE_SIZE, VIEW_RECORD_ROWS)
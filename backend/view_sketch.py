@@ -0,0 +1,167 @@
+"""
+Probabilistic sketches of the viewers of a post.
+
+HyperLogLog estimates the number of distinct viewers from 2^HLL_PRECISION one-byte
+registers (about 3% standard error at precision 10); BloomFilter tells whether a
+viewer has possibly been seen before, with no false negatives, and grows with the
+number of viewers. Both are stored as blobs and merge byte by byte (register max,
+bit OR), so copies kept by different processes combine without losing viewers.
+hll_merge() and bloom_merge() expose the merges to SQL for upserts.
+"""
+import hashlib
+import math
+from typing import Optional
+from config import VIEW_BLOOM_CAPACITY, VIEW_BLOOM_ERROR_RATE
+
+HLL_PRECISION = 10
+BLOOM_MAX_LAYERS = 16
+
+def viewer_hash(viewer_id: str) -> int:
+    """128-bit hash of a viewer id: the high half feeds HyperLogLog, the low half the bloom filter"""
+    return int.from_bytes(hashlib.blake2b(viewer_id.encode("utf-8"), digest_size=16).digest(), "big")
+
+class HyperLogLog:
+    """Distinct count estimate over 64-bit hashes"""
+    __slots__ = ("registers", "_count")
+    
+    def __init__(self, registers: Optional[bytes] = None):
+        size = 1 << HLL_PRECISION
+        self.registers = bytearray(registers) if registers and len(registers) == size else bytearray(size)
+        self._count = None
+    
+    def add(self, value_hash: int) -> bool:
+        """Add a hashed value; returns True when a register changed"""
+        value = value_hash >> 64
+        index = value >> (64 - HLL_PRECISION)
+        remainder = value & ((1 << (64 - HLL_PRECISION)) - 1)
+        # Position of the first 1 bit after the index bits
+        rank = (64 - HLL_PRECISION) - remainder.bit_length() + 1
+        if rank <= self.registers[index]:
+            return False
+        self.registers[index] = rank
+        self._count = None
+        return True
+    
+    def count(self) -> int:
+        if self._count is None:
+            size = len(self.registers)
+            alpha = 0.7213 / (1 + 1.079 / size)
+            estimate = alpha * size * size / sum(2.0 ** -register for register in self.registers)
+            zeros = self.registers.count(0)
+            if estimate <= 2.5 * size and zeros:
+                # Linear counting is more accurate for small cardinalities
+                estimate = size * math.log(size / zeros)
+            self._count = int(round(estimate))
+        return self._count
+    
+    def to_bytes(self) -> bytes:
+        return bytes(self.registers)
+
+class BloomFilter:
+    """
+    Scalable set membership with false positives only, over 64-bit hashes.
+    Layers are appended as the last one fills, each twice the capacity of the
+    previous one with half its error rate, so the overall false-positive rate
+    stays under VIEW_BLOOM_ERROR_RATE however many viewers a post gets.
+    """
+    __slots__ = ("bits", "layers", "_last_count")
+    
+    def __init__(self, bits: Optional[bytes] = None):
+        layers = _bloom_layers(len(bits)) if bits else None
+        if layers:
+            self.bits = bytearray(bits)
+            self.layers = layers
+            self._last_count = self._estimate_count(*layers[-1])
+        else:
+            # Blobs of another layout (older sizes, other settings) start over
+            self.bits = bytearray(BLOOM_LAYOUT[0][1] // 8)
+            self.layers = BLOOM_LAYOUT[:1]
+            self._last_count = 0
+    
+    def contains(self, value_hash: int) -> bool:
+        """True when the value was possibly added before"""
+        for offset, size, hashes, _ in self.layers:
+            if all(self._test(offset, position) for position in _positions(value_hash, size, hashes)):
+                return True
+        return False
+    
+    def add(self, value_hash: int) -> bool:
+        """Add a hashed value; returns True when it was possibly present already"""
+        if self.contains(value_hash):
+            return True
+        
+        if self._last_count >= self.layers[-1][3] and len(self.layers) < len(BLOOM_LAYOUT):
+            layer = BLOOM_LAYOUT[len(self.layers)]
+            self.bits.extend(bytes(layer[1] // 8))
+            self.layers = BLOOM_LAYOUT[:len(self.layers) + 1]
+            self._last_count = 0
+        offset, size, hashes, _ = self.layers[-1]
+        for position in _positions(value_hash, size, hashes):
+            self.bits[offset + (position >> 3)] |= 1 << (position & 7)
+        self._last_count += 1
+        return False
+    
+    def to_bytes(self) -> bytes:
+        return bytes(self.bits)
+    
+    def _test(self, offset: int, position: int) -> bool:
+        return bool(self.bits[offset + (position >> 3)] & (1 << (position & 7)))
+    
+    def _estimate_count(self, offset: int, size: int, hashes: int, capacity: int) -> int:
+        # Items in a layer from the share of set bits
+        set_bits = int.from_bytes(self.bits[offset:offset + size // 8], "big").bit_count()
+        if set_bits >= size:
+            return capacity
+        return int(round(-size / hashes * math.log(1 - set_bits / size)))
+
+def _positions(value_hash: int, size: int, hashes: int):
+    # Double hashing: k positions from the two 32-bit halves of the low 64 bits
+    first = value_hash & 0xFFFFFFFF
+    second = (value_hash >> 32) & 0xFFFFFFFF | 1
+    return [(first + i * second) % size for i in range(hashes)]
+
+def _bloom_layout(capacity: int, error_rate: float, max_layers: int):
+    """(byte offset, bits, hashes, capacity) of every layer a filter can grow to"""
+    layout = []
+    offset = 0
+    for index in range(max_layers):
+        layer_capacity = capacity << index
+        layer_error = error_rate / 2 ** (index + 1)
+        size = math.ceil(-layer_capacity * math.log(layer_error) / math.log(2) ** 2 / 8) * 8
+        hashes = max(1, round(size / layer_capacity * math.log(2)))
+        layout.append((offset, size, hashes, layer_capacity))
+        offset += size // 8
+    return layout
+
+BLOOM_LAYOUT = _bloom_layout(VIEW_BLOOM_CAPACITY, VIEW_BLOOM_ERROR_RATE, BLOOM_MAX_LAYERS)
+
+def _bloom_layers(length: int):
+    """Layers of a blob of `length` bytes, or None when it is not a whole number of layers"""
+    end = 0
+    for index, (_, size, _, _) in enumerate(BLOOM_LAYOUT):
+        end += size // 8
+        if end == length:
+            return BLOOM_LAYOUT[:index + 1]
+        if end > length:
+            return None
+    return None
+
+def hll_merge(left: Optional[bytes], right: Optional[bytes]) -> Optional[bytes]:
+    """Union of two HyperLogLog blobs (register-wise max)"""
+    if not left or not right or len(left) != len(right):
+        return right or left
+    return bytes(map(max, left, right))
+
+def bloom_merge(left: Optional[bytes], right: Optional[bytes]) -> Optional[bytes]:
+    """Union of two bloom filter blobs (bitwise OR of the shared layers, plus the extra layers of the longer one)"""
+    if not left or not right or _bloom_layers(len(left)) is None or _bloom_layers(len(right)) is None:
+        return right or left
+    shared = min(len(left), len(right))
+    merged = int.from_bytes(left[:shared], "big") | int.from_bytes(right[:shared], "big")
+    longer = left if len(left) > len(right) else right
+    return merged.to_bytes(shared, "big") + longer[shared:]
+
+async def register_sketch_functions(conn):
+    """Register hll_merge() and bloom_merge(), used by the view counter's sketch upserts"""
+    await conn.create_function("hll_merge", 2, hll_merge, deterministic=True)
+    await conn.create_function("bloom_merge", 2, bloom_merge, deterministic=True)
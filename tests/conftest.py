@@ -0,0 +1,26 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+import reference_data  # noqa: E402
+import services.post_service as post_service  # noqa: E402
+from database import Database  # noqa: E402
+
+@pytest.fixture
+def feed_db(tmp_path, monkeypatch):
+    """An initialised database (no pool, so any event loop can use it) behind PostService, with empty caches"""
+    db = Database(str(tmp_path / "feed.db"))
+    asyncio.run(db.init_db())
+    monkeypatch.setattr(post_service, "db", db)
+    monkeypatch.setattr(reference_data, "db", db)
+    post_service.feed_count_cache.clear()
+    post_service.feed_page_cache.clear()
+    post_service.post_detail_cache.clear()
+    post_service.reference_cache.invalidate()
+    if post_service.hot_feed_index is not None:
+        post_service.hot_feed_index.clear()
+    return db
@@ -0,0 +1,54 @@
+"""
+Expiry sweep checks for the background tasks.
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+import background_tasks  # noqa: E402
+import services.post_service as post_service  # noqa: E402
+from database import Database  # noqa: E402
+
+def published_post(post_id, expires_at):
+    return {"id": post_id, "title": post_id, "post_type": "job", "status": 4, "expires_at": expires_at.isoformat()}
+
+def test_archive_expired_posts_works_through_every_batch(feed_db, monkeypatch):
+    monkeypatch.setattr(background_tasks, "db", feed_db)
+    monkeypatch.setattr(background_tasks, "DB_BULK_CHUNK_SIZE", 3)
+    now = datetime.now()
+    
+    async def run():
+        for index in range(7):
+            await feed_db.insert("posts", published_post(f"expired-{index}", now - timedelta(days=1)))
+        await feed_db.insert("posts", published_post("current", now + timedelta(days=1)))
+        
+        assert await background_tasks.archive_expired_posts(now.isoformat()) == 7
+        rows = await feed_db.fetchall("SELECT id, status FROM posts ORDER BY id")
+        return {row["id"]: row["status"] for row in rows}
+    
+    statuses = asyncio.run(run())
+    assert statuses.pop("current") == 4
+    assert set(statuses.values()) == {6}
+
+def test_archive_expired_posts_runs_on_a_single_reader_pool(tmp_path, monkeypatch):
+    db = Database(str(tmp_path / "single.db"), pool_size=1)
+    monkeypatch.setattr(background_tasks, "db", db)
+    monkeypatch.setattr(post_service, "db", db)
+    monkeypatch.setattr(background_tasks, "DB_BULK_CHUNK_SIZE", 2)
+    now = datetime.now()
+    
+    async def run():
+        await db.init_db()
+        await db.connect()
+        try:
+            for index in range(5):
+                await db.insert("posts", published_post(f"expired-{index}", now - timedelta(days=1)))
+            # Refreshing the feed borrows a reader, which must not wait on the sweep's own
+            return await asyncio.wait_for(background_tasks.archive_expired_posts(now.isoformat()), 10)
+        finally:
+            await db.close()
+    
+    assert asyncio.run(run()) == 5
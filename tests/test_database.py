@@ -0,0 +1,267 @@
+"""
+Connection pool and write path checks for Database.
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from database import Database  # noqa: E402
+
+async def open_pool(path, pool_size=3):
+    db = Database(path, pool_size=pool_size)
+    await db.init_db()
+    await db.connect()
+    return db
+
+def test_check_connections_keeps_the_pool_when_replacement_fails(tmp_path):
+    async def run():
+        db = await open_pool(str(tmp_path / "pool.db"))
+        try:
+            readers = [db._readers.get_nowait() for _ in range(db.pool_size)]
+            await readers[0].close()
+            for conn in readers:
+                db._readers.put_nowait(conn)
+            
+            open_connection = db._open_connection
+            
+            async def failing_open(*args, **kwargs):
+                raise OSError("cannot open")
+            
+            db._open_connection = failing_open
+            failed = await db.check_connections()
+            db._open_connection = open_connection
+            assert failed["failed"] == 1
+            assert db._readers.qsize() == db.pool_size
+            
+            repaired = await db.check_connections()
+            assert repaired["replaced"] == 1
+            assert db._readers.qsize() == db.pool_size
+            assert (await db.fetchone("SELECT 1 AS one"))["one"] == 1
+        finally:
+            await db.close()
+    
+    asyncio.run(run())
+
+def test_health_check_borrows_a_single_reader(tmp_path):
+    async def run():
+        db = await open_pool(str(tmp_path / "pool.db"))
+        try:
+            async with db._reader():
+                health = await db.health_check()
+            assert health["healthy"]
+            # The probe has returned its reader; the one held here stays out
+            assert health["idle_readers"] == db.pool_size - 1
+        finally:
+            await db.close()
+    
+    asyncio.run(run())
+
+async def create_items_table(db):
+    await db.execute("CREATE TABLE items (id TEXT PRIMARY KEY, name TEXT)")
+
+def test_failed_write_rolls_back_only_its_savepoint(tmp_path):
+    async def run():
+        db = await open_pool(str(tmp_path / "writes.db"))
+        try:
+            await create_items_table(db)
+            await db.insert("items", {"id": "taken", "name": "first"})
+            batches = db._write_stats["batches"]
+            
+            # Queued together, so they share one batch and one COMMIT
+            results = await asyncio.gather(
+                db.insert("items", {"id": "a", "name": "a"}),
+                db.insert("items", {"id": "taken", "name": "duplicate"}),
+                db.insert("items", {"id": "b", "name": "b"}),
+                return_exceptions=True
+            )
+            assert db._write_stats["batches"] == batches + 1
+            assert results[0] == "a" and results[2] == "b"
+            assert isinstance(results[1], Exception)
+            
+            rows = await db.fetchall("SELECT id, name FROM items ORDER BY id")
+            assert [(row["id"], row["name"]) for row in rows] == [("a", "a"), ("b", "b"), ("taken", "first")]
+        finally:
+            await db.close()
+    
+    asyncio.run(run())
+
+def test_failed_commit_fails_every_write_of_the_batch(tmp_path):
+    async def run():
+        db = await open_pool(str(tmp_path / "writes.db"))
+        try:
+            await db.execute("CREATE TABLE parents (id TEXT PRIMARY KEY)")
+            await db.execute("""
+                CREATE TABLE children (
+                    id TEXT PRIMARY KEY,
+                    parent_id TEXT REFERENCES parents(id) DEFERRABLE INITIALLY DEFERRED
+                )
+            """)
+            await db._writer.execute("PRAGMA foreign_keys = ON")
+            batches, failed = db._write_stats["batches"], db._write_stats["failed_batches"]
+            
+            # The orphan passes its own statement and only fails the deferred check at COMMIT
+            results = await asyncio.gather(
+                db.insert("parents", {"id": "parent-1"}),
+                db.insert("children", {"id": "orphan", "parent_id": "missing"}),
+                return_exceptions=True
+            )
+            assert db._write_stats["batches"] == batches + 1
+            assert db._write_stats["failed_batches"] == failed + 1
+            assert all(isinstance(result, Exception) for result in results), results
+            assert await db.fetchall("SELECT id FROM parents") == []
+            
+            # The writer is usable again afterwards
+            await db.insert("parents", {"id": "parent-2"})
+            assert [row["id"] for row in await db.fetchall("SELECT id FROM parents")] == ["parent-2"]
+        finally:
+            await db.close()
+    
+    asyncio.run(run())
+
+def test_broken_writer_fails_its_batch_and_is_replaced(tmp_path):
+    async def run():
+        db = await open_pool(str(tmp_path / "writes.db"))
+        try:
+            await create_items_table(db)
+            await db._writer.close()
+            assert not (await db.health_check())["writer_healthy"]
+            
+            results = await asyncio.wait_for(asyncio.gather(
+                db.insert("items", {"id": "a"}),
+                db.insert("items", {"id": "b"}),
+                return_exceptions=True
+            ), 5)
+            assert all(isinstance(result, Exception) for result in results), results
+            
+            # The next write goes through a fresh writer
+            assert await asyncio.wait_for(db.insert("items", {"id": "c"}), 5) == "c"
+            assert (await db.health_check())["healthy"]
+            assert [row["id"] for row in await db.fetchall("SELECT id FROM items")] == ["c"]
+        finally:
+            await db.close()
+    
+    asyncio.run(run())
+
+def test_write_loop_fails_writes_of_a_batch_that_raised(tmp_path):
+    async def run():
+        db = await open_pool(str(tmp_path / "writes.db"))
+        commit_batch = db._commit_batch
+        
+        async def failing_commit_batch(batch):
+            raise RuntimeError("batch failed")
+        
+        try:
+            db._commit_batch = failing_commit_batch
+            try:
+                await asyncio.wait_for(db.execute("SELECT 1"), 5)
+            except RuntimeError as e:
+                assert str(e) == "batch failed"
+            else:
+                raise AssertionError("the write did not fail")
+        finally:
+            db._commit_batch = commit_batch
+            await db.close()
+    
+    asyncio.run(run())
+
+def test_close_commits_queued_writes(tmp_path):
+    path = str(tmp_path / "writes.db")
+    
+    async def run():
+        db = await open_pool(path)
+        await create_items_table(db)
+        writes = [asyncio.ensure_future(db.insert("items", {"id": f"item-{index}"})) for index in range(250)]
+        # Let every write reach the queue, then close with most of them still waiting
+        await asyncio.sleep(0)
+        assert db._write_queue.qsize() > 0
+        await db.close()
+        assert all(write.done() and not write.exception() for write in writes)
+        
+        reopened = Database(path)
+        try:
+            row = await reopened.fetchone("SELECT COUNT(*) AS total FROM items")
+            assert row["total"] == 250
+        finally:
+            await reopened.close()
+    
+    asyncio.run(run())
+
+def test_update_many_skips_rows_with_only_the_key(tmp_path):
+    async def run():
+        db = await open_pool(str(tmp_path / "writes.db"))
+        try:
+            await create_items_table(db)
+            await db.insert_many("items", [{"id": "a", "name": "a"}, {"id": "b", "name": "b"}])
+            affected = await db.update_many("items", [{"id": "a"}, {"id": "b", "name": "renamed"}])
+            assert affected == 1
+            rows = await db.fetchall("SELECT id, name FROM items ORDER BY id")
+            assert [(row["id"], row["name"]) for row in rows] == [("a", "a"), ("b", "renamed")]
+        finally:
+            await db.close()
+    
+    asyncio.run(run())
+
+@pytest.mark.parametrize("pool_size", [None, 2])
+def test_failing_transaction_statement_rolls_back_the_block(tmp_path, pool_size):
+    async def run():
+        db = Database(str(tmp_path / "tx.db"), pool_size=pool_size)
+        await db.init_db()
+        if pool_size:
+            await db.connect()
+        try:
+            await create_items_table(db)
+            await db.insert("items", {"id": "taken", "name": "first"})
+            
+            with pytest.raises(Exception):
+                async with db.transaction() as tx:
+                    tx.insert("items", {"id": "a", "name": "a"})
+                    tx.execute("UPDATE items SET name = 'changed' WHERE id = 'taken'")
+                    tx.insert("items", {"id": "taken", "name": "duplicate"})
+            
+            rows = await db.fetchall("SELECT id, name FROM items ORDER BY id")
+            assert [(row["id"], row["name"]) for row in rows] == [("taken", "first")]
+        finally:
+            await db.close()
+    
+    asyncio.run(run())
+
+def test_transaction_block_that_raises_writes_nothing(tmp_path):
+    async def run():
+        db = await open_pool(str(tmp_path / "tx.db"))
+        try:
+            await create_items_table(db)
+            with pytest.raises(RuntimeError):
+                async with db.transaction() as tx:
+                    tx.insert("items", {"id": "a", "name": "a"})
+                    raise RuntimeError("abandoned")
+            
+            row = await db.fetchone("SELECT COUNT(*) AS total FROM items")
+            assert row["total"] == 0
+        finally:
+            await db.close()
+    
+    asyncio.run(run())
+
+@pytest.mark.parametrize("pool_size", [None, 2])
+def test_transaction_fills_in_rowcounts(tmp_path, pool_size):
+    async def run():
+        db = Database(str(tmp_path / "tx.db"), pool_size=pool_size)
+        await db.init_db()
+        if pool_size:
+            await db.connect()
+        try:
+            await create_items_table(db)
+            async with db.transaction() as tx:
+                tx.insert("items", {"id": "a", "name": "a"})
+                tx.insert("items", {"id": "b", "name": "b"})
+                tx.execute("UPDATE items SET name = 'renamed'")
+                tx.delete("items", "id = ?", ["missing"])
+            return tx.rowcounts
+        finally:
+            await db.close()
+    
+    assert asyncio.run(run()) == [1, 1, 2, 0]
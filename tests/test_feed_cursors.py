@@ -0,0 +1,90 @@
+"""
+Keyset cursors of every feed sort mode.
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from services.post_service import FEED_SORTS, PRICE_SORTS, PUBLISHED_STATUS, PostService  # noqa: E402
+from utils.pagination import encode_cursor  # noqa: E402
+
+def sorted_post(number, **columns):
+    created_at = columns.pop("created_at", "2024-01-01T00:00:00")
+    return {
+        "id": f"post-{number:02d}", "title": "t", "description": "d", "post_type": "job", "author_id": "user-1",
+        "status": PUBLISHED_STATUS, "expires_at": (datetime.now() + timedelta(days=10)).isoformat(),
+        "created_at": created_at, "rank_at": created_at, **columns,
+    }
+
+def tied_posts():
+    """Posts sharing most sort keys, so pages have to break ties on id"""
+    return [
+        sorted_post(
+            number, price=(100, 250, None)[number % 3], currency_id="rub-id", views_count=number % 2,
+            has_highlight=number % 5 == 0, created_at=f"2024-01-0{1 + number % 3}T00:00:00",
+        )
+        for number in range(13)
+    ]
+
+async def walk(filters):
+    ids, filters = [], dict(filters)
+    while True:
+        page = await PostService.get_posts_with_filters(filters)
+        ids.extend(post["id"] for post in page["posts"])
+        if not page["next_cursor"]:
+            return ids
+        filters["cursor"] = page["next_cursor"]
+
+async def ordered_ids(db, sort):
+    price = "AND price_base IS NOT NULL" if sort in PRICE_SORTS else ""
+    order_by = FEED_SORTS[sort][0].replace("p.", "")
+    rows = await db.fetchall(f"SELECT id FROM posts WHERE status = ? {price} ORDER BY {order_by}", [PUBLISHED_STATUS])
+    return [row["id"] for row in rows]
+
+@pytest.mark.parametrize("sort", list(FEED_SORTS))
+def test_cursor_pages_cover_the_feed_once_in_order(feed_db, sort):
+    async def run():
+        for post in tied_posts():
+            await feed_db.insert("posts", post)
+        return await walk({"sort": sort, "limit": 2}), await ordered_ids(feed_db, sort)
+    
+    ids, expected = asyncio.run(run())
+    assert ids == expected
+    assert len(set(ids)) == len(ids)
+
+@pytest.mark.parametrize("sort", list(FEED_SORTS))
+def test_cursor_is_not_shifted_by_posts_added_ahead_of_it(feed_db, sort):
+    async def run():
+        for post in tied_posts():
+            await feed_db.insert("posts", post)
+        expected = await ordered_ids(feed_db, sort)
+        
+        first = await PostService.get_posts_with_filters({"sort": sort, "limit": 4})
+        # Sorts first in every mode: highest tier, newest, most viewed, cheapest/dearest
+        await feed_db.insert("posts", sorted_post(
+            99, has_highlight=True, created_at="2025-01-01T00:00:00", views_count=100,
+            price=1 if sort == "price_asc" else 10 ** 6, currency_id="rub-id"
+        ))
+        await PostService.refresh_feed(["post-99"])
+        rest = await walk({"sort": sort, "limit": 4, "cursor": first["next_cursor"]})
+        return [post["id"] for post in first["posts"]] + rest, expected
+    
+    ids, expected = asyncio.run(run())
+    assert ids == expected
+
+@pytest.mark.parametrize("sort, cursor", [
+    ("newest", encode_cursor([100, "post-01"])),
+    ("newest", encode_cursor(["2", "2024-01-01", "post-01"])),
+    ("price_asc", encode_cursor([2, "2024-01-01", "post-01"])),
+    ("price_desc", encode_cursor(["100", "post-01"])),
+    ("views", encode_cursor([True, "post-01"])),
+    ("views", "not a cursor"),
+])
+def test_cursor_of_another_shape_is_rejected(feed_db, sort, cursor):
+    with pytest.raises(ValueError):
+        asyncio.run(PostService.get_posts_with_filters({"sort": sort, "cursor": cursor}))
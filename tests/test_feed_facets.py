@@ -0,0 +1,87 @@
+"""
+Facet counts from the post_facet_counts counters against the feed they describe.
+"""
+import asyncio
+import itertools
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from services.post_service import PostService, PUBLISHED_STATUS  # noqa: E402
+
+def facet_posts(now):
+    expiries = [
+        now - timedelta(days=2),
+        now - timedelta(hours=1),
+        now + timedelta(minutes=30),
+        now + timedelta(days=1),
+        now + timedelta(days=20),
+    ]
+    posts = []
+    for number, (expires_at, status, post_type, city_id) in enumerate(itertools.product(
+        expiries, (PUBLISHED_STATUS, 2), ("job", "service"), ("moscow-city", None)
+    )):
+        posts.append({
+            "id": f"post-{number:03d}", "title": "t", "description": "d", "post_type": post_type,
+            "city_id": city_id, "author_id": "user-1", "status": status,
+            "expires_at": expires_at.isoformat(), "created_at": "2024-01-01T00:00:00",
+        })
+    return posts
+
+def grouped_counts(posts, now, include_unpublished=False):
+    counts = {}
+    for post in posts:
+        if not include_unpublished and (post["status"] != PUBLISHED_STATUS or post["expires_at"] <= now.isoformat()):
+            continue
+        counts[post["post_type"]] = counts.get(post["post_type"], 0) + 1
+    return counts
+
+def post_type_counts(facets):
+    return {item["value"]: item["count"] for item in facets["post_type"]}
+
+def test_counter_facets_leave_out_expired_posts(feed_db):
+    async def run():
+        now = datetime.now()
+        posts = facet_posts(now)
+        for post in posts:
+            await feed_db.insert("posts", dict(post))
+        
+        published = await PostService.get_feed_facets({})
+        everything = await PostService.get_feed_facets({"include_unpublished": True})
+        feed = await PostService.get_posts_with_filters({"limit": 50})
+        return posts, published, everything, feed
+    
+    posts, published, everything, feed = asyncio.run(run())
+    now = datetime.now()
+    assert post_type_counts(published) == grouped_counts(posts, now)
+    assert sum(post_type_counts(published).values()) == feed["total"]
+    assert post_type_counts(everything) == grouped_counts(posts, now, include_unpublished=True)
+
+def test_counters_follow_expiry_and_status_changes(feed_db):
+    async def run():
+        now = datetime.now()
+        await feed_db.insert("posts", {
+            "id": "post-1", "title": "t", "description": "d", "post_type": "job", "author_id": "user-1",
+            "status": PUBLISHED_STATUS, "expires_at": (now + timedelta(days=5)).isoformat(),
+        })
+        before = post_type_counts(await PostService.get_feed_facets({}))
+        
+        await feed_db.execute("UPDATE posts SET expires_at = ? WHERE id = ?",
+                              [(now - timedelta(days=1)).isoformat(), "post-1"])
+        await PostService.refresh_feed(["post-1"])
+        expired = post_type_counts(await PostService.get_feed_facets({}))
+        
+        await feed_db.execute("UPDATE posts SET expires_at = ?, status = 2 WHERE id = ?",
+                              [(now + timedelta(days=5)).isoformat(), "post-1"])
+        await PostService.refresh_feed(["post-1"])
+        unpublished = post_type_counts(await PostService.get_feed_facets({}))
+        counters = await feed_db.fetchall("SELECT SUM(count) AS total FROM post_facet_counts")
+        return before, expired, unpublished, counters[0]["total"]
+    
+    before, expired, unpublished, total = asyncio.run(run())
+    assert before == {"job": 1}
+    assert expired == {}
+    assert unpublished == {}
+    assert total == 1
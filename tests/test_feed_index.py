@@ -0,0 +1,179 @@
+"""
+Behaviour of the in-memory hot feed index against the feed order it mirrors.
+"""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from feed_index import HotFeedIndex, PUBLISHED_STATUS, sort_key  # noqa: E402
+
+NOW = "2024-06-01T00:00:00"
+ALL = (None, None, None)
+JOBS = ("job", None, None)
+
+def post(number, post_type="job", city_id="moscow-city", rank_tier=0, status=PUBLISHED_STATUS,
+         expires_at="2099-01-01T00:00:00"):
+    return {
+        "id": f"post-{number:03d}", "post_type": post_type, "city_id": city_id, "super_rubric_id": None,
+        "status": status, "rank_tier": rank_tier, "rank_at": f"2024-05-{number % 28 + 1:02d}T00:00:{number % 60:02d}",
+        "expires_at": expires_at,
+    }
+
+def feed_order(rows):
+    return sorted(rows, key=sort_key, reverse=True)
+
+def ids(rows):
+    return [row["id"] for row in rows]
+
+def built_index(rows, capacity=10, complete=True):
+    index = HotFeedIndex(capacity, 100)
+    index.build(feed_order(rows), complete)
+    return index
+
+def test_build_pages_follow_the_feed_order():
+    rows = [post(number, post_type=("job", "service")[number % 2]) for number in range(8)]
+    index = built_index(rows)
+    expected = ids(feed_order(rows))
+    page, total = index.page(ALL, 0, 3, NOW)
+    assert ids(page) == expected[:3]
+    assert total == len(rows)
+    page, _ = index.page(ALL, 3, 3, NOW)
+    assert ids(page) == expected[3:6]
+    jobs, total = index.page(JOBS, 0, 10, NOW)
+    assert ids(jobs) == ids(feed_order(row for row in rows if row["post_type"] == "job"))
+    assert total == 4
+
+def test_page_after_keyset_position():
+    rows = [post(number) for number in range(10)]
+    index = built_index(rows)
+    ordered = feed_order(rows)
+    page, _ = index.page(ALL, 0, 4, NOW, after=sort_key(ordered[2]))
+    assert ids(page) == ids(ordered[3:7])
+
+def test_truncated_keys_have_no_total_and_miss_past_capacity():
+    rows = [post(number) for number in range(15)]
+    index = built_index(rows, capacity=5, complete=True)
+    page, total = index.page(ALL, 0, 5, NOW)
+    assert ids(page) == ids(feed_order(rows)[:5])
+    assert total is None
+    assert index.page(ALL, 5, 5, NOW) is None
+
+def test_incomplete_build_reports_no_total():
+    index = built_index([post(number) for number in range(3)], complete=False)
+    assert index.page(ALL, 0, 2, NOW)[1] is None
+    assert index.page(ALL, 0, 10, NOW) is None
+
+def test_load_replaces_a_key():
+    index = HotFeedIndex(5, 100)
+    rows = [post(number) for number in range(3)]
+    index.load(JOBS, feed_order(rows), complete=True)
+    assert index.has_key(JOBS)
+    page, total = index.page(JOBS, 0, 10, NOW)
+    assert ids(page) == ids(feed_order(rows))
+    assert total == 3
+    assert index.page(ALL, 0, 10, NOW) is None
+
+def test_add_and_remove_keep_keys_sorted():
+    rows = [post(number) for number in range(6)]
+    index = built_index(rows)
+    boosted = dict(post(2), rank_tier=2)
+    index.add(boosted, NOW)
+    page, total = index.page(ALL, 0, 10, NOW)
+    assert page[0]["id"] == boosted["id"]
+    assert total == 6
+    
+    index.add(post(20), NOW)
+    index.remove(post(3)["id"])
+    expected = feed_order([boosted, post(20)] + [row for row in rows if row["id"] not in (post(2)["id"], post(3)["id"])])
+    page, total = index.page(ALL, 0, 10, NOW)
+    assert ids(page) == ids(expected)
+    assert total == 6
+
+def test_add_drops_unpublished_and_expired_posts():
+    index = built_index([post(number) for number in range(4)])
+    index.add(post(1, status=PUBLISHED_STATUS + 1), NOW)
+    index.add(post(2, expires_at="2024-01-01T00:00:00"), NOW)
+    page, total = index.page(ALL, 0, 10, NOW)
+    assert post(1)["id"] not in ids(page) and post(2)["id"] not in ids(page)
+    assert total == 2
+
+def test_add_past_capacity_truncates_the_key():
+    index = built_index([post(number) for number in range(5)], capacity=5)
+    index.add(dict(post(30), rank_tier=1), NOW)
+    page, total = index.page(ALL, 0, 5, NOW)
+    assert page[0]["id"] == post(30)["id"]
+    assert len(page) == 5
+    assert total is None
+
+def test_add_below_a_truncated_key_is_skipped():
+    rows = [dict(post(number), rank_tier=1) for number in range(5)]
+    index = built_index(rows, capacity=5, complete=False)
+    index.add(post(40), NOW)
+    assert post(40)["id"] not in ids(index.page(ALL, 0, 5, NOW)[0])
+
+def test_expired_rows_leave_pages():
+    rows = [post(number) for number in range(3)] + [post(9, expires_at="2024-05-31T00:00:00")]
+    index = built_index(rows)
+    page, total = index.page(ALL, 0, 10, NOW)
+    assert post(9)["id"] not in ids(page)
+    assert total == 3
+
+def test_stale_refresh_does_not_overwrite_a_newer_one():
+    index = built_index([post(number) for number in range(3)])
+    approved, rejected = post(1), post(1, status=PUBLISHED_STATUS + 2)
+    # The approval read its row first, the rejection read later but finished first
+    older = index.begin_refresh()
+    newer = index.begin_refresh()
+    index.add(rejected, NOW, newer)
+    index.end_refresh(newer)
+    index.add(approved, NOW, older)
+    index.end_refresh(older)
+    assert post(1)["id"] not in ids(index.page(ALL, 0, 10, NOW)[0])
+    
+    # Once no refresh is running, later changes apply again
+    version = index.begin_refresh()
+    index.add(approved, NOW, version)
+    index.end_refresh(version)
+    assert post(1)["id"] in ids(index.page(ALL, 0, 10, NOW)[0])
+
+def test_stale_refresh_does_not_resurrect_a_deleted_post():
+    index = built_index([post(number) for number in range(3)])
+    older = index.begin_refresh()
+    newer = index.begin_refresh()
+    index.remove(post(2)["id"], newer)
+    index.add(post(2), NOW, older)
+    index.end_refresh(newer)
+    index.end_refresh(older)
+    assert post(2)["id"] not in ids(index.page(ALL, 0, 10, NOW)[0])
+
+def test_random_changes_match_a_full_sort():
+    generator = random.Random(7)
+    rows = {}
+    for number in range(40):
+        rows[number] = post(number, post_type=generator.choice(["job", "service"]),
+                            city_id=generator.choice(["moscow-city", None]))
+    index = built_index(list(rows.values()), capacity=100)
+    for _ in range(300):
+        number = generator.randrange(60)
+        if generator.random() < 0.2:
+            rows.pop(number, None)
+            index.remove(post(number)["id"])
+        else:
+            rows[number] = post(number, post_type=generator.choice(["job", "service"]),
+                                city_id=generator.choice(["moscow-city", None]),
+                                rank_tier=generator.randrange(3),
+                                status=generator.choice([PUBLISHED_STATUS, PUBLISHED_STATUS + 1]))
+            index.add(rows[number], NOW)
+    
+    published = [row for row in rows.values() if row["status"] == PUBLISHED_STATUS]
+    for key in (ALL, JOBS, ("service", "moscow-city", None)):
+        expected = [
+            row for row in published
+            if all(value is None or row[column] == value
+                   for column, value in zip(("post_type", "city_id", "super_rubric_id"), key))
+        ]
+        page, total = index.page(key, 0, 100, NOW)
+        assert ids(page) == ids(feed_order(expected))
+        assert total == len(expected)
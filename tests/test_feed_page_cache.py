@@ -0,0 +1,181 @@
+"""
+Rendered feed page cache: ETags, tag invalidation, the generation guard, and
+cached pages against the same feed read straight from SQL.
+"""
+import asyncio
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+import services.post_service as post_service  # noqa: E402
+from routers.posts import router  # noqa: E402
+from services.post_service import PostService, PUBLISHED_STATUS  # noqa: E402
+
+def feed_post(post_id, post_type="job", status=PUBLISHED_STATUS, days=10, **columns):
+    created_at = columns.pop("created_at", "2024-01-01T00:00:00")
+    return {
+        "id": post_id, "title": post_id, "description": "d", "post_type": post_type, "author_id": "user-1",
+        "status": status, "expires_at": (datetime.now() + timedelta(days=days)).isoformat(),
+        "created_at": created_at, "rank_at": created_at, **columns,
+    }
+
+def page_ids(body):
+    return [post["id"] for post in json.loads(body)["posts"]]
+
+def test_feed_answers_304_for_the_current_etag(feed_db):
+    asyncio.run(feed_db.insert("posts", feed_post("post-1")))
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app)
+    
+    first = client.get("/api/posts/", params={"post_type": "job"})
+    assert first.status_code == 200 and page_ids(first.content) == ["post-1"]
+    etag = first.headers["etag"]
+    
+    unchanged = client.get("/api/posts/", params={"post_type": "job"}, headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304 and unchanged.content == b""
+    assert unchanged.headers["etag"] == etag
+    weak = client.get("/api/posts/", params={"post_type": "job"}, headers={"If-None-Match": f'"other", W/{etag}'})
+    assert weak.status_code == 304
+    
+    asyncio.run(feed_db.insert("posts", feed_post("post-2", created_at="2024-02-01T00:00:00")))
+    asyncio.run(PostService.refresh_feed(["post-2"]))
+    changed = client.get("/api/posts/", params={"post_type": "job"}, headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+    assert page_ids(changed.content) == ["post-2", "post-1"]
+
+def test_post_changes_drop_only_the_pages_of_their_feed(feed_db):
+    async def run():
+        await feed_db.insert("posts", feed_post("job-1"))
+        await feed_db.insert("posts", feed_post("service-1", post_type="service"))
+        jobs = await PostService.get_feed_page({"post_type": "job"})
+        services = await PostService.get_feed_page({"post_type": "service"})
+        assert await PostService.get_feed_page({"post_type": "job"}) is jobs
+        
+        # A new post in the job feed
+        await feed_db.insert("posts", feed_post("job-2", created_at="2024-02-01T00:00:00"))
+        await PostService.refresh_feed(["job-2"])
+        created = await PostService.get_feed_page({"post_type": "job"})
+        assert page_ids(created[0]) == ["job-2", "job-1"]
+        assert await PostService.get_feed_page({"post_type": "service"}) is services
+        
+        # A job post leaving the feed
+        await PostService.update_post_status("job-1", 6)
+        archived = await PostService.get_feed_page({"post_type": "job"})
+        assert page_ids(archived[0]) == ["job-2"]
+        assert await PostService.get_feed_page({"post_type": "service"}) is services
+    
+    asyncio.run(run())
+
+def test_render_overtaken_by_a_change_is_not_cached(feed_db, monkeypatch):
+    render = PostService.get_posts_with_filters
+    
+    async def render_then_change(filters, compact=False):
+        result = await render(filters, compact=compact)
+        monkeypatch.setattr(PostService, "get_posts_with_filters", render)
+        # The post leaves the feed while the page is still being rendered
+        await PostService.update_post_status("post-1", 6)
+        return result
+    
+    async def run():
+        await feed_db.insert("posts", feed_post("post-1"))
+        monkeypatch.setattr(PostService, "get_posts_with_filters", render_then_change)
+        stale = await PostService.get_feed_page({"post_type": "job"})
+        assert page_ids(stale[0]) == ["post-1"]
+        assert post_service.feed_page_cache.stats()["size"] == 0
+        
+        fresh = await PostService.get_feed_page({"post_type": "job"})
+        assert page_ids(fresh[0]) == []
+    
+    asyncio.run(run())
+
+POST_TYPES = ("job", "service")
+CITIES = ("moscow-city", "kyiv-city", None)
+RUBRICS = ("job-rubric", "service-rubric")
+
+def random_post(rng, number):
+    created_at = (datetime(2024, 1, 1) + timedelta(hours=rng.randrange(200))).isoformat()
+    return feed_post(
+        f"post-{number:03d}", post_type=rng.choice(POST_TYPES),
+        status=rng.choice((PUBLISHED_STATUS, PUBLISHED_STATUS, PUBLISHED_STATUS, 2, 6)),
+        days=rng.choice((-3, 1, 5, 30)), created_at=created_at,
+        city_id=rng.choice(CITIES), super_rubric_id=rng.choice(RUBRICS),
+        price=rng.choice((None, 100, 250, 1000)), currency_id="rub-id",
+        has_highlight=rng.random() < 0.2, views_count=rng.choice((0, 3, 7)),
+    )
+
+def random_filters(rng):
+    filters = {"limit": rng.choice((3, 7, 20)), "sort": rng.choice(tuple(post_service.FEED_SORTS))}
+    for column, values in (("post_type", POST_TYPES), ("city_id", CITIES), ("super_rubric_id", RUBRICS)):
+        if rng.random() < 0.5:
+            filters[column] = rng.choice(values[:2])
+    return filters
+
+async def walk_feed(filters):
+    """Ids of every page of a feed, following next_cursor"""
+    ids, filters = [], dict(filters)
+    while True:
+        body, _ = await PostService.get_feed_page(filters)
+        page = json.loads(body)
+        ids.extend(post["id"] for post in page["posts"])
+        if not page["next_cursor"]:
+            return ids, page["total"]
+        filters["cursor"] = page["next_cursor"]
+
+async def sql_feed(db, filters):
+    conditions, params = ["status = ?", "expires_at > ?"], [PUBLISHED_STATUS, datetime.now().isoformat()]
+    for column in post_service.FACET_COLUMNS:
+        if filters.get(column):
+            conditions.append(f"{column} = ?")
+            params.append(filters[column])
+    if filters["sort"] in post_service.PRICE_SORTS:
+        conditions.append("price_base IS NOT NULL")
+    order_by = post_service.FEED_SORTS[filters["sort"]][0].replace("p.", "")
+    rows = await db.fetchall(f"SELECT id FROM posts WHERE {' AND '.join(conditions)} ORDER BY {order_by}", params)
+    return [row["id"] for row in rows]
+
+def test_cached_feed_pages_match_sql_through_random_changes(feed_db):
+    rng = random.Random(19)
+    
+    async def run():
+        posts = [random_post(rng, number) for number in range(80)]
+        for post in posts:
+            await feed_db.insert("posts", dict(post))
+        next_number = len(posts)
+        
+        for _ in range(40):
+            for _ in range(4):
+                filters = random_filters(rng)
+                ids, total = await walk_feed(filters)
+                expected = await sql_feed(feed_db, filters)
+                assert ids == expected, filters
+                assert total == len(expected), filters
+            
+            # One change to the posts, reported the way the services report it
+            change = rng.choice(("create", "status", "boost", "move"))
+            post_id = rng.choice(posts)["id"]
+            if change == "create":
+                post = random_post(rng, next_number)
+                next_number += 1
+                posts.append(post)
+                await feed_db.insert("posts", dict(post))
+                await PostService.refresh_feed([post["id"]])
+            elif change == "status":
+                await PostService.update_post_status(post_id, rng.choice((PUBLISHED_STATUS, 2, 6)))
+            elif change == "boost":
+                await feed_db.execute("UPDATE posts SET rank_at = ? WHERE id = ?",
+                                      [(datetime(2024, 2, 1) + timedelta(minutes=next_number)).isoformat(), post_id])
+                next_number += 1
+                await PostService.refresh_feed([post_id])
+            else:
+                await feed_db.execute("UPDATE posts SET city_id = ? WHERE id = ?", [rng.choice(CITIES), post_id])
+                await PostService.refresh_feed([post_id], filters_changed=True)
+    
+    asyncio.run(run())
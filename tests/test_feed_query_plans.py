@@ -0,0 +1,126 @@
+"""
+Query plan checks for the public post feed.
+
+Every filter combination GET /api/posts/ accepts must be answered through an
+index: no full table scan, and no temporary B-tree for the feed order outside
+of search (which is ordered by relevance).
+"""
+import asyncio
+import itertools
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from database import Database  # noqa: E402
+from services.post_service import PostService  # noqa: E402
+from utils.pagination import encode_cursor  # noqa: E402
+
+FILTER_VALUES = {
+    "post_type": "job",
+    "city_id": "moscow-city",
+    "super_rubric_id": "job-rubric",
+    "author_id": "user-1",
+    "search": "репетитор",
+}
+
+NOW = "2024-06-01T00:00:00"
+
+def filter_combinations():
+    keys = list(FILTER_VALUES)
+    for size in range(len(keys) + 1):
+        for combination in itertools.combinations(keys, size):
+            yield {key: FILTER_VALUES[key] for key in combination}
+
+def combination_id(filters):
+    return "+".join(filters) or "no-filters"
+
+async def explain(db_path, query, params):
+    db = Database(db_path, pool_size=1)
+    rows = await db.fetchall(f"EXPLAIN QUERY PLAN {query}", params)
+    return [row["detail"] for row in rows]
+
+@pytest.fixture(scope="module")
+def db_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("feed") / "feed.db")
+    asyncio.run(Database(path).init_db())
+    return path
+
+def assert_uses_index(plan, filters):
+    for step in plan:
+        # "SCAN posts" without an index is a full table scan; FTS5 MATCH shows as a virtual table index
+        assert not (step.startswith("SCAN p") and "INDEX" not in step), plan
+        if "search" not in filters:
+            assert "TEMP B-TREE" not in step, plan
+    assert any("INDEX" in step for step in plan), plan
+    if "author_id" in filters and "search" not in filters:
+        # An author's posts are found through the author index, not the whole published feed
+        assert any("author_id=?" in step for step in plan), plan
+
+@pytest.mark.parametrize("filters", list(filter_combinations()), ids=combination_id)
+def test_feed_page_uses_index(db_path, filters):
+    query, params, _ = PostService._build_feed_page_query(filters, 20, 0, now=NOW)
+    assert_uses_index(asyncio.run(explain(db_path, query, params)), filters)
+
+@pytest.mark.parametrize("filters", list(filter_combinations()), ids=combination_id)
+def test_feed_cursor_page_uses_index(db_path, filters):
+    cursor = encode_cursor([20]) if "search" in filters else encode_cursor([0, NOW, "post-1"])
+    query, params, _ = PostService._build_feed_page_query({**filters, "cursor": cursor}, 20, 0, now=NOW)
+    assert_uses_index(asyncio.run(explain(db_path, query, params)), filters)
+
+@pytest.mark.parametrize("filters", list(filter_combinations()), ids=combination_id)
+def test_feed_count_uses_index(db_path, filters):
+    query, params = PostService._build_feed_count_query(filters, now=NOW)
+    plan = asyncio.run(explain(db_path, query, params))
+    assert_uses_index(plan, filters)
+    if "search" not in filters and "author_id" not in filters:
+        # Counting published posts by facet filters never touches the table
+        assert any("COVERING INDEX" in step for step in plan), plan
+
+FACET_VALUES = {key: FILTER_VALUES[key] for key in ("post_type", "city_id", "super_rubric_id")}
+
+SORT_CURSORS = {
+    "price_asc": [1500.0, "post-1"],
+    "price_desc": [1500.0, "post-1"],
+    "views": [10, "post-1"],
+}
+
+def facet_combinations():
+    keys = list(FACET_VALUES)
+    for size in range(len(keys) + 1):
+        for combination in itertools.combinations(keys, size):
+            yield {key: FACET_VALUES[key] for key in combination}
+
+@pytest.mark.parametrize("sort", list(SORT_CURSORS))
+@pytest.mark.parametrize("filters", list(facet_combinations()), ids=combination_id)
+def test_sorted_feed_page_uses_index(db_path, filters, sort):
+    for page_filters in ({**filters, "sort": sort}, {**filters, "sort": sort, "cursor": encode_cursor(SORT_CURSORS[sort])}):
+        query, params, _ = PostService._build_feed_page_query(page_filters, 20, 0, now=NOW)
+        assert_uses_index(asyncio.run(explain(db_path, query, params)), page_filters)
+
+@pytest.mark.parametrize("sort", ["newest", *SORT_CURSORS])
+@pytest.mark.parametrize("filters", list(facet_combinations()), ids=combination_id)
+def test_value_filtered_feed_page_uses_index(db_path, filters, sort):
+    value_filters = {
+        **filters, "sort": sort, "price_min": 100, "price_max": 5000,
+        "price_currency_id": "usd-id", "currency_id": "rub-id", "has_photo": True
+    }
+    query, params, _ = PostService._build_feed_page_query(value_filters, 20, 0, now=NOW)
+    assert_uses_index(asyncio.run(explain(db_path, query, params)), value_filters)
+
+def test_published_facet_query_uses_covering_index(db_path):
+    # Facet filters are not applied to the facet query itself
+    query, params = PostService._build_feed_facet_query({}, now=NOW)
+    plan = asyncio.run(explain(db_path, query, params))
+    assert any("COVERING INDEX" in step for step in plan), plan
+    assert not any("TEMP B-TREE" in step for step in plan), plan
+
+def test_facet_counter_queries_read_only_todays_posts(db_path):
+    counters, today = PostService._build_facet_counter_queries(False, now=datetime.fromisoformat(NOW))
+    plan = asyncio.run(explain(db_path, *today))
+    assert any("expires_at>? AND expires_at<?" in step for step in plan), plan
+    plan = asyncio.run(explain(db_path, *counters))
+    assert not any("posts" in step.split(" USING")[0] for step in plan), plan
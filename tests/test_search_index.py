@@ -0,0 +1,90 @@
+"""
+Stemming and match-query checks for post search.
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from database import Database  # noqa: E402
+from search_index import bm25_rank, build_match_query, tokenize, with_search_terms  # noqa: E402
+
+@pytest.mark.parametrize("words", [
+    ("репетитор", "репетиторы", "репетитора", "репетиторов", "репетиторів"),
+    ("Киев", "Киеве", "Киева", "Києві"),
+    ("ёлка", "елка", "Ёлки"),
+    ("їжак", "іжак", "ижак"),
+    ("квартира", "квартиры", "квартиру"),
+])
+def test_inflected_forms_share_a_stem(words):
+    stems = {term for word in words for term in tokenize(word)}
+    assert len(stems) == 1, stems
+
+@pytest.mark.parametrize("word", ["Киев", "Кирпич", "Китайский", "Кинотеатр"])
+def test_short_stems_are_not_cut_down(word):
+    assert len(tokenize(word)[0]) >= 3
+
+def test_match_query_is_exact_except_for_a_long_last_term():
+    assert build_match_query("Репетиторы в Киеве") == '"репетитор" "в" "киев"*'
+    assert build_match_query("киев ки") == '"киев" "ки"'
+    assert build_match_query('"AND* OR') == '"and" "or"'
+    assert build_match_query("!!!") is None
+
+POSTS = {
+    "tutor": ("Репетитор в Киеве", "Уроки математики"),
+    "bricks": ("Кирпич продаю", "Самовывоз"),
+    "chinese": ("Китайский язык уроки", "Онлайн"),
+    "cinema": ("Кинотеатр ищет кассира", "Полный день"),
+    "tutors": ("Репетиторы английского", "Группы и индивидуально"),
+}
+
+async def search(path, text):
+    db = Database(path)
+    await db.init_db()
+    try:
+        for post_id, (title, description) in POSTS.items():
+            await db.insert("posts", with_search_terms({
+                "id": post_id, "title": title, "description": description, "post_type": "job", "author_id": "user-1"
+            }))
+        rows = await db.fetchall(
+            f"SELECT post_id FROM posts_fts WHERE posts_fts MATCH ? ORDER BY {bm25_rank()}",
+            [build_match_query(text)]
+        )
+        return [row["post_id"] for row in rows]
+    finally:
+        await db.close()
+
+@pytest.mark.parametrize("text, expected", [
+    ("Киев", ["tutor"]),
+    ("репетитор", ["tutor", "tutors"]),
+    ("репетиторы", ["tutor", "tutors"]),
+    ("уроки", ["chinese", "tutor"]),
+])
+def test_search_matches_stems_exactly(tmp_path, text, expected):
+    assert sorted(asyncio.run(search(str(tmp_path / "search.db"), text))) == expected
+
+def test_plain_sqlite_connections_can_write_posts(tmp_path):
+    path = str(tmp_path / "plain.db")
+    asyncio.run(Database(path).init_db())
+    
+    record = with_search_terms({"id": "tutor", "title": "Репетиторы", "description": "Уроки", "post_type": "job"})
+    con = sqlite3.connect(path)
+    try:
+        columns = ", ".join(record)
+        con.execute(f"INSERT INTO posts ({columns}) VALUES ({', '.join('?' * len(record))})", list(record.values()))
+        con.execute("INSERT INTO posts (id, title, post_type) VALUES ('bare', 'Кирпич', 'job')")
+        con.execute("UPDATE posts SET title = 'Кирпичи' WHERE id = 'bare'")
+        con.commit()
+        
+        match = con.execute("SELECT post_id FROM posts_fts WHERE posts_fts MATCH ?", [build_match_query("репетитор")])
+        assert [row[0] for row in match] == ["tutor"]
+        
+        con.execute("DELETE FROM posts WHERE id = 'tutor'")
+        con.commit()
+        assert con.execute("SELECT COUNT(*) FROM posts_fts WHERE post_id = 'tutor'").fetchone()[0] == 0
+    finally:
+        con.close()
@@ -0,0 +1,122 @@
+"""
+Accuracy checks for the post viewer sketches and the view counter built on them.
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+import view_counter as view_counter_module  # noqa: E402
+from config import VIEW_BLOOM_ERROR_RATE  # noqa: E402
+from database import Database  # noqa: E402
+from view_counter import ViewCounter  # noqa: E402
+from view_sketch import BloomFilter, HyperLogLog, bloom_merge, hll_merge, viewer_hash  # noqa: E402
+
+def hashes(prefix, count):
+    return [viewer_hash(f"{prefix}-{index}") for index in range(count)]
+
+@pytest.mark.parametrize("viewers", [10, 100, 1000, 10000, 100000])
+def test_hll_count_accuracy(viewers):
+    hll = HyperLogLog()
+    for value_hash in hashes("user", viewers):
+        hll.add(value_hash)
+    # About 3% standard error at precision 10; allow four of them
+    assert abs(hll.count() - viewers) <= max(1, 0.13 * viewers)
+
+def test_hll_ignores_repeated_viewers():
+    hll = HyperLogLog()
+    values = hashes("user", 500)
+    for value_hash in values:
+        hll.add(value_hash)
+    count = hll.count()
+    assert not any(hll.add(value_hash) for value_hash in values)
+    assert hll.count() == count
+
+def test_hll_merge_counts_the_union():
+    left, right, both = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    for index, value_hash in enumerate(hashes("user", 4000)):
+        (left if index % 2 else right).add(value_hash)
+        both.add(value_hash)
+    merged = HyperLogLog(hll_merge(left.to_bytes(), right.to_bytes()))
+    assert merged.count() == both.count()
+
+@pytest.mark.parametrize("viewers", [100, 1000, 5000, 20000, 50000])
+def test_bloom_false_positive_rate_stays_bounded(viewers):
+    bloom = BloomFilter()
+    added = hashes("user", viewers)
+    for value_hash in added:
+        bloom.add(value_hash)
+    # No false negatives, and the error rate does not grow with the number of viewers
+    assert all(bloom.contains(value_hash) for value_hash in added)
+    probes = hashes("other", 20000)
+    false_positives = sum(bloom.contains(value_hash) for value_hash in probes)
+    assert false_positives / len(probes) <= VIEW_BLOOM_ERROR_RATE * 1.5
+
+def test_bloom_add_reports_possible_presence():
+    bloom = BloomFilter()
+    value_hash = viewer_hash("user-1")
+    assert bloom.add(value_hash) is False
+    assert bloom.add(value_hash) is True
+
+def test_bloom_round_trips_and_keeps_growing():
+    bloom = BloomFilter()
+    for value_hash in hashes("user", 3000):
+        bloom.add(value_hash)
+    restored = BloomFilter(bloom.to_bytes())
+    assert restored.layers == bloom.layers
+    for value_hash in hashes("more", 5000):
+        restored.add(value_hash)
+    assert len(restored.layers) > len(bloom.layers)
+    assert all(restored.contains(value_hash) for value_hash in hashes("user", 3000))
+
+def test_bloom_merge_keeps_viewers_of_both_sides():
+    small, large = BloomFilter(), BloomFilter()
+    for value_hash in hashes("small", 50):
+        small.add(value_hash)
+    for value_hash in hashes("large", 5000):
+        large.add(value_hash)
+    for left, right in ((small, large), (large, small)):
+        merged = BloomFilter(bloom_merge(left.to_bytes(), right.to_bytes()))
+        assert len(merged.layers) == len(large.layers)
+        assert all(merged.contains(value_hash) for value_hash in hashes("small", 50) + hashes("large", 5000))
+
+def test_bloom_ignores_blobs_of_another_layout():
+    # e.g. the fixed 8192-bit filters written before the filter became scalable
+    bloom = BloomFilter(b"\xff" * 1024)
+    assert not bloom.contains(viewer_hash("user-1"))
+    assert bloom_merge(b"\xff" * 1024, bloom.to_bytes()) == bloom.to_bytes()
+
+async def record_and_flush(path, record_rows):
+    db = Database(path)
+    await db.init_db()
+    shared_db, view_counter_module.db = view_counter_module.db, db
+    try:
+        await db.insert("posts", {
+            "id": "post-1", "title": "t", "description": "d", "post_type": "job", "author_id": "user-1"
+        })
+        counter = ViewCounter(60, 100, record_rows)
+        for _ in range(2):
+            for index in range(20):
+                await counter.record_viewer("post-1", f"viewer-{index}")
+        await counter.flush()
+        rows = await db.fetchone("SELECT COUNT(*) AS total FROM post_views")
+        sketch = await db.fetchone("SELECT hll FROM post_view_sketches WHERE post_id = ?", ["post-1"])
+        return counter, rows["total"], HyperLogLog(sketch["hll"]).count()
+    finally:
+        view_counter_module.db = shared_db
+        await db.close()
+
+def test_view_counter_keeps_no_post_views_rows_by_default(tmp_path):
+    counter, rows, viewers = asyncio.run(record_and_flush(str(tmp_path / "views.db"), False))
+    assert rows == 0
+    assert abs(viewers - 20) <= 1
+    assert counter.viewer_lookups == 0
+
+def test_view_counter_records_rows_when_enabled(tmp_path):
+    counter, rows, viewers = asyncio.run(record_and_flush(str(tmp_path / "views.db"), True))
+    assert rows == 20
+    assert abs(viewers - 20) <= 1
+    assert counter.skipped_lookups == 20